@@ -1,14 +1,17 @@
 # app/api/deps.py
 import time
-from typing import Annotated, Generator
+from typing import Annotated, AsyncIterator, Dict, Generator, Iterable, Optional
 
 from cachetools import TTLCache
 from fastapi import Depends, status
 from fastapi import Request, HTTPException
 
+from app.core.config import settings
 from app.core.security import JWTBearer, verify_token
+from app.db import consistency
 from app.db.repositories.user import UserRepository
 from app.models.user import User
+from app.schemas.token import TokenPayload
 
 
 class RateLimiter:
@@ -55,6 +58,23 @@ auth_rate_limiter = RateLimiter(requests_limit=5, window_size=60)  # 5 requests
 api_rate_limiter = RateLimiter(requests_limit=100, window_size=60)  # 100 requests per minute
 
 
+class ConsistencyScope:
+    """Route dependency running the request's repository operations under a consistency profile"""
+
+    def __init__(self, name: str):
+        consistency.get_profile(name)  # Unknown names fail at import, not per request
+        self.name = name
+
+    async def __call__(self) -> AsyncIterator[None]:
+        with consistency.use(self.name):
+            yield
+
+
+# Consistency profiles for routes (see CONSISTENCY_PROFILES)
+critical_reads = ConsistencyScope("critical")
+analytics_reads = ConsistencyScope("analytics")
+
+
 def get_user_repo() -> Generator[UserRepository, None, None]:
     repo = UserRepository()
     try:
@@ -64,11 +84,8 @@ def get_user_repo() -> Generator[UserRepository, None, None]:
         pass
 
 
-async def get_current_user(
-        token: Annotated[str, Depends(JWTBearer())],
-        user_repo: Annotated[UserRepository, Depends(get_user_repo)]
-) -> User:
-    """Get current user from JWT token"""
+def _token_payload(token: str) -> Dict:
+    """Verified payload of an access token carrying a user_id"""
     try:
         payload = verify_token(token)
         if payload is None:
@@ -77,8 +94,7 @@ async def get_current_user(
                 detail="Token validation failed"
             )
 
-        user_id = payload.get("user_id")
-        if user_id is None:
+        if payload.get("user_id") is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token payload"
@@ -90,14 +106,35 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Token validation error: {str(e)}"
         )
+    return payload
+
+
+def _outdated_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Token authorization is outdated"
+    )
+
 
-    user = await user_repo.find_by_id(user_id)
+async def get_current_user(
+        token: Annotated[str, Depends(JWTBearer())],
+        user_repo: Annotated[UserRepository, Depends(get_user_repo)]
+) -> User:
+    """Get current user from JWT token"""
+    payload = _token_payload(token)
+
+    # Authorization always sees the primary, whatever profile the route reads with
+    with consistency.use("critical"):
+        user = await user_repo.find_by_id(payload["user_id"])
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+    if payload.get("authz_version", user.authz_version) != user.authz_version:
+        raise _outdated_token()
 
+    user_repo.record_activity(user.id)
     return user
 
 
@@ -123,3 +160,59 @@ async def get_current_superuser(
             detail="Not enough privileges"
         )
     return current_user
+
+
+class ClaimsAuthorizer:
+    """
+    Route dependency authorizing from the access token's claims, without
+    loading the user. With check_version, the token's authz_version must still
+    be the user's current one (a cached, projected read), so role changes and
+    deactivations revoke tokens already issued; without it, claims are trusted
+    until the token expires. Tokens issued before they carried claims fall back
+    to reading the user.
+    """
+
+    def __init__(
+            self,
+            superuser: bool = False,
+            roles: Iterable[str] = (),  # Any one of them suffices; superusers pass regardless
+            check_version: Optional[bool] = None  # None uses AUTHZ_VERSION_CHECK
+    ):
+        self.superuser = superuser
+        self.roles = frozenset(roles)
+        self.check_version = settings.AUTHZ_VERSION_CHECK if check_version is None else check_version
+
+    async def __call__(
+            self,
+            token: Annotated[str, Depends(JWTBearer())],
+            user_repo: Annotated[UserRepository, Depends(get_user_repo)]
+    ) -> TokenPayload:
+        claims = TokenPayload(**_token_payload(token))
+
+        if claims.authz_version is None:
+            with consistency.use("critical"):
+                user = await user_repo.find_by_id(claims.user_id)
+            if user is None or not user.is_active:
+                raise _outdated_token()
+            claims = claims.model_copy(update={
+                "roles": user.roles, "is_superuser": user.is_superuser, "authz_version": user.authz_version
+            })
+        elif self.check_version:
+            # None for a deleted or deactivated user never matches
+            if await user_repo.find_authz_version(claims.user_id) != claims.authz_version:
+                raise _outdated_token()
+
+        if (self.superuser or self.roles) and not claims.is_superuser:
+            if self.superuser or not self.roles.intersection(claims.roles):
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Not enough privileges"
+                )
+
+        user_repo.record_activity(claims.user_id)
+        return claims
+
+
+# Claims-only authorization for routes that need no more of the caller than their id
+active_user_claims = ClaimsAuthorizer()
+superuser_claims = ClaimsAuthorizer(superuser=True)
@@ -0,0 +1,115 @@
+# Admin diagnostics and statistics endpoints
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.api.deps import superuser_claims
+from app.core import deadline
+from app.core.loop_monitor import loop_monitor
+from app.core.profiling import profiler
+from app.db.user_stats import user_stats
+from app.schemas.profiling import ProfileSessionCreate, ProfileSessionResponse
+from app.schemas.stats import UserStatsResponse
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(superuser_claims)]
+)
+
+
+@router.post("/profiling/sessions", response_model=ProfileSessionResponse, status_code=status.HTTP_201_CREATED)
+async def start_profiling(session_create: ProfileSessionCreate):
+    """
+    Arm a sampling profiler session. "next" profiles the next N requests served
+    by this worker; "header" profiles requests carrying the returned token in
+    X-Profile, on any worker, until it expires.
+    """
+    return profiler.start_session(
+        requests=session_create.requests, mode=session_create.mode, ttl=session_create.ttl_seconds
+    )
+
+
+@router.get("/profiling/sessions/{session_id}", response_model=ProfileSessionResponse)
+async def read_profiling_session(session_id: str):
+    """
+    Status of a session armed on this worker.
+    """
+    session = profiler.sessions.get(session_id)
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profiling session not found or expired"
+        )
+    return session
+
+
+@router.get("/profiling/sessions/{session_id}/folded", response_class=PlainTextResponse)
+async def download_profile(session_id: str):
+    """
+    Collapsed stacks of a session from every worker on this host, ready for
+    flamegraph.pl or speedscope.
+    """
+    folded = profiler.folded(session_id)
+    if folded is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No samples recorded for this session yet"
+        )
+    return PlainTextResponse(
+        folded, headers={"Content-Disposition": f'attachment; filename="{session_id}.folded"'}
+    )
+
+
+@router.get("/slow-requests")
+async def download_slow_requests(download: bool = False):
+    """
+    Recent requests slower than SLOW_REQUEST_THRESHOLD_MS on this worker, with
+    event-loop stack samples and their span breakdown.
+    """
+    headers = {"Content-Disposition": 'attachment; filename="slow-requests.json"'} if download else None
+    return JSONResponse(profiler.slow_request_snapshot(), headers=headers)
+
+
+@router.get("/event-loop/stalls")
+async def read_event_loop_stalls():
+    """
+    Recent stalls of this worker's event loop longer than LOOP_BLOCK_THRESHOLD_MS,
+    with the stack of the blocking code and the async def it was called from.
+    """
+    return loop_monitor.snapshot()
+
+
+@router.get("/stats/users", response_model=UserStatsResponse)
+async def read_user_stats(days: int = Query(30, ge=1, le=366)):
+    """
+    User counts by role, provider and status, and signups per day for the
+    last `days` days, read from the materialized statistics.
+    """
+    stats = await user_stats.read(days=days)
+    if stats is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="User statistics have not been computed yet",
+            headers={"Retry-After": "60"}
+        )
+    return stats
+
+
+async def _refresh_user_stats(full: bool):
+    # Not bound by the finished request's deadline
+    token = deadline.set_deadline(None)
+    try:
+        await user_stats.refresh(full=full)
+    finally:
+        deadline.reset_deadline(token)
+
+
+@router.post("/stats/users/refresh", status_code=status.HTTP_202_ACCEPTED)
+async def refresh_user_stats(background_tasks: BackgroundTasks, full: bool = False):
+    """
+    Refresh the materialized user statistics now, incrementally or with a full
+    rebuild, after the response is sent.
+    """
+    background_tasks.add_task(_refresh_user_stats, full)
+    return {"detail": "Refresh scheduled"}
@@ -1,17 +1,40 @@
 # Authentication endpoints
 
+import logging
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import jwt
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
 
-from app.api.deps import get_user_repo, auth_rate_limiter
-from app.core.security import get_password_hash, verify_password, create_access_token, refresh_token, JWTBearer
+from app.api.deps import get_user_repo, auth_rate_limiter, critical_reads
+from app.core import deadline
+from app.core.security import (
+    get_password_hash, verify_and_update_password, create_access_token, refresh_token, JWTBearer, key_ring
+)
+from app.db.audit import audit_writer
 from app.db.repositories.user import UserRepository
 from app.schemas.token import Token
 from app.schemas.user import UserCreate, UserResponse
+from app.utils.helpers import request_origin
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/auth", tags=["auth"], dependencies=[Depends(critical_reads)])
+
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+async def _rehash_password(user_repo: UserRepository, user_id: str, old_hash: str, new_hash: str):
+    """Store an upgraded hash after the login response has been sent"""
+    # Not bound by the finished request's deadline
+    token = deadline.set_deadline(None)
+    try:
+        await user_repo.rehash_password(user_id, old_hash, new_hash)
+    except Exception as e:
+        logger.warning(f"Password rehash for user {user_id} failed: {e}")
+    finally:
+        deadline.reset_deadline(token)
 
 
 @router.post(
@@ -20,6 +43,7 @@ router = APIRouter(prefix="/auth", tags=["auth"])
     dependencies=[Depends(auth_rate_limiter)]
 )
 async def register(
+        request: Request,
         user_create: UserCreate,
         user_repo: Annotated[UserRepository, Depends(get_user_repo)]
 ):
@@ -40,9 +64,18 @@ async def register(
 
     # Create new user
     user_data = user_create.model_dump(exclude={"password", "confirm_password"})
-    user_data["hashed_password"] = get_password_hash(user_create.password)
+    # Hashing is deliberately slow; keep it off the event loop
+    user_data["hashed_password"] = await run_in_threadpool(get_password_hash, user_create.password)
 
-    user = await user_repo.create(user_data)
+    try:
+        user = await user_repo.create(user_data)
+    except DuplicateKeyError:
+        # Registered concurrently since the check above
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+    audit_writer.record("register", actor_id=user.id, target_id=user.id, **request_origin(request))
     return user
 
 
@@ -52,19 +85,41 @@ async def register(
     dependencies=[Depends(auth_rate_limiter)]
 )
 async def login(
+        request: Request,
+        background_tasks: BackgroundTasks,
         form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
         user_repo: Annotated[UserRepository, Depends(get_user_repo)]
 ):
     """Login with username and password"""
     user = await user_repo.find_by_email(form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    verified, new_hash = False, None
+    if user:
+        # Hash verification is deliberately slow; keep it off the event loop
+        verified, new_hash = await run_in_threadpool(
+            verify_and_update_password, form_data.password, user.hashed_password
+        )
+    if not verified:
+        audit_writer.record(
+            "login",
+            outcome="failure",
+            target_id=user.id if user else None,
+            details={"email": form_data.username, "reason": "bad_password" if user else "unknown_user"},
+            **request_origin(request)
+        )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    return create_access_token(str(user.id))
+    if new_hash:
+        background_tasks.add_task(_rehash_password, user_repo, user.id, user.hashed_password, new_hash)
+
+    user_repo.record_activity(user.id, login=True)
+    audit_writer.record("login", actor_id=user.id, target_id=user.id, **request_origin(request))
+    return create_access_token(
+        str(user.id), roles=user.roles, is_superuser=user.is_superuser, authz_version=user.authz_version
+    )
 
 
 @router.post(
@@ -72,9 +127,39 @@ async def login(
     response_model=Token,
     dependencies=[Depends(JWTBearer()), Depends(auth_rate_limiter)]
 )
-async def refresh(token: str):
+async def refresh(
+        request: Request,
+        token: str,
+        user_repo: Annotated[UserRepository, Depends(get_user_repo)]
+):
     """Refresh access token"""
-    return refresh_token(token)
+    # Attribution only; refresh_token does the actual verification
+    try:
+        unverified = jwt.decode(token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        unverified = {}
+    user_id = unverified.get("user_id")
+
+    try:
+        await key_ring.ensure_known(token)
+        new_token = refresh_token(token)
+        # The new token keeps the old claims, which must still be current
+        authz_version = unverified.get("authz_version")
+        if authz_version is not None and authz_version != await user_repo.find_authz_version(
+                user_id, use_cache=False
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token authorization is outdated"
+            )
+    except HTTPException as e:
+        audit_writer.record(
+            "token_refresh", outcome="failure", target_id=user_id, details={"reason": e.detail},
+            **request_origin(request)
+        )
+        raise
+    audit_writer.record("token_refresh", actor_id=user_id, target_id=user_id, **request_origin(request))
+    return new_token
 
 
 # Optional: Token verification endpoint for testing
@@ -1,8 +1,11 @@
 # Health check endpoints
 from typing import Dict
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
 
+from app.api.deps import superuser_claims
+from app.core.metrics import metrics
 from app.db.mongodb import db
 
 router = APIRouter(prefix="/health", tags=["health"])
@@ -52,3 +55,12 @@ async def detailed_health_check():
             "mongodb": mongodb_status
         }
     }
+
+
+@router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(superuser_claims)])
+async def metrics_endpoint():
+    """
+    Worker-local metrics in the Prometheus text exposition format.
+    Exposes internals (caches, pools, in-flight reads); only accessible by superusers.
+    """
+    return metrics.render()
@@ -1,14 +1,29 @@
 # User management endpoints
 # app/api/v1/users.py
-from typing import Annotated, List
+import os
+from datetime import datetime, timedelta
+from typing import Annotated, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
 
-from app.api.deps import get_current_active_user, get_current_superuser, get_user_repo
+from app.api.deps import (
+    active_user_claims, analytics_reads, get_current_active_user, get_user_repo, superuser_claims
+)
+from app.core.config import settings
 from app.core.security import get_password_hash, JWTBearer
+from app.db.audit import audit_writer
 from app.db.repositories.user import UserRepository
+from app.models.base import generate_uuid
 from app.models.user import User
+from app.schemas.token import TokenPayload
+from app.schemas.base import CursorPage, Page
 from app.schemas.user import UserResponse, UserUpdate
+from app.schemas.user_import import UserImportStatus
+from app.services.user_import import get_importer, is_running, run_in_background
+from app.utils.helpers import etag_matches, if_match_versions, make_etag, request_origin
 
 router = APIRouter(
     prefix="/users",
@@ -17,45 +32,77 @@ router = APIRouter(
 )
 
 
+def _precondition_failed() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail="User has been modified"
+    )
+
+
+def _import_conflict(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=detail
+    )
+
+
 @router.get("/me", response_model=UserResponse)
 async def read_current_user(
-        current_user: Annotated[User, Depends(get_current_active_user)]
+        response: Response,
+        current_user: Annotated[User, Depends(get_current_active_user)],
+        if_none_match: Annotated[Optional[str], Header()] = None
 ):
     """Get current user information."""
+    etag = make_etag(current_user.id, current_user.version)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
     return current_user
 
 
 @router.put("/me", response_model=UserResponse)
 async def update_current_user(
+        response: Response,
         update_data: UserUpdate,
         current_user: Annotated[User, Depends(get_current_active_user)],
-        user_repo: Annotated[UserRepository, Depends(get_user_repo)]
+        user_repo: Annotated[UserRepository, Depends(get_user_repo)],
+        if_match: Annotated[Optional[str], Header()] = None
 ):
-    """Update current user information."""
+    """Update current user information. Honors If-Match for optimistic concurrency."""
+    expected_versions = if_match_versions(if_match, current_user.id)
+    if expected_versions == []:
+        raise _precondition_failed()
+
     update_dict = update_data.model_dump(exclude_unset=True)
 
     if "password" in update_dict:
-        update_dict["hashed_password"] = get_password_hash(update_dict.pop("password"))
+        update_dict["hashed_password"] = await run_in_threadpool(get_password_hash, update_dict.pop("password"))
 
-    updated_user = await user_repo.update_by_id(current_user.id, update_dict)
+    updated_user = await user_repo.update_by_id(
+        current_user.id, update_dict, expected_versions=expected_versions
+    )
     if not updated_user:
+        if expected_versions is not None:
+            raise _precondition_failed()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to update user"
         )
 
+    response.headers["ETag"] = make_etag(updated_user.id, updated_user.version)
     return updated_user
 
 
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_current_user(
-        current_user: Annotated[User, Depends(get_current_active_user)],
+        claims: Annotated[TokenPayload, Depends(active_user_claims)],
         user_repo: Annotated[UserRepository, Depends()]
 ):
     """
     Delete current user account.
     """
-    success = await user_repo.delete_by_id(current_user.id)
+    success = await user_repo.delete_by_id(claims.user_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -64,26 +111,140 @@ async def delete_current_user(
 
 
 # Admin routes
-@router.get("", response_model=List[UserResponse])
+@router.get("", response_model=Page[UserResponse], dependencies=[Depends(analytics_reads)])
 async def list_users(
         *,
-        skip: int = 0,
-        limit: int = 100,
-        current_user: Annotated[User, Depends(get_current_superuser)],
+        skip: Annotated[int, Query(ge=0)] = 0,
+        limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+        count: Literal["exact", "estimated", "cached"] = "estimated",
+        claims: Annotated[TokenPayload, Depends(superuser_claims)],
+        user_repo: Annotated[UserRepository, Depends()]
+):
+    """
+    List all users with the total count. Reads from secondaries when available,
+    so recent changes may take a moment to show. Only accessible by superusers.
+    """
+    return await user_repo.paginate(
+        {}, skip=skip, limit=limit, sort=[("created_at", DESCENDING), ("_id", DESCENDING)], count=count
+    )
+
+
+@router.get("/search", response_model=CursorPage[UserResponse], dependencies=[Depends(analytics_reads)])
+async def search_users(
+        *,
+        q: Annotated[str, Query(min_length=1, max_length=100)],
+        mode: Literal["prefix", "text"] = "prefix",
+        field: Literal["email", "name"] = "email",
+        limit: Annotated[int, Query(ge=1, le=100)] = 20,
+        cursor: Optional[str] = None,
+        claims: Annotated[TokenPayload, Depends(superuser_claims)],
         user_repo: Annotated[UserRepository, Depends()]
 ):
     """
-    List all users. Only accessible by superusers.
+    Search users by email or name prefix, or full-text with relevance ordering.
+    Only accessible by superusers.
+    """
+    try:
+        if mode == "text":
+            users, next_cursor = await user_repo.search_text(q, limit=limit, cursor=cursor)
+        else:
+            users, next_cursor = await user_repo.search_prefix(q, field=field, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    return {"items": users, "next_cursor": next_cursor, "has_more": next_cursor is not None}
+
+
+@router.post("/import", response_model=UserImportStatus, status_code=status.HTTP_202_ACCEPTED)
+async def import_users(
+        request: Request,
+        claims: Annotated[TokenPayload, Depends(superuser_claims)],
+        fmt: Annotated[Literal["csv", "ndjson"], Query(alias="format")] = "csv"
+):
+    """
+    Bulk-create users from a CSV (with a header row) or NDJSON request body with
+    UserCreate fields; confirm_password may be omitted. The body is streamed to
+    disk and imported in the background. Only accessible by superusers.
+    """
+    import_id = generate_uuid()
+    os.makedirs(settings.USER_IMPORT_DIR, exist_ok=True)
+    path = os.path.join(settings.USER_IMPORT_DIR, f"{import_id}.{fmt}")
+    with open(path, "wb") as f:
+        async for chunk in request.stream():
+            await run_in_threadpool(f.write, chunk)
+
+    importer = get_importer()
+    await importer.begin(import_id, source="upload", fmt=fmt)
+    run_in_background(importer, import_id, path, fmt)
+    audit_writer.record(
+        "user_import", actor_id=claims.user_id, details={"import_id": import_id}, **request_origin(request)
+    )
+    return await importer.status(import_id)
+
+
+@router.get("/import/{import_id}", response_model=UserImportStatus)
+async def read_user_import(
+        import_id: str,
+        claims: Annotated[TokenPayload, Depends(superuser_claims)]
+):
+    """
+    Progress of a bulk import: rows done, outcomes, first errors and rows per
+    second. Only accessible by superusers.
+    """
+    import_status = await get_importer().status(import_id)
+    if not import_status:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import not found"
+        )
+    return import_status
+
+
+@router.post("/import/{import_id}/resume", response_model=UserImportStatus, status_code=status.HTTP_202_ACCEPTED)
+async def resume_user_import(
+        import_id: str,
+        claims: Annotated[TokenPayload, Depends(superuser_claims)]
+):
+    """
+    Continue a failed or interrupted import from its last checkpoint. Only
+    accessible by superusers.
     """
-    users = await user_repo.find_many({}, skip=skip, limit=limit)
-    return users
+    importer = get_importer()
+    import_status = await importer.status(import_id)
+    if not import_status:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import not found"
+        )
+
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.USER_IMPORT_STALE_SECONDS)
+    running = import_status["status"] == "running" and (
+        is_running(import_id) or import_status["updated_at"] > stale_before
+    )
+    path = os.path.join(settings.USER_IMPORT_DIR, f"{import_id}.{import_status['format']}")
+    if import_status["status"] == "completed":
+        raise _import_conflict("Import already completed")
+    if running:
+        raise _import_conflict("Import is still running")
+    if not os.path.exists(path):
+        # Uploads are kept on the worker host that received them
+        raise _import_conflict("Uploaded file is not available on this host")
+
+    await importer.begin(import_id, source=import_status["source"], fmt=import_status["format"])
+    run_in_background(importer, import_id, path, import_status["format"])
+    return await importer.status(import_id)
 
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def read_user(
         user_id: str,
-        current_user: Annotated[User, Depends(get_current_superuser)],
-        user_repo: Annotated[UserRepository, Depends()]
+        response: Response,
+        claims: Annotated[TokenPayload, Depends(superuser_claims)],
+        user_repo: Annotated[UserRepository, Depends()],
+        if_none_match: Annotated[Optional[str], Header()] = None
 ):
     """
     Get user by ID. Only accessible by superusers.
@@ -94,18 +255,28 @@ async def read_user(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+
+    etag = make_etag(user.id, user.version)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
     return user
 
 
 @router.put("/{user_id}", response_model=UserResponse)
 async def update_user(
         user_id: str,
+        request: Request,
+        response: Response,
         update_data: UserUpdate,
-        current_user: Annotated[User, Depends(get_current_superuser)],
-        user_repo: Annotated[UserRepository, Depends()]
+        claims: Annotated[TokenPayload, Depends(superuser_claims)],
+        user_repo: Annotated[UserRepository, Depends()],
+        if_match: Annotated[Optional[str], Header()] = None
 ):
     """
     Update user by ID. Only accessible by superusers.
+    Honors If-Match for optimistic concurrency.
     """
     # Check if user exists
     existing_user = await user_repo.find_by_id(user_id)
@@ -115,28 +286,46 @@ async def update_user(
             detail="User not found"
         )
 
+    expected_versions = if_match_versions(if_match, user_id)
+    if expected_versions == []:
+        raise _precondition_failed()
+
     # Prepare update data
     update_dict = update_data.model_dump(exclude_unset=True)
 
     # Hash password if it's being updated
     if "password" in update_dict:
-        update_dict["hashed_password"] = get_password_hash(update_dict.pop("password"))
+        update_dict["hashed_password"] = await run_in_threadpool(get_password_hash, update_dict.pop("password"))
 
-    # Update user
-    updated_user = await user_repo.update_by_id(user_id, update_dict)
+    # Update user; the version check happens atomically in the update filter
+    updated_user = await user_repo.update_by_id(
+        user_id, update_dict, expected_versions=expected_versions
+    )
     if not updated_user:
+        if expected_versions is not None:
+            raise _precondition_failed()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to update user"
         )
 
+    audit_writer.record(
+        "user_update",
+        actor_id=claims.user_id,
+        target_id=user_id,
+        details={"fields": sorted(update_data.model_dump(exclude_unset=True))},  # Names only, never values
+        **request_origin(request)
+    )
+
+    response.headers["ETag"] = make_etag(updated_user.id, updated_user.version)
     return updated_user
 
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
         user_id: str,
-        current_user: Annotated[User, Depends(get_current_superuser)],
+        request: Request,
+        claims: Annotated[TokenPayload, Depends(superuser_claims)],
         user_repo: Annotated[UserRepository, Depends()]
 ):
     """
@@ -148,3 +337,31 @@ async def delete_user(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+    audit_writer.record("user_delete", actor_id=claims.user_id, target_id=user_id, **request_origin(request))
+
+
+@router.post("/{user_id}/restore", response_model=UserResponse)
+async def restore_user(
+        user_id: str,
+        request: Request,
+        claims: Annotated[TokenPayload, Depends(superuser_claims)],
+        user_repo: Annotated[UserRepository, Depends()]
+):
+    """
+    Restore a deleted user that has not been archived yet. Only accessible by superusers.
+    """
+    try:
+        user = await user_repo.restore_by_id(user_id)
+    except DuplicateKeyError:
+        # Deleted emails can be registered again; only one active account may hold it
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Email now belongs to another account"
+        )
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Deleted user not found"
+        )
+    audit_writer.record("user_restore", actor_id=claims.user_id, target_id=user_id, **request_origin(request))
+    return user
@@ -0,0 +1,27 @@
+# Well-known discovery endpoints (served outside the versioned API prefix)
+from fastapi import APIRouter, Request, Response, status
+
+from app.core.config import settings
+from app.core.security import key_ring
+from app.utils.helpers import etag_matches
+
+router = APIRouter(prefix="/.well-known", tags=["well-known"])
+
+
+@router.get("/jwks.json")
+async def jwks(request: Request):
+    """
+    Public keys for verifying access tokens locally.
+    Serves pre-serialized bytes with a strong ETag; the body only changes on key rotation.
+    """
+    body, etag = key_ring.jwks()
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.JWKS_CACHE_MAX_AGE}",
+    }
+
+    # Weak comparison: compressed responses carry the weakened W/ form of the tag
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(content=body, media_type="application/jwk-set+json", headers=headers)
@@ -1,5 +1,5 @@
 # app/core/config.py
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic_settings import BaseSettings
 
@@ -10,13 +10,134 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "FastAPI Template"
 
     # JWT Settings
-    JWT_SECRET_KEY: str
+    JWT_SECRET_KEY: str  # Also encrypts the stored RS256/EdDSA private keys; rotate those out before changing it
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Authorization claims in access tokens (roles, is_superuser, authz_version)
+    AUTHZ_VERSION_CHECK: bool = True  # Reject tokens issued before a role change or deactivation right away
+    AUTHZ_VERSION_CACHE_SECONDS: float = 5  # Bounds revocation delay when the invalidation bus is off
+
+    # Asymmetric JWT signing (used when JWT_ALGORITHM is RS256 or EdDSA)
+    JWT_KEY_ROTATION_DAYS: int = 30
+    JWT_KEY_GRACE_PERIOD_HOURS: int = 48  # Must cover token lifetime plus refresh window
+    JWT_KEY_PUBLISH_DELAY_SECONDS: int = 600  # New keys appear in JWKS before they sign
+    JWT_KEY_REFRESH_SECONDS: int = 60
+    JWKS_CACHE_MAX_AGE: int = 300
+
+    # Password hashing; run scripts/calibrate_password_hash.py on the target instance type
+    PASSWORD_HASH_SCHEME: str = "bcrypt"  # "bcrypt" or "argon2" (Argon2id); other hashes upgrade on login
+    BCRYPT_ROUNDS: int = 12
+    ARGON2_TIME_COST: int = 2
+    ARGON2_MEMORY_COST_KB: int = 65536
+    ARGON2_PARALLELISM: int = 2
+
     # MongoDB
     MONGODB_URL: str
     MONGODB_DB_NAME: str
+    # How document ids are stored: "hex" (32-char strings), "binary" (BSON UUIDs, a third of the size) or
+    # "dual" (new ids binary, lookups match both) while scripts/migrate_ids.py converts existing documents
+    ID_REPRESENTATION: str = "hex"
+    REPOSITORY_BATCH_LOADING: bool = True  # Batch concurrent find_by_id calls into one $in query
+    REPOSITORY_BATCH_WINDOW_MS: float = 0  # 0 batches calls made in the same event-loop tick
+    REPOSITORY_BATCH_MAX_SIZE: int = 100
+    REPOSITORY_COUNT_CACHE_TTL: int = 30  # Seconds a cached filter count may be reused
+    ARCHIVE_INACTIVE_AFTER_DAYS: int = 90  # Soft-deleted documents then move to <collection>_archive
+    ARCHIVE_BATCH_SIZE: int = 500
+    ARCHIVE_INTERVAL_HOURS: int = 24
+
+    # Consistency profiles for repository operations (see app/db/consistency.py);
+    # options a profile leaves out use the client's (MONGODB_URL) settings
+    CONSISTENCY_PROFILES: Dict[str, Dict[str, Any]] = {
+        # Authentication and authorization: latest majority-committed data
+        "critical": {"read_preference": "primary", "read_concern": "majority", "write_concern": {"w": "majority"}},
+        "default": {},
+        # Admin listings, searches and exports: secondaries, tolerating some lag
+        "analytics": {"read_preference": "secondaryPreferred", "max_staleness_seconds": 120, "read_concern": "local"},
+        # Bulk imports: primary acknowledgement only, re-run from checkpoints if lost
+        "bulk": {"write_concern": {"w": 1}},
+    }
+    CONSISTENCY_DEFAULT_PROFILE: str = "default"
+
+    # Materialized admin user statistics
+    USER_STATS_REFRESH_SECONDS: int = 300
+    USER_STATS_MAX_INCREMENTAL_DAYS: int = 60  # More changed signup days than this triggers a full rebuild
+    USER_STATS_FULL_REBUILD_HOURS: int = 24  # Also corrects for hard-deleted and archived users
+
+    # Bulk user import
+    USER_IMPORT_DIR: str = "/tmp/fastapi-imports"  # Uploaded files, kept until the import completes
+    USER_IMPORT_CHUNK_SIZE: int = 1000  # Rows per insert_many and checkpoint
+    USER_IMPORT_PROCESSES: Optional[int] = None  # Password hashing processes; None uses every usable CPU
+    USER_IMPORT_STALE_SECONDS: int = 300  # A running import without a checkpoint for this long can be resumed
+
+    # Write-behind user activity (last_seen_at / last_login_at)
+    USER_ACTIVITY_FLUSH_INTERVAL_MS: int = 5000  # Max time an update stays unwritten (crash loss window)
+    USER_ACTIVITY_RESOLUTION_SECONDS: int = 60  # last_seen_at is refreshed at most this often per user
+    USER_ACTIVITY_MAX_PENDING: int = 10000  # Users buffered before an early flush
+    USER_ACTIVITY_WRITE_CONCERN: Dict[str, Any] = {"w": 1}
+
+    # Idempotency-Key handling for mutating API requests
+    IDEMPOTENCY_ENABLED: bool = True
+    IDEMPOTENCY_COLLECTION: str = "idempotency_keys"
+    IDEMPOTENCY_TTL_SECONDS: int = 86400  # How long a key replays its response
+    IDEMPOTENCY_LEASE_SECONDS: int = 60  # Renewed while the request runs; a dead worker's key is taken over after it
+    IDEMPOTENCY_CACHE_BYTES: int = 16 * 1024 * 1024  # Per-worker cache of stored responses
+    IDEMPOTENCY_MAX_BODY_BYTES: int = 65536  # Larger responses are not stored; a retry runs again
+    IDEMPOTENCY_WAIT_SECONDS: float = 10  # A duplicate waits this long for the first request before a 409
+    # Request body held for the fingerprint; longer (streamed) uploads are fingerprinted by this prefix and their length
+    IDEMPOTENCY_MAX_REQUEST_BUFFER_BYTES: int = 1024 * 1024
+    IDEMPOTENCY_EXCLUDED_PATHS: List[str] = ["/auth/login", "/auth/refresh"]  # Under API_V1_STR; never store tokens
+
+    # Audit trail (batched background writes)
+    AUDIT_ENABLED: bool = True
+    AUDIT_COLLECTION: str = "audit_events"
+    AUDIT_TIME_SERIES: bool = True  # Falls back to a TTL-indexed collection before MongoDB 5.0
+    AUDIT_RETENTION_DAYS: int = 90
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL_MS: int = 1000
+    AUDIT_MAX_QUEUE: int = 10000  # Events beyond this are dropped and counted
+
+    # Request tracing (W3C traceparent; head-sampled)
+    TRACING_ENABLED: bool = False
+    TRACING_SAMPLE_RATE: float = 0.01  # Requests without a sampled traceparent
+    TRACING_EXPORTERS: str = "console"  # Comma-separated: console, file, otlp
+    TRACING_FILE_PATH: str = "traces.jsonl"  # OTLP/JSON, one trace per line
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318"  # OTLP/HTTP collector
+
+    # Profiling and slow-request capture
+    PROFILING_OUTPUT_DIR: str = "/tmp/fastapi-profiles"  # Collapsed stacks, shared by same-host workers
+    PROFILING_SAMPLE_INTERVAL_MS: float = 5
+    SLOW_REQUEST_THRESHOLD_MS: Optional[int] = 1000  # None disables capture
+    # Record spans of unsampled requests too, so every slow request gets a breakdown; allocates
+    # spans for each middleware, dependency and Mongo command of every request (sampled ones always have it)
+    SLOW_REQUEST_SPANS: bool = False
+    SLOW_REQUEST_BUFFER_SIZE: int = 100
+
+    # Event-loop lag monitoring
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL_MS: int = 100  # Heartbeat period
+    LOOP_BLOCK_THRESHOLD_MS: int = 250  # Stalls longer than this are reported with the blocking stack
+    LOOP_DEBUG: bool = False  # asyncio debug mode; flags sync calls in async def handlers (dev only, slow)
+
+    # Cross-worker cache invalidation
+    INVALIDATION_SOCKET_DIR: Optional[str] = "/tmp/fastapi-invalidation"  # Same-host workers; None disables
+    INVALIDATION_CROSS_HOST: bool = False  # Also fan out through a capped collection
+    INVALIDATION_MAX_LAG_MS: int = 1000  # Later events flush the whole cache instead
+
+    # Adaptive concurrency limiting / load shedding
+    CONCURRENCY_INITIAL_LIMIT: int = 100
+    CONCURRENCY_MIN_LIMIT: int = 8
+    CONCURRENCY_MAX_LIMIT: int = 1000
+    CONCURRENCY_LATENCY_TOLERANCE: float = 1.5  # A route's recent median above this x its baseline is congestion
+    CONCURRENCY_UNMEASURED_PATHS: List[str] = ["/users/import"]  # Under API_V1_STR; latency tracks upload size
+
+    # Per-request deadlines (clients may ask for less or more via X-Request-Timeout)
+    REQUEST_TIMEOUT_SECONDS: Optional[float] = 10.0  # None leaves requests unbounded
+    REQUEST_TIMEOUT_MAX_SECONDS: float = 30.0
+    REQUEST_ROUTE_TIMEOUTS: Dict[str, float] = {
+        "/users/search": 3.0,
+        "/users/import": 600.0,  # Streams large uploads; the import itself runs in the background
+    }  # Path prefix under API_V1_STR
 
     # Google OAuth
     GOOGLE_CLIENT_ID: Optional[str] = None
@@ -0,0 +1,86 @@
+# app/core/deadline.py
+"""Per-request time budgets, carried in a contextvar and enforced on database calls"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Awaitable, Iterator, Optional
+
+import pymongo
+from pymongo.errors import PyMongoError
+
+from app.core.metrics import metrics
+
+# Absolute time.monotonic() deadline of the current request, None when unbounded
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+deadline_exceeded = metrics.counter(
+    "request_deadline_exceeded_total", "Operations refused or aborted because the request ran out of time, by stage"
+)
+
+
+class DeadlineExceeded(Exception):
+    """The current request's time budget is spent"""
+
+
+def set_deadline(timeout: Optional[float]) -> Token:
+    """Give the current context `timeout` seconds from now; reset with the returned token"""
+    return _deadline.set(None if timeout is None else time.monotonic() + timeout)
+
+
+def reset_deadline(token: Token):
+    _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, None when unbounded"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check(stage: str = "before_db"):
+    """Raise DeadlineExceeded instead of starting new work once the budget is spent"""
+    left = remaining()
+    if left is not None and left <= 0:
+        deadline_exceeded.inc(stage=stage)
+        raise DeadlineExceeded()
+
+
+@contextmanager
+def db_timeout() -> Iterator[None]:
+    """
+    Bound the MongoDB operations in the block by the remaining budget.
+
+    pymongo's client-side operation timeout sends the budget (minus the
+    measured round trip) to the server as maxTimeMS, so an abandoned query
+    stops running and releases its pooled connection. Timeouts surface as
+    DeadlineExceeded.
+    """
+    check()
+    left = remaining()
+    if left is None:
+        yield
+        return
+    try:
+        with pymongo.timeout(left):
+            yield
+    except PyMongoError as e:
+        if e.timeout:
+            deadline_exceeded.inc(stage="db")
+            raise DeadlineExceeded() from e
+        raise
+
+
+async def bounded(awaitable: Awaitable[Any]) -> Any:
+    """Await a result shared with other requests for no longer than our own budget"""
+    check()
+    left = remaining()
+    if left is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, left)
+    except asyncio.TimeoutError:
+        deadline_exceeded.inc(stage="waiting")
+        raise DeadlineExceeded()
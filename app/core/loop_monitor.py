@@ -0,0 +1,165 @@
+# app/core/loop_monitor.py
+"""
+Event-loop lag monitor and blocking-call detector.
+
+A heartbeat task sleeps for `interval` on the loop and records how late it
+wakes up; that lag is exported continuously. A watchdog thread watches the
+heartbeat: once the loop has not come back for `block_threshold`, it grabs the
+event-loop thread's stack while the blocking code is still running and reports
+it with the `async def` it was called from.
+"""
+import asyncio
+import inspect
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.profiling import thread_stack
+
+logger = logging.getLogger(__name__)
+
+loop_lag_seconds = metrics.histogram(
+    "event_loop_lag_seconds", "How late the loop heartbeat woke up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+loop_lag_gauge = metrics.gauge(
+    "event_loop_lag_last_seconds", "Lag of the most recent loop heartbeat"
+)
+loop_blocked_total = metrics.counter(
+    "event_loop_blocked_total", "Times the loop was blocked longer than the threshold"
+)
+
+
+def _describe(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)  # co_qualname is 3.11+
+    return f"{name} ({code.co_filename}:{frame.f_lineno})"
+
+
+def blocking_site(frame) -> Dict[str, Optional[str]]:
+    """
+    The innermost `async def` on a blocked stack and the synchronous call it is
+    stuck in. No coroutine means a plain loop callback (e.g. a logging handler).
+    """
+    coroutine = None
+    walker = frame
+    while walker is not None:
+        if walker.f_code.co_flags & inspect.CO_COROUTINE:
+            coroutine = _describe(walker)
+            break
+        walker = walker.f_back
+    return {"coroutine": coroutine, "blocking_call": _describe(frame)}
+
+
+class LoopMonitor:
+    def __init__(
+            self,
+            interval: float = 0.1,
+            block_threshold: float = 0.25,
+            debug: bool = False,
+            max_reports: int = 50
+    ):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.debug = debug
+        self.reports: Deque[Dict[str, Any]] = deque(maxlen=max_reports)
+        self.loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._pending: Optional[Dict[str, Any]] = None  # Stall reported but not yet over
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    async def start(self):
+        """Start monitoring the running loop"""
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        if self.debug:
+            # asyncio then also logs every callback slower than the threshold, with the
+            # coroutine it belongs to, and warns about coroutines never awaited
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.block_threshold
+
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _heartbeat(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._last_beat = time.monotonic()
+            lag = max(self._last_beat - start - self.interval, 0.0)
+            loop_lag_seconds.observe(lag)
+            loop_lag_gauge.set(lag)
+
+            pending, self._pending = self._pending, None
+            if pending is not None:
+                pending["blocked_ms"] = round(lag * 1000, 1)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stopped.wait(self.interval / 2):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.block_threshold or beat == reported_beat:
+                continue
+            reported_beat = beat  # Once per stall
+            self._report(stalled)
+
+    def _report(self, stalled: float):
+        frame = sys._current_frames().get(self.loop_thread_id)
+        if frame is None:
+            return
+        report = {
+            "detected_at": datetime.utcnow().isoformat() + "Z",
+            "stalled_ms": round(stalled * 1000, 1),
+            "blocked_ms": None,  # Filled in by the heartbeat once the loop is back
+            **blocking_site(frame),
+            "stack": thread_stack(self.loop_thread_id),
+        }
+        del frame
+        self.reports.append(report)
+        self._pending = report
+        loop_blocked_total.inc()
+
+        where = report["coroutine"] or "a loop callback"
+        if self.debug and report["coroutine"]:
+            logger.warning(
+                f"Synchronous call in async def {where} blocked the event loop for "
+                f"{report['stalled_ms']}ms: {report['blocking_call']}\n" + "\n".join(report["stack"])
+            )
+        else:
+            logger.warning(
+                f"Event loop blocked for {report['stalled_ms']}ms in {where}: {report['blocking_call']}"
+            )
+
+    def snapshot(self):
+        return list(self.reports)
+
+
+loop_monitor = LoopMonitor(
+    interval=settings.LOOP_MONITOR_INTERVAL_MS / 1000,
+    block_threshold=settings.LOOP_BLOCK_THRESHOLD_MS / 1000,
+    debug=settings.LOOP_DEBUG
+)
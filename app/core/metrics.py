@@ -0,0 +1,120 @@
+# app/core/metrics.py
+"""Minimal in-process metrics registry rendered in the Prometheus text format"""
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _labels(labels: Dict[str, str]) -> LabelValues:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format(name: str, labels: LabelValues, value: float) -> str:
+    if labels:
+        rendered = ",".join(f'{k}="{v}"' for k, v in labels)
+        return f"{name}{{{rendered}}} {value}"
+    return f"{name} {value}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_labels(labels), 0)
+
+    def samples(self) -> Iterable[str]:
+        for key, value in list(self._values.items()):
+            yield _format(self.name, key, value)
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = sorted(buckets)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0) + value
+
+    def samples(self) -> Iterable[str]:
+        for key, counts in list(self._counts.items()):
+            for bound, count in zip(self.buckets, counts):
+                yield _format(f"{self.name}_bucket", key + (("le", str(bound)),), count)
+            yield _format(f"{self.name}_bucket", key + (("le", "+Inf"),), counts[-1])
+            yield _format(f"{self.name}_sum", key, self._sums[key])
+            yield _format(f"{self.name}_count", key, counts[-1])
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def _get_or_create(self, cls, name: str, *args):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get_or_create(Counter, name, help)
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self._get_or_create(Gauge, name, help)
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float]) -> Histogram:
+        return self._get_or_create(Histogram, name, help, buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]):
+        """Register a callback producing (name, labels, value) gauge samples at scrape time"""
+        self._collectors.append(collector)
+
+    def render(self, extra: Optional[Iterable[Sample]] = None) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                lines.append(_format(name, _labels(labels), value))
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,275 @@
+# app/core/profiling.py
+"""
+On-demand sampling profiler and slow-request capture.
+
+Profiling sessions are armed by an admin. A session either profiles the next N
+requests this worker serves, or every request carrying its signed
+`X-Profile` token (valid on any worker until it expires). While a profiled
+request is in flight a background thread samples every thread's stack; the
+samples are written as collapsed stacks (`frame;frame;frame count`, the input
+format of flamegraph.pl and speedscope) to PROFILING_OUTPUT_DIR, one file per
+session and worker, and merged on download.
+
+Requests slower than the threshold are recorded in a bounded ring buffer with
+stack samples of the event-loop thread taken while they were still running and,
+when the request was traced (sampled, or SLOW_REQUEST_SPANS), the span
+breakdown (middleware, dependencies, repository, Mongo) of its trace.
+"""
+import base64
+import glob
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.base import generate_uuid
+
+slow_requests_captured = metrics.counter(
+    "slow_requests_captured_total", "Requests recorded in the slow-request buffer"
+)
+profile_samples = metrics.counter(
+    "profiler_samples_total", "Stack samples taken for profiling sessions"
+)
+
+
+def folded_stack(frame) -> str:
+    """One collapsed-stack line (root first) for a frame"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def thread_stack(thread_id: int, limit: int = 50) -> Optional[List[str]]:
+    """Formatted current stack of another thread, innermost call last"""
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return None
+    return [line.rstrip() for line in traceback.format_stack(frame, limit=limit)]
+
+
+@dataclass
+class ProfileSession:
+    id: str
+    mode: str  # "next" (next N requests on this worker) or "header" (signed X-Profile token)
+    requests: int  # How many requests to profile; ignored in header mode
+    expires_at: float
+    profiled: int = 0
+    token: Optional[str] = None
+
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+
+@dataclass
+class _InFlight:
+    method: str
+    path: str
+    started: float = field(default_factory=time.monotonic)
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    sessions: List[str] = field(default_factory=list)
+    stacks: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class Profiler:
+    def __init__(
+            self,
+            secret: str,
+            output_dir: str,
+            sample_interval: float = 0.005,
+            slow_threshold: Optional[float] = None,
+            slow_buffer_size: int = 100,
+            max_stacks: int = 3
+    ):
+        self.secret = secret.encode()
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.slow_threshold = slow_threshold
+        self.max_stacks = max_stacks
+        self.slow_requests: Deque[Dict[str, Any]] = deque(maxlen=slow_buffer_size)
+        self.sessions: Dict[str, ProfileSession] = {}
+        self.loop_thread_id: Optional[int] = None
+        self._in_flight: Dict[int, _InFlight] = {}
+        self._samples: Dict[str, Counter] = {}  # session id -> folded stack counts not yet written
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    # Sessions
+
+    def start_session(self, requests: int = 10, mode: str = "next", ttl: float = 300) -> ProfileSession:
+        session = ProfileSession(
+            id=generate_uuid(), mode=mode, requests=requests, expires_at=time.time() + ttl
+        )
+        if mode == "header":
+            session.token = self._sign(session.id, int(session.expires_at))
+        self.sessions[session.id] = session
+        return session
+
+    def _sign(self, session_id: str, expires_at: int) -> str:
+        payload = f"{session_id}.{expires_at}"
+        mac = hmac.new(self.secret, payload.encode(), hashlib.sha256).digest()
+        return f"{payload}.{base64.urlsafe_b64encode(mac).decode().rstrip('=')}"
+
+    def _verify(self, token: str) -> Optional[str]:
+        """Session id of a valid, unexpired X-Profile token"""
+        try:
+            session_id, expires_at, _ = token.split(".")
+            expires = int(expires_at)
+        except ValueError:
+            return None
+        if time.time() >= expires or not hmac.compare_digest(self._sign(session_id, expires), token):
+            return None
+        return session_id
+
+    def claim(self, profile_header: Optional[str]) -> List[str]:
+        """Sessions that want the request about to start"""
+        claimed = []
+        if profile_header:
+            session_id = self._verify(profile_header)
+            if session_id:
+                claimed.append(session_id)
+        for session in list(self.sessions.values()):
+            if session.expired:
+                del self.sessions[session.id]
+            elif session.mode == "next" and session.profiled < session.requests:
+                session.profiled += 1
+                claimed.append(session.id)
+        return claimed
+
+    # Request lifecycle (called on the event-loop thread)
+
+    def request_started(self, key: int, method: str, path: str, sessions: List[str]):
+        if self.loop_thread_id is None:
+            self.loop_thread_id = threading.get_ident()
+        with self._lock:
+            self._in_flight[key] = _InFlight(method=method, path=path, sessions=sessions)
+        if sessions or self.slow_threshold is not None:
+            self._ensure_thread()
+
+    def request_finished(self, key: int, status_code: int, spans: Optional[List[Any]] = None):
+        with self._lock:
+            request = self._in_flight.pop(key, None)
+            active = {s for r in self._in_flight.values() for s in r.sessions}
+            finished = [s for s in (request.sessions if request else []) if s not in active]
+            to_write = {s: self._samples.pop(s) for s in finished if s in self._samples}
+        if request is None:
+            return
+
+        for session_id, samples in to_write.items():
+            self._write_samples(session_id, samples)
+
+        duration = time.monotonic() - request.started
+        if self.slow_threshold is not None and duration >= self.slow_threshold:
+            self._record_slow(request, status_code, duration, spans or [])
+
+    def _record_slow(self, request: _InFlight, status_code: int, duration: float, spans: List[Any]):
+        root_start = min((span.start_ns for span in spans), default=0)
+        breakdown = [
+            {
+                "name": span.name,
+                "offset_ms": round((span.start_ns - root_start) / 1e6, 2),
+                "duration_ms": round(span.duration_ms, 2),
+                **({"error": span.error} if span.error else {}),
+            }
+            for span in sorted(spans, key=lambda span: span.start_ns)[:200]
+        ]
+        self.slow_requests.append({
+            "method": request.method,
+            "path": request.path,
+            "status_code": status_code,
+            "started_at": request.started_at.isoformat() + "Z",
+            "duration_ms": round(duration * 1000, 2),
+            "stacks": request.stacks,
+            "breakdown": breakdown,
+        })
+        slow_requests_captured.inc()
+
+    # Background sampling / watchdog thread
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            # Started lazily so it is created in each worker, not the pre-fork parent
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                in_flight = list(self._in_flight.values())
+            sessions = {s for request in in_flight for s in request.sessions}
+
+            if sessions:
+                frames = sys._current_frames()
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stacks = [
+                    f"{names.get(thread_id, thread_id)};{folded_stack(frame)}"
+                    for thread_id, frame in frames.items() if thread_id != me
+                ]
+                with self._lock:
+                    for session_id in sessions:
+                        self._samples.setdefault(session_id, Counter()).update(stacks)
+                profile_samples.inc(len(sessions))
+
+            if self.slow_threshold is not None and self.loop_thread_id is not None:
+                now = time.monotonic()
+                for request in in_flight:
+                    elapsed = now - request.started
+                    # One sample when the threshold is crossed, then one per further threshold
+                    due = elapsed >= self.slow_threshold * (len(request.stacks) + 1)
+                    if due and len(request.stacks) < self.max_stacks:
+                        request.stacks.append({
+                            "elapsed_ms": round(elapsed * 1000, 1),
+                            "loop_stack": thread_stack(self.loop_thread_id),
+                        })
+
+            time.sleep(self.sample_interval if sessions else 0.05)
+
+    # Output
+
+    def _write_samples(self, session_id: str, samples: Counter):
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{session_id}.{os.getpid()}.folded")
+        with open(path, "a") as f:
+            for stack, count in samples.items():
+                f.write(f"{stack} {count}\n")
+
+    def folded(self, session_id: str) -> Optional[str]:
+        """Collapsed stacks of a session merged across every worker on this host"""
+        paths = glob.glob(os.path.join(self.output_dir, f"{glob.escape(session_id)}.*.folded"))
+        if not paths:
+            return None
+        merged: Counter = Counter()
+        for path in paths:
+            with open(path) as f:
+                for line in f:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    if stack and count.isdigit():
+                        merged[stack] += int(count)
+        return "".join(f"{stack} {count}\n" for stack, count in merged.most_common())
+
+    def slow_request_snapshot(self) -> List[Dict[str, Any]]:
+        return list(self.slow_requests)
+
+
+profiler = Profiler(
+    secret=settings.JWT_SECRET_KEY,
+    output_dir=settings.PROFILING_OUTPUT_DIR,
+    sample_interval=settings.PROFILING_SAMPLE_INTERVAL_MS / 1000,
+    slow_threshold=(
+        settings.SLOW_REQUEST_THRESHOLD_MS / 1000 if settings.SLOW_REQUEST_THRESHOLD_MS is not None else None
+    ),
+    slow_buffer_size=settings.SLOW_REQUEST_BUFFER_SIZE
+)
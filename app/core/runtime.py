@@ -0,0 +1,64 @@
+# app/core/runtime.py
+"""Process-level helpers for the production launcher"""
+import math
+import os
+from typing import Dict, Optional
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """CPU quota from cgroup v2 (cpu.max) or v1 (cfs quota/period), None when unlimited"""
+    cpu_max = _read("/sys/fs/cgroup/cpu.max")
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    quota = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+    period = _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def available_cpus() -> float:
+    """CPUs this process may actually use: affinity mask capped by the cgroup quota"""
+    try:
+        cpus = float(len(os.sched_getaffinity(0)))
+    except AttributeError:  # Not available on macOS
+        cpus = float(os.cpu_count() or 1)
+
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, limit)
+    return cpus
+
+
+def default_workers() -> int:
+    """One async worker per usable CPU; a fractional quota rounds up"""
+    return max(1, math.ceil(available_cpus()))
+
+
+def memory_usage(pid: str = "self") -> Dict[str, int]:
+    """
+    Resident memory breakdown in kB from /proc/<pid>/smaps_rollup.
+    `Pss` splits shared pages between the processes that map them, so it shows
+    what copy-on-write sharing with the parent actually saves.
+    """
+    usage: Dict[str, int] = {}
+    rollup = _read(f"/proc/{pid}/smaps_rollup")
+    if not rollup:
+        return usage
+    for line in rollup.splitlines():
+        key, _, value = line.partition(":")
+        if key in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"):
+            usage[key] = int(value.split()[0])
+    return usage
@@ -1 +1,22 @@
 # APScheduler configuration
+import logging
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+logger = logging.getLogger(__name__)
+
+scheduler = AsyncIOScheduler(timezone="UTC")
+
+
+def start_scheduler():
+    """Start the background scheduler for this worker"""
+    if not scheduler.running:
+        scheduler.start()
+        logger.info("Scheduler started")
+
+
+def shutdown_scheduler():
+    """Stop the background scheduler without waiting for running jobs"""
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+        logger.info("Scheduler stopped")
@@ -0,0 +1,535 @@
+# app/core/tracing.py
+"""
+Lightweight request tracing with W3C `traceparent` propagation.
+
+A trace starts in TracingMiddleware. Child spans are opened with
+`tracer.span(...)` or the `traced` decorator and nest through a contextvar, so
+they follow the request across awaits, tasks and Motor's executor threads.
+Sampling is decided once at the head of the trace; unsampled requests create
+no spans at all, unless the tracer records them locally (for slow-request
+capture) without exporting them. Finished traces are handed to exporters on a background
+thread so exporting never blocks the event loop.
+"""
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pymongo import monitoring
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+spans_dropped = metrics.counter(
+    "tracing_spans_dropped_total", "Finished spans discarded because the export queue was full"
+)
+traces_exported = metrics.counter(
+    "tracing_traces_exported_total", "Traces handed to an exporter, by exporter"
+)
+
+
+class Span:
+    __slots__ = (
+        "trace", "trace_id", "span_id", "parent_id", "name", "kind",
+        "start_ns", "end_ns", "attributes", "error",
+    )
+
+    def __init__(self, trace: "_Trace", name: str, parent_id: Optional[str], kind: int, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.trace_id = trace.trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.trace.sampled else '00'}"
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace.finished(self)
+
+
+class _Trace:
+    """Spans of one sampled request, exported together when the root span ends"""
+    __slots__ = ("tracer", "trace_id", "sampled", "root", "spans", "lock")
+
+    def __init__(self, tracer: "Tracer", trace_id: str, sampled: bool = True):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.root: Optional[Span] = None
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()  # Mongo command spans finish on executor threads
+
+    def finished(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+            if span is not self.root or not self.sampled:
+                return
+            spans = list(self.spans)
+        self.tracer.export(spans)
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class SpanExporter(ABC):
+    name = "exporter"
+
+    @abstractmethod
+    def export(self, spans: List[Span]):
+        """Called on the export thread with every span of one trace"""
+
+
+def otlp_json(spans: List[Span], service_name: str) -> Dict[str, Any]:
+    """OTLP/JSON `ExportTraceServiceRequest` body for a list of spans"""
+
+    def value(v: Any) -> Dict[str, Any]:
+        if isinstance(v, bool):
+            return {"boolValue": v}
+        if isinstance(v, int):
+            return {"intValue": str(v)}
+        if isinstance(v, float):
+            return {"doubleValue": v}
+        return {"stringValue": str(v)}
+
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{
+            "scope": {"name": "app.core.tracing"},
+            "spans": [{
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                "name": span.name,
+                "kind": span.kind,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [{"key": k, "value": value(v)} for k, v in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            } for span in spans],
+        }],
+    }]}
+
+
+class ConsoleExporter(SpanExporter):
+    """Logs each trace as an indented tree with durations"""
+    name = "console"
+
+    def export(self, spans: List[Span]):
+        children: Dict[Optional[str], List[Span]] = {}
+        for span in spans:
+            children.setdefault(span.parent_id, []).append(span)
+        ids = {span.span_id for span in spans}
+        roots = [span for span in spans if span.parent_id not in ids]
+
+        lines = []
+
+        def walk(span: Span, depth: int):
+            error = f" ERROR {span.error}" if span.error else ""
+            lines.append(f"{'  ' * depth}{span.name} {span.duration_ms:.2f}ms{error}")
+            for child in sorted(children.get(span.span_id, []), key=lambda s: s.start_ns):
+                walk(child, depth + 1)
+
+        for root in roots:
+            walk(root, 0)
+        logger.info(f"trace {spans[0].trace_id}\n" + "\n".join(lines))
+
+
+class FileExporter(SpanExporter):
+    """Appends one OTLP/JSON document per trace to a local JSON-lines file for offline inspection"""
+    name = "file"
+
+    def __init__(self, path: str, service_name: str):
+        self.path = path
+        self.service_name = service_name
+
+    def export(self, spans: List[Span]):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(otlp_json(spans, self.service_name)) + "\n")
+
+
+class OTLPHttpExporter(SpanExporter):
+    """Posts OTLP/JSON to a collector's HTTP endpoint (`<endpoint>/v1/traces`)"""
+    name = "otlp"
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def export(self, spans: List[Span]):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(otlp_json(spans, self.service_name)).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.0, exporters: Optional[List[SpanExporter]] = None,
+                 max_queue: int = 1000, record_unsampled: bool = False):
+        self.sample_rate = sample_rate
+        self.exporters = exporters or []
+        # Keep spans of unsampled requests in memory (never exported) for slow-request capture
+        self.record_unsampled = record_unsampled
+        self._queue: "queue.Queue[List[Span]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    @property
+    def recording(self) -> bool:
+        """Whether any request can carry spans, exported or not"""
+        return self.enabled or self.record_unsampled
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None, **attributes) -> Optional[Span]:
+        """
+        Root span for an incoming request, or None when the trace isn't sampled
+        (and unsampled traces aren't recorded). A valid `traceparent` continues
+        the caller's trace and sampling decision.
+        """
+        match = TRACEPARENT.match(traceparent.strip().lower()) if traceparent else None
+        if match:
+            trace_id, parent_id, flags = match.groups()
+            sampled = self.enabled and bool(int(flags, 16) & 1)
+        else:
+            trace_id, parent_id = os.urandom(16).hex(), None
+            sampled = self.enabled and random.random() < self.sample_rate
+        if not sampled and not self.record_unsampled:
+            return None
+
+        trace = _Trace(self, trace_id, sampled)
+        trace.root = Span(trace, name, parent_id, KIND_SERVER, attributes)
+        return trace.root
+
+    @contextmanager
+    def span(self, name: str, kind: int = KIND_INTERNAL, **attributes) -> Iterator[Optional[Span]]:
+        """Child of the current span; a no-op outside a recorded trace"""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        span = Span(parent.trace, name, parent.span_id, kind, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    @contextmanager
+    def activate(self, span: Optional[Span]) -> Iterator[None]:
+        token = _current_span.set(span)
+        try:
+            yield
+        finally:
+            _current_span.reset(token)
+
+    def export(self, spans: List[Span]):
+        if not self.exporters:
+            return
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            spans_dropped.inc(len(spans))
+            return
+        if self._thread is None or not self._thread.is_alive():
+            # Started lazily so it is created in each worker, not the pre-fork parent
+            self._thread = threading.Thread(target=self._export_loop, name="trace-exporter", daemon=True)
+            self._thread.start()
+
+    def _export_loop(self):
+        while True:
+            spans = self._queue.get()
+            for exporter in self.exporters:
+                try:
+                    exporter.export(spans)
+                    traces_exported.inc(exporter=exporter.name)
+                except Exception as e:
+                    logger.warning(f"Trace export via {exporter.name} failed: {e}")
+
+
+def traced(name: Optional[str] = None):
+    """
+    Decorator opening a span around an async function. On methods with a
+    `collection_name` (repositories) the span is named `<collection>.<method>`.
+    """
+
+    def decorator(fn: Callable):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return await fn(*args, **kwargs)
+            span_name = name
+            if span_name is None:
+                collection = getattr(args[0], "collection_name", None) if args else None
+                span_name = f"repository {collection}.{fn.__name__}" if collection else fn.__qualname__
+            with tracer.span(span_name):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class TracingMiddleware:
+    """
+    Outermost ASGI middleware: opens the request's root span from an incoming
+    `traceparent` (or samples a new trace) and returns the server span's
+    `traceparent` so clients can look the trace up.
+    """
+
+    def __init__(self, app: ASGIApp, tracer: "Tracer"):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        root = self.tracer.start_trace(
+            f"{scope['method']} {scope['path']}",
+            Headers(scope=scope).get("traceparent"),
+            **{"http.method": scope["method"], "http.target": scope["path"]}
+        )
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+                MutableHeaders(scope=message)["traceparent"] = root.traceparent
+            await send(message)
+
+        error = None
+        try:
+            with self.tracer.activate(root):
+                await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            root.end(error=error)
+
+
+def traced_middleware(cls: type) -> type:
+    """Wrap an ASGI middleware class so every call through it gets its own span"""
+
+    class Traced:
+        def __init__(self, app: ASGIApp, *args, **kwargs):
+            self.inner = cls(app, *args, **kwargs)
+
+        async def __call__(self, scope: Scope, receive: Receive, send: Send):
+            with tracer.span(f"middleware {cls.__name__}"):
+                await self.inner(scope, receive, send)
+
+    Traced.__name__ = Traced.__qualname__ = cls.__name__
+    return Traced
+
+
+def _traced_call(call: Callable, name: str) -> Callable:
+    """
+    Same-kind wrapper (async or sync) so FastAPI still awaits or threadpools it
+    correctly. `__wrapped__` lets FastAPI see the original, e.g. a security scheme.
+    """
+    if inspect.iscoroutinefunction(call) or inspect.iscoroutinefunction(getattr(call, "__call__", None)):
+        async def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return await call(*args, **kwargs)
+    else:
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return call(*args, **kwargs)
+
+    wrapper.__wrapped__ = call
+    return wrapper
+
+
+def _call_name(call: Callable) -> str:
+    return getattr(call, "__name__", None) or type(call).__name__
+
+
+def _is_generator_call(call: Callable) -> bool:
+    for fn in (call, getattr(call, "__call__", None)):
+        if inspect.isgeneratorfunction(fn) or inspect.isasyncgenfunction(fn):
+            return True
+    return False
+
+
+def _served_dependants(routes) -> Iterator[Any]:
+    """
+    Dependants of every route the app serves. Included routers appear as one
+    entry (`_IncludedRouter`) whose routes are served through per-inclusion
+    copies with their own dependants (`effective_candidates`), built here
+    ahead of the first request; mounts and plain routers are searched too.
+    """
+    for route in routes:
+        candidates = getattr(route, "effective_candidates", None)
+        if callable(candidates):
+            yield from _served_dependants(candidates())
+            yield from _served_dependants(route.effective_low_priority_routes())
+        elif getattr(route, "dependant", None) is not None:
+            yield route.dependant
+        elif getattr(route, "routes", None):
+            yield from _served_dependants(route.routes)
+
+
+def instrument_app(application):
+    """
+    Wrap the app's middleware and route dependencies in spans. Call after all
+    middleware and routers are added and before the first request.
+    Generator dependencies (setup/teardown) are left as they are.
+    """
+    from starlette.middleware import Middleware
+
+    application.user_middleware = [
+        Middleware(traced_middleware(m.cls), *m.args, **m.kwargs) for m in application.user_middleware
+    ]
+
+    # Shared dependencies map to one wrapper so FastAPI's per-request cache still dedupes them
+    wrappers: Dict[Any, Callable] = {}
+    wrapped = set()  # ids of the wrappers themselves, so a dependant reached twice isn't wrapped again
+
+    def wrap(dependant, kind: str):
+        call = dependant.call
+        if call is None or id(call) in wrapped or _is_generator_call(call):
+            return
+        key = id(call)
+        if key not in wrappers:
+            wrappers[key] = _traced_call(call, f"{kind} {_call_name(call)}")
+        dependant.call = wrappers[key]
+        wrapped.add(id(dependant.call))
+
+    seen = set()
+
+    def walk(dependant):
+        for sub in dependant.dependencies:
+            if id(sub) not in seen:
+                seen.add(id(sub))
+                walk(sub)
+                wrap(sub, "dependency")
+
+    for dependant in _served_dependants(application.routes):
+        walk(dependant)
+        wrap(dependant, "endpoint")
+
+
+class MongoCommandTracer(monitoring.CommandListener):
+    """
+    pymongo command listener recording each command as a client span under the
+    current span. Motor copies contextvars into its executor, so the current
+    span is visible on the thread that runs the command.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Tuple[int, Any], Span] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        parent = _current_span.get()
+        if parent is None:
+            return
+        attributes = {
+            "db.system": "mongodb",
+            "db.name": event.database_name,
+            "db.operation": event.command_name,
+            "net.peer.name": f"{event.connection_id[0]}:{event.connection_id[1]}",
+        }
+        collection = event.command.get(event.command_name)
+        if isinstance(collection, str):
+            attributes["db.mongodb.collection"] = collection
+        span = Span(parent.trace, f"mongo {event.command_name}", parent.span_id, KIND_CLIENT, attributes)
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = span
+
+    def _finish(self, event, error: Optional[str] = None):
+        with self._lock:
+            span = self._pending.pop((event.request_id, event.connection_id), None)
+        if span is None:
+            return
+        if error:
+            span.error = error
+        span.end()
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, error=str(event.failure))
+
+
+def _build_tracer() -> Tracer:
+    exporters: List[SpanExporter] = []
+    if settings.TRACING_ENABLED:
+        for name in filter(None, (n.strip() for n in settings.TRACING_EXPORTERS.split(","))):
+            if name == "console":
+                exporters.append(ConsoleExporter())
+            elif name == "file":
+                exporters.append(FileExporter(settings.TRACING_FILE_PATH, settings.PROJECT_NAME))
+            elif name == "otlp":
+                exporters.append(OTLPHttpExporter(settings.TRACING_OTLP_ENDPOINT, settings.PROJECT_NAME))
+            else:
+                raise ValueError(f"Unknown trace exporter: {name}")
+    return Tracer(
+        sample_rate=settings.TRACING_SAMPLE_RATE,
+        exporters=exporters,
+        # Span breakdown for slow requests that weren't sampled; costs spans on every request
+        record_unsampled=settings.SLOW_REQUEST_THRESHOLD_MS is not None and settings.SLOW_REQUEST_SPANS
+    )
+
+
+tracer = _build_tracer()
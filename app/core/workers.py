@@ -0,0 +1,21 @@
+# app/core/workers.py
+"""Gunicorn worker class for the production launcher"""
+import importlib.util
+import logging
+
+from uvicorn_worker import UvicornWorker
+
+logger = logging.getLogger(__name__)
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+class ProductionUvicornWorker(UvicornWorker):
+    """Uvicorn worker pinned to uvloop/httptools when they are installed"""
+    CONFIG_KWARGS = {
+        "loop": "uvloop" if _installed("uvloop") else "asyncio",
+        "http": "httptools" if _installed("httptools") else "h11",
+        "lifespan": "on",
+    }
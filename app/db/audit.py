@@ -0,0 +1,204 @@
+# app/db/audit.py
+"""Audit trail of auth and admin activity, written in the background in batches"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from pymongo.errors import BulkWriteError, CollectionInvalid, OperationFailure
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+audit_enqueued = metrics.counter(
+    "audit_events_enqueued_total", "Audit events accepted into the in-memory queue"
+)
+audit_written = metrics.counter(
+    "audit_events_written_total", "Audit events persisted"
+)
+audit_dropped = metrics.counter(
+    "audit_events_dropped_total", "Audit events lost, by reason (overflow, write_error)"
+)
+audit_queue_depth = metrics.gauge(
+    "audit_queue_depth", "Audit events waiting to be written"
+)
+audit_flush_seconds = metrics.histogram(
+    "audit_flush_seconds", "Duration of one batched audit insert",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
+
+
+@dataclass
+class AuditEvent:
+    action: str  # e.g. "login", "token_refresh", "user_update"
+    outcome: str = "success"
+    actor_id: Optional[str] = None  # Who did it
+    target_id: Optional[str] = None  # Whom it was done to
+    ip: Optional[str] = None
+    user_agent: Optional[str] = None
+    details: Dict[str, Any] = field(default_factory=dict)
+    # BSON date (not epoch ms like other collections): TTL and time-series collections require it
+    timestamp: datetime = field(default_factory=datetime.utcnow)
+
+    def to_document(self) -> Dict[str, Any]:
+        doc = asdict(self)
+        # Time-series buckets are grouped by meta; keep it low-cardinality
+        doc["meta"] = {"action": doc.pop("action"), "outcome": doc.pop("outcome")}
+        return doc
+
+
+class AuditWriter:
+    """
+    Queues audit events in memory and writes them with one unordered
+    insert_many per batch, when `batch_size` events are waiting or every
+    `flush_interval` seconds.
+
+    `record` never blocks or touches the database. The queue holds at most
+    `max_queue` events; beyond that new events are dropped and counted, so a
+    slow or unreachable database can't grow memory without bound. A batch that
+    fails with a transient error is put back at the head of the queue once.
+    `stop` flushes whatever is still queued.
+    """
+
+    def __init__(
+            self,
+            collection_name: str = "audit_events",
+            batch_size: int = 500,
+            flush_interval: float = 1.0,
+            max_queue: int = 10000,
+            retention_days: int = 90,
+            time_series: bool = True
+    ):
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.retention_days = retention_days
+        self.time_series = time_series
+        self._queue: Deque[Tuple[Dict[str, Any], int]] = deque()  # (document, failed attempts)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.started = False
+
+    @property
+    def collection(self):
+        from app.db.mongodb import db
+
+        return db.db[self.collection_name]
+
+    def record(self, action: str, outcome: str = "success", **fields):
+        """Queue an event; see AuditEvent for the accepted fields"""
+        if not self.started:
+            return
+        if len(self._queue) >= self.max_queue:
+            audit_dropped.inc(reason="overflow")
+            return
+
+        self._queue.append((AuditEvent(action=action, outcome=outcome, **fields).to_document(), 0))
+        audit_enqueued.inc()
+        audit_queue_depth.set(len(self._queue))
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    async def start(self):
+        await self._ensure_collection()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+        self.started = True
+
+    async def stop(self):
+        # Let the loop finish the batch it may be writing; cancelling it mid-flush would lose that batch
+        self.started = False
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        while self._queue:
+            if not await self.flush():
+                break
+
+    async def _ensure_collection(self):
+        from app.db.mongodb import db
+
+        retention = self.retention_days * 86400
+        existing = await db.db.list_collections(filter={"name": self.collection_name}).to_list(length=1)
+        if existing:
+            if existing[0].get("options", {}).get("timeseries"):
+                return
+        elif self.time_series:
+            try:
+                await db.db.create_collection(
+                    self.collection_name,
+                    timeseries={"timeField": "timestamp", "metaField": "meta", "granularity": "seconds"},
+                    expireAfterSeconds=retention
+                )
+                return
+            except CollectionInvalid:
+                # Created by another worker meanwhile
+                return
+            except OperationFailure as e:
+                logger.warning(f"Time-series collections unavailable ({e}); using a TTL index instead")
+
+        await self.collection.create_index("timestamp", expireAfterSeconds=retention, name="timestamp_ttl")
+
+    async def _run(self):
+        while self.started:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._queue:
+                if not await self.flush() or len(self._queue) < self.batch_size:
+                    break
+
+    async def flush(self) -> bool:
+        """Write one batch; returns False when the database could not be reached"""
+        batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+        audit_queue_depth.set(len(self._queue))
+        if not batch:
+            return True
+
+        start = time.monotonic()
+        try:
+            await self.collection.insert_many([doc for doc, _ in batch], ordered=False)
+            audit_written.inc(len(batch))
+            return True
+        except BulkWriteError as e:
+            # Unordered: everything except the reported documents was written
+            failed = len(e.details.get("writeErrors", []))
+            audit_written.inc(len(batch) - failed)
+            audit_dropped.inc(failed, reason="write_error")
+            return True
+        except Exception as e:
+            logger.warning(f"Audit flush of {len(batch)} events failed: {e}")
+            retry = [(doc, attempts + 1) for doc, attempts in batch if attempts == 0]
+            audit_dropped.inc(len(batch) - len(retry), reason="write_error")
+            # Requeue ahead of newer events, within the memory bound
+            room = max(self.max_queue - len(self._queue), 0)
+            audit_dropped.inc(max(len(retry) - room, 0), reason="overflow")
+            self._queue.extendleft(reversed(retry[:room]))
+            audit_queue_depth.set(len(self._queue))
+            return False
+        except asyncio.CancelledError:
+            # Possibly unwritten: put it back for whoever drains the queue next
+            self._queue.extendleft(reversed(batch))
+            audit_queue_depth.set(len(self._queue))
+            raise
+        finally:
+            audit_flush_seconds.observe(time.monotonic() - start)
+
+
+audit_writer = AuditWriter(
+    collection_name=settings.AUDIT_COLLECTION,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL_MS / 1000,
+    max_queue=settings.AUDIT_MAX_QUEUE,
+    retention_days=settings.AUDIT_RETENTION_DAYS,
+    time_series=settings.AUDIT_TIME_SERIES
+)
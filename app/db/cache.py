@@ -0,0 +1,256 @@
+# app/db/cache.py
+"""Opt-in read-through cache for BaseRepository subclasses"""
+import json
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Optional, Set
+
+from cachetools import LRUCache
+
+from app.core.metrics import metrics
+
+
+@dataclass
+class CacheEntry:
+    value: Optional[Dict[str, Any]]  # Raw MongoDB document, None for a cached miss
+    expires_at: float
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+    stale: int = 0
+    bypassed: int = 0
+    sets: int = 0
+    invalidations: int = 0
+    evictions: int = 0
+    by_shape: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    def record(self, shape: str, outcome: str):
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        counts = self.by_shape.setdefault(shape, {})
+        counts[outcome] = counts.get(outcome, 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.negative_hits + self.misses + self.stale
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "bypassed": self.bypassed,
+            "sets": self.sets,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            "by_shape": self.by_shape,
+        }
+
+
+class CacheBackend(ABC):
+    """Storage for cache entries; in-process today, a shared store can implement the same interface"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CacheEntry]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, entry: CacheEntry):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+
+class _CountingLRUCache(LRUCache):
+    def __init__(self, maxsize: int, stats: CacheStats):
+        super().__init__(maxsize=maxsize)
+        self._stats = stats
+
+    def popitem(self):
+        item = super().popitem()
+        self._stats.evictions += 1
+        return item
+
+
+class InMemoryCacheBackend(CacheBackend):
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.stats = CacheStats()
+        self._entries = _CountingLRUCache(maxsize, self.stats)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        return self._entries.get(key)
+
+    def set(self, key: str, entry: CacheEntry):
+        self._entries[key] = entry
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class RepositoryCache:
+    """
+    Caches raw documents returned by `find_one` keyed by the exact query.
+
+    TTLs are configured per query shape, i.e. the sorted, comma-joined query
+    keys ("_id", "email", "oauth_id,oauth_provider"); a TTL of 0 disables
+    caching for that shape. Writes on this worker record the document's
+    `updated_at` as a version stamp, so an older cached copy is never served
+    after a write (read-your-writes), even if it raced into the cache.
+
+    Misses are cached (for `negative_ttl`) only for the configured shapes and
+    "_id", and only in the size-bounded backend. A write drops just the misses
+    the written document now satisfies: the keys built from its own values
+    for those shapes (see `lookups`).
+    """
+
+    def __init__(
+            self,
+            ttls: Optional[Dict[str, float]] = None,
+            default_ttl: float = 60,
+            negative_ttl: float = 5,
+            maxsize: int = 10000,
+            backend: Optional[CacheBackend] = None
+    ):
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.backend = backend or InMemoryCacheBackend(maxsize=maxsize)
+        self.stats: CacheStats = getattr(self.backend, "stats", None) or CacheStats()
+        self._versions = LRUCache(maxsize=maxsize)  # document id -> last written updated_at
+        self._keys_by_id: Dict[Any, Set[str]] = LRUCache(maxsize=maxsize)
+        # Shapes whose misses are cached: those a written document's values can be matched against
+        self._lookup_shapes: FrozenSet[str] = frozenset({"_id", *self.ttls})
+
+    @staticmethod
+    def shape(query: Dict) -> str:
+        return ",".join(sorted(query.keys()))
+
+    def ttl_for(self, shape: str) -> float:
+        return self.ttls.get(shape, self.default_ttl)
+
+    def lookups(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """The document's values for the fields of the cached lookup shapes"""
+        return {
+            name: doc[name] for shape in self._lookup_shapes for name in shape.split(",") if name in doc
+        }
+
+    @staticmethod
+    def key(collection_name: str, query: Dict) -> Optional[str]:
+        try:
+            return f"{collection_name}:{json.dumps(query, sort_keys=True, default=str)}"
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, key: str, shape: str):
+        """Return (found, document); found is False on a miss"""
+        entry = self.backend.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            self.stats.record(shape, "misses")
+            return False, None
+
+        if entry.value is None:
+            self.stats.record(shape, "negative_hits")
+            return True, None
+
+        version = self._versions.get(entry.value.get("_id"))
+        if version is not None and entry.value.get("updated_at", 0) < version:
+            self.backend.delete(key)
+            self.stats.record(shape, "stale")
+            return False, None
+
+        self.stats.record(shape, "hits")
+        return True, dict(entry.value)
+
+    def set(self, key: str, shape: str, doc: Optional[Dict[str, Any]]):
+        if doc is None:
+            ttl = self.negative_ttl if shape in self._lookup_shapes else 0
+        else:
+            ttl = self.ttl_for(shape)
+        if ttl <= 0:
+            return
+
+        if doc is not None:
+            version = self._versions.get(doc.get("_id"))
+            if version is not None and doc.get("updated_at", 0) < version:
+                # A write landed while this read was in flight
+                return
+            self._keys_by_id.setdefault(doc["_id"], set()).add(key)
+
+        self.backend.set(key, CacheEntry(value=dict(doc) if doc else None, expires_at=time.monotonic() + ttl))
+        self.stats.sets += 1
+
+    def invalidate(
+            self,
+            collection_name: str,
+            doc_id: Any,
+            version: Optional[int] = None,
+            lookups: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Drop every entry for a document after a write, and the cached misses
+        its `lookups` values now satisfy (a create, or e.g. an email change)
+        """
+        if version is not None:
+            self._versions[doc_id] = max(version, self._versions.get(doc_id, 0))
+        for key in self._keys_by_id.pop(doc_id, ()):
+            self.backend.delete(key)
+        lookups = {"_id": doc_id, **(lookups or {})}
+        for shape in self._lookup_shapes:
+            names = shape.split(",")
+            if all(name in lookups for name in names):
+                key = self.key(collection_name, {name: lookups[name] for name in names})
+                if key is not None:
+                    self.backend.delete(key)
+        self.stats.invalidations += 1
+
+    def clear(self):
+        self.backend.clear()
+        self._keys_by_id.clear()
+
+
+def cached_repository(
+        ttls: Optional[Dict[str, float]] = None,
+        default_ttl: float = 60,
+        negative_ttl: float = 5,
+        maxsize: int = 10000,
+        backend: Optional[CacheBackend] = None
+):
+    """
+    Class decorator enabling the read-through cache on a BaseRepository subclass.
+    The cache is shared by every instance of the class within the worker.
+
+        @cached_repository(ttls={"_id": 60, "email": 30})
+        class UserRepository(BaseRepository[User]): ...
+    """
+
+    def decorator(cls):
+        cache = cls.cache = RepositoryCache(
+            ttls=ttls,
+            default_ttl=default_ttl,
+            negative_ttl=negative_ttl,
+            maxsize=maxsize,
+            backend=backend
+        )
+
+        def collect():
+            for name, value in cache.stats.as_dict().items():
+                if isinstance(value, (int, float)):
+                    yield f"repository_cache_{name}", {"repository": cls.__name__}, value
+
+        metrics.register_collector(collect)
+        return cls
+
+    return decorator
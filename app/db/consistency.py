@@ -0,0 +1,106 @@
+# app/db/consistency.py
+"""
+Named consistency profiles: read preference, read concern and write concern
+applied to repository collections.
+
+Profiles come from `settings.CONSISTENCY_PROFILES`. A repository uses its
+class-level `consistency_profile` (else `CONSISTENCY_DEFAULT_PROFILE`), and
+code can switch the profile for everything in a block, or a whole request,
+with `use()`. Settings a profile leaves out fall back to the client's.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional
+
+from pymongo import WriteConcern
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import (
+    Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred, _ServerMode
+)
+
+from app.core.config import settings
+
+_MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# Profile selected for the current context, overriding repository defaults
+_profile: ContextVar[Optional[str]] = ContextVar("consistency_profile", default=None)
+
+
+@dataclass(frozen=True)
+class ConsistencyProfile:
+    name: str
+    read_preference: Optional[_ServerMode] = None
+    read_concern: Optional[ReadConcern] = None
+    write_concern: Optional[WriteConcern] = None
+
+    @classmethod
+    def from_settings(cls, name: str, options: Dict[str, Any]) -> "ConsistencyProfile":
+        """
+        `read_preference` (mode name), `max_staleness_seconds` and `tag_sets` for
+        non-primary modes, `read_concern` (level) and `write_concern` (WriteConcern kwargs)
+        """
+        read_preference = None
+        mode = options.get("read_preference")
+        if mode is not None:
+            if mode not in _MODES:
+                raise ValueError(f"Consistency profile {name!r}: unknown read preference {mode!r}")
+            if mode == "primary":
+                read_preference = Primary()
+            else:
+                read_preference = _MODES[mode](
+                    tag_sets=options.get("tag_sets"),
+                    max_staleness=options.get("max_staleness_seconds", -1)
+                )
+        read_concern = ReadConcern(options["read_concern"]) if options.get("read_concern") else None
+        write_concern = WriteConcern(**options["write_concern"]) if options.get("write_concern") else None
+        return cls(name, read_preference, read_concern, write_concern)
+
+    @property
+    def reads_primary(self) -> bool:
+        """Whether reads see the primary's latest writes (else they may lag behind)"""
+        return self.read_preference is None or self.read_preference == Primary()
+
+    def apply(self, collection):
+        if self.read_preference is None and self.read_concern is None and self.write_concern is None:
+            return collection
+        return collection.with_options(
+            read_preference=self.read_preference,
+            read_concern=self.read_concern,
+            write_concern=self.write_concern
+        )
+
+
+profiles: Dict[str, ConsistencyProfile] = {
+    name: ConsistencyProfile.from_settings(name, options)
+    for name, options in settings.CONSISTENCY_PROFILES.items()
+}
+
+
+def get_profile(name: str) -> ConsistencyProfile:
+    try:
+        return profiles[name]
+    except KeyError:
+        raise ValueError(f"Unknown consistency profile: {name}")
+
+
+def current(default: Optional[str] = None) -> ConsistencyProfile:
+    """The profile in effect: the context's, else `default`, else the configured default"""
+    return get_profile(_profile.get() or default or settings.CONSISTENCY_DEFAULT_PROFILE)
+
+
+@contextmanager
+def use(name: str) -> Iterator[ConsistencyProfile]:
+    """Run repository operations in the block under profile `name`"""
+    profile = get_profile(name)
+    token = _profile.set(name)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
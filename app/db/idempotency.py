@@ -0,0 +1,161 @@
+# app/db/idempotency.py
+"""Stored responses for Idempotency-Key requests"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import Binary
+from cachetools import TTLCache
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.core import deadline
+from app.core.config import settings
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str  # Hash of the request body the response belongs to
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers)
+
+
+@dataclass
+class Claim:
+    """Outcome of claiming a key: run the request, replay `response`, or someone else is running it"""
+    owned: bool = False
+    response: Optional[StoredResponse] = None
+    fingerprint: Optional[str] = None  # Of the in-progress request when neither owned nor done
+
+
+class IdempotencyStore:
+    """
+    Responses by idempotency key in a TTL-indexed collection, fronted by an
+    in-process cache of completed responses bounded by total size.
+
+    A key is claimed by inserting an in-progress record with a lease; the
+    worker that inserted it runs the request, renewing the lease meanwhile,
+    and completes the record. If that worker dies the lease runs out and the
+    next duplicate takes the key over.
+    """
+
+    def __init__(
+            self,
+            collection_name: str = "idempotency_keys",
+            ttl: float = 86400,
+            lease: float = 60,
+            cache_bytes: int = 16 * 1024 * 1024
+    ):
+        self.collection_name = collection_name
+        self.ttl = ttl
+        self.lease = lease
+        self.cache: TTLCache = TTLCache(maxsize=cache_bytes, ttl=ttl, getsizeof=lambda response: response.size)
+
+    @property
+    def collection(self):
+        from app.db.mongodb import db
+
+        return db.db[self.collection_name]
+
+    async def ensure_indexes(self):
+        await self.collection.create_indexes([
+            IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=int(self.ttl)),
+        ])
+
+    async def claim(self, key: str, fingerprint: str) -> Claim:
+        cached = self.cache.get(key)
+        if cached is not None:
+            return Claim(response=cached)
+
+        now = datetime.utcnow()
+        try:
+            with deadline.db_timeout():
+                await self.collection.insert_one({
+                    "_id": key,
+                    "state": "in_progress",
+                    "fingerprint": fingerprint,
+                    "lease_until": now + timedelta(seconds=self.lease),
+                    "created_at": now,
+                })
+            return Claim(owned=True)
+        except DuplicateKeyError:
+            pass
+
+        with deadline.db_timeout():
+            # Take over a key whose owner's lease ran out without completing it
+            taken = await self.collection.find_one_and_update(
+                {"_id": key, "state": "in_progress", "lease_until": {"$lt": now}},
+                {"$set": {"fingerprint": fingerprint, "lease_until": now + timedelta(seconds=self.lease)}},
+                return_document=ReturnDocument.AFTER
+            )
+        if taken is not None:
+            return Claim(owned=True)
+        return await self.lookup(key)
+
+    async def lookup(self, key: str) -> Claim:
+        """Current state of a key claimed by someone else"""
+        with deadline.db_timeout():
+            doc = await self.collection.find_one({"_id": key})
+        if doc is None:
+            # Expired or released meanwhile; free to claim again
+            return Claim()
+        if doc["state"] == "done":
+            response = self._from_doc(doc)
+            self._remember(key, response)
+            return Claim(response=response)
+        return Claim(fingerprint=doc["fingerprint"])
+
+    def _remember(self, key: str, response: StoredResponse):
+        if response.size <= self.cache.maxsize:
+            self.cache[key] = response
+
+    async def complete(self, key: str, response: StoredResponse):
+        self._remember(key, response)
+        with deadline.db_timeout():
+            await self.collection.update_one(
+                {"_id": key},
+                {
+                    "$set": {
+                        "state": "done",
+                        "status": response.status,
+                        "headers": [[name, value] for name, value in response.headers],
+                        "body": Binary(response.body),
+                    },
+                    "$unset": {"lease_until": ""},
+                }
+            )
+
+    async def renew(self, key: str):
+        """Extend the lease of an in-progress key whose request is still running"""
+        with deadline.db_timeout():
+            await self.collection.update_one(
+                {"_id": key, "state": "in_progress"},
+                {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=self.lease)}}
+            )
+
+    async def release(self, key: str):
+        """Forget an in-progress key whose request failed, so a retry runs it again"""
+        with deadline.db_timeout():
+            await self.collection.delete_one({"_id": key, "state": "in_progress"})
+
+    @staticmethod
+    def _from_doc(doc: Dict[str, Any]) -> StoredResponse:
+        return StoredResponse(
+            fingerprint=doc["fingerprint"],
+            status=doc["status"],
+            headers=[(bytes(name), bytes(value)) for name, value in doc["headers"]],
+            body=bytes(doc["body"])
+        )
+
+
+idempotency_store = IdempotencyStore(
+    collection_name=settings.IDEMPOTENCY_COLLECTION,
+    ttl=settings.IDEMPOTENCY_TTL_SECONDS,
+    lease=settings.IDEMPOTENCY_LEASE_SECONDS,
+    cache_bytes=settings.IDEMPOTENCY_CACHE_BYTES
+)
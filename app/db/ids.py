@@ -0,0 +1,115 @@
+# app/db/ids.py
+"""
+Stored representation of UUID `_id`s.
+
+Models and the API always carry ids as 32-character hex strings
+(`generate_uuid`). On disk an id is either that string ("hex") or a 16-byte
+BSON Binary subtype 4 UUID ("binary"), which is a third of the size in the
+document and in every index containing `_id`. "dual" is the mode to run
+while `scripts/migrate_ids.py` rewrites existing documents: new documents are
+stored binary and lookups match either representation.
+
+Repositories convert at the driver boundary: filters on the way out with
+`query`, and fetched documents on the way in with `decode`, so caches,
+batch loaders, invalidation and write-behind all keep working with hex ids.
+"""
+import uuid
+from typing import Any, Dict, Optional
+
+from bson import Binary
+from bson.binary import UUID_SUBTYPE
+
+REPRESENTATIONS = ("hex", "dual", "binary")
+
+
+def to_binary(id: str) -> Optional[Binary]:
+    """Binary UUID for a hex id, or None if `id` is not a 32-character hex UUID"""
+    if not isinstance(id, str) or len(id) != 32:
+        return None
+    try:
+        return Binary(uuid.UUID(hex=id).bytes, UUID_SUBTYPE)
+    except ValueError:
+        return None
+
+
+def to_hex(value: Any) -> Any:
+    """Hex string for a stored binary UUID; any other value as it is"""
+    if isinstance(value, uuid.UUID):
+        return value.hex
+    if isinstance(value, Binary) and value.subtype == UUID_SUBTYPE:
+        return uuid.UUID(bytes=bytes(value)).hex
+    return value
+
+
+class IdCodec:
+    def __init__(self, representation: str = "hex"):
+        if representation not in REPRESENTATIONS:
+            raise ValueError(f"Unknown id representation: {representation}")
+        self.representation = representation
+
+    def encode(self, id: Any) -> Any:
+        """The value to store as `_id` of a new document"""
+        if self.representation == "hex":
+            return id
+        return to_binary(id) or id
+
+    def match(self, id: Any) -> Any:
+        """Filter value matching the document with hex id `id`"""
+        if self.representation == "hex":
+            return id
+        binary = to_binary(id)
+        if binary is None:
+            return id  # Not a UUID (e.g. a malformed path parameter): matches only itself
+        if self.representation == "binary":
+            return binary
+        return {"$in": [id, binary]}
+
+    def match_many(self, ids: Any) -> Dict[str, Any]:
+        if self.representation == "hex":
+            return {"$in": list(ids)}
+        values = []
+        for id in ids:
+            binary = to_binary(id)
+            if binary is None or self.representation == "dual":
+                values.append(id)
+            if binary is not None:
+                values.append(binary)
+        return {"$in": values}
+
+    def query(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        """A filter with hex ids in a top-level `_id` (equality or `$in`) in stored form"""
+        if self.representation == "hex" or "_id" not in query:
+            return query
+        value = query["_id"]
+        if isinstance(value, dict):
+            if set(value) != {"$in"}:
+                return query
+            value = self.match_many(value["$in"])
+        else:
+            value = self.match(value)
+        return {**query, "_id": value}
+
+    @staticmethod
+    def decode(doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Give a fetched document its hex id (in place)"""
+        if doc and "_id" in doc:
+            doc["_id"] = to_hex(doc["_id"])
+        return doc
+
+    @staticmethod
+    def to_cursor(value: Any) -> Any:
+        """JSON-safe form of a stored `_id` for keyset cursors, keeping its BSON type"""
+        hex_id = to_hex(value)
+        return {"uuid": hex_id} if hex_id is not value else value
+
+    def after(self, cursor_value: Any) -> Dict[str, Any]:
+        """Filter for `_id`s sorting after a `to_cursor` value (strings sort before binary)"""
+        if isinstance(cursor_value, dict):
+            binary = to_binary(cursor_value.get("uuid"))
+            if binary is None:
+                raise ValueError("Invalid cursor")
+            return {"_id": {"$gt": binary}}
+        if self.representation == "hex":
+            return {"_id": {"$gt": cursor_value}}
+        return {"$or": [{"_id": {"$gt": cursor_value}}, {"_id": {"$type": "binData"}}]}
+
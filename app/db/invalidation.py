@@ -0,0 +1,327 @@
+# app/db/invalidation.py
+"""Broadcast repository writes to every worker so in-process caches can drop stale entries"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from bson import Timestamp
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+HOST_ID = socket.gethostname()
+
+
+def worker_id() -> str:
+    # Resolved per call: the module may be imported in a pre-fork parent
+    return f"{HOST_ID}:{os.getpid()}"
+
+
+events_published = metrics.counter(
+    "invalidation_events_published_total", "Invalidation events sent, by transport"
+)
+events_received = metrics.counter(
+    "invalidation_events_received_total", "Invalidation events applied, by transport"
+)
+full_flushes = metrics.counter(
+    "invalidation_full_flushes_total", "Caches flushed because events may have been missed or arrived too late"
+)
+invalidation_lag = metrics.histogram(
+    "invalidation_lag_seconds", "Delay between a write and its invalidation on another worker",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
+
+
+@dataclass
+class InvalidationEvent:
+    collection: str
+    id: Any
+    version: Optional[float]  # updated_at of the write, inf for deletes, None for "flush everything"
+    lookups: Optional[Dict[str, Any]] = None  # The written document's cached lookup values (e.g. email)
+    origin: str = field(default_factory=worker_id)
+    host: str = HOST_ID
+    sent_at: float = 0.0
+
+    def encode(self) -> bytes:
+        return json.dumps(asdict(self), default=str).encode()
+
+    @classmethod
+    def decode(cls, data: bytes) -> "InvalidationEvent":
+        return cls(**json.loads(data))
+
+
+EventHandler = Callable[[InvalidationEvent], None]
+
+
+class Transport(ABC):
+    name = "transport"
+
+    @abstractmethod
+    async def start(self, deliver: Callable[["Transport", InvalidationEvent], None]):
+        ...
+
+    @abstractmethod
+    def publish(self, event: InvalidationEvent):
+        """Send without blocking the event loop"""
+
+    @abstractmethod
+    async def stop(self):
+        ...
+
+
+class UnixDatagramTransport(Transport):
+    """
+    Same-host fan-out: each worker binds `<socket_dir>/<pid>.sock` and a publish
+    sends one datagram to every other socket in the directory. Sockets of dead
+    workers are removed on the first failed send.
+    """
+    name = "unix"
+
+    def __init__(self, socket_dir: str):
+        self.socket_dir = socket_dir
+        self.path: Optional[str] = None
+        self._sock: Optional[socket.socket] = None
+        self._peers: List[str] = []
+        self._peers_listed_at = 0.0
+
+    async def start(self, deliver):
+        os.makedirs(self.socket_dir, exist_ok=True)
+        self.path = os.path.join(self.socket_dir, f"{os.getpid()}.sock")
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+        self._sock.bind(self.path)
+
+        def on_readable():
+            while True:
+                try:
+                    data = self._sock.recv(65536)
+                except (BlockingIOError, InterruptedError):
+                    return
+                try:
+                    deliver(self, InvalidationEvent.decode(data))
+                except Exception as e:
+                    logger.warning(f"Dropping malformed invalidation datagram: {e}")
+
+        asyncio.get_running_loop().add_reader(self._sock.fileno(), on_readable)
+
+    def _list_peers(self) -> List[str]:
+        # Re-list at most once a second so workers started later are picked up
+        now = time.monotonic()
+        if now - self._peers_listed_at > 1.0:
+            self._peers = [
+                os.path.join(self.socket_dir, name)
+                for name in os.listdir(self.socket_dir)
+                if name.endswith(".sock") and os.path.join(self.socket_dir, name) != self.path
+            ]
+            self._peers_listed_at = now
+        return self._peers
+
+    def publish(self, event: InvalidationEvent):
+        if self._sock is None:
+            return
+        data = event.encode()
+        for peer in list(self._list_peers()):
+            try:
+                self._sock.sendto(data, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker is gone; clean up its socket
+                try:
+                    os.unlink(peer)
+                except FileNotFoundError:
+                    pass
+                self._peers_listed_at = 0.0
+            except BlockingIOError:
+                # Peer's receive buffer is full; it will catch up via a full flush on lag
+                logger.warning(f"Invalidation datagram to {peer} dropped, receiver busy")
+        events_published.inc(transport=self.name)
+
+    async def stop(self):
+        if self._sock is not None:
+            asyncio.get_running_loop().remove_reader(self._sock.fileno())
+            self._sock.close()
+            self._sock = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class CappedCollectionTransport(Transport):
+    """
+    Cross-host fan-out through a capped MongoDB collection read with a tailable
+    await cursor. Events from this host are skipped when a same-host transport
+    already delivered them.
+
+    Documents are ordered by `ts`, a timestamp the server fills in on insert,
+    so resuming doesn't depend on the hosts' clocks. Each tail starts at a
+    marker document it inserts, which also keeps the cursor from coming back
+    dead when no event has been sent yet.
+    """
+    name = "capped_collection"
+
+    # Wait before re-querying when a tail cursor comes back dead
+    RETRY_SECONDS = 0.5
+
+    def __init__(self, collection_name: str = "invalidation_events", size_bytes: int = 16 * 1024 * 1024,
+                 skip_same_host: bool = True):
+        self.collection_name = collection_name
+        self.size_bytes = size_bytes
+        self.skip_same_host = skip_same_host
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def collection(self):
+        from app.db.mongodb import db
+
+        return db.db[self.collection_name]
+
+    async def start(self, deliver):
+        from app.db.mongodb import db
+
+        try:
+            await db.db.create_collection(self.collection_name, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass
+        self._task = asyncio.ensure_future(self._tail(deliver))
+
+    async def _mark(self) -> Timestamp:
+        """Insert a marker document and return its server-assigned `ts`"""
+        # An empty top-level timestamp is replaced with the current one by the server
+        result = await self.collection.insert_one({"marker": True, "ts": Timestamp(0, 0)})
+        doc = await self.collection.find_one({"_id": result.inserted_id}, projection={"ts": 1})
+        return doc["ts"]
+
+    async def _tail(self, deliver):
+        since: Optional[Timestamp] = None
+        while True:
+            try:
+                if since is None:
+                    since = await self._mark()
+                    query = {"ts": {"$gte": since}}
+                else:
+                    query = {"ts": {"$gt": since}}
+                cursor = self.collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT).max_await_time_ms(500)
+                received = False
+                while cursor.alive:
+                    async for doc in cursor:
+                        received = True
+                        since = doc["ts"]
+                        if doc.get("marker"):
+                            continue
+                        doc.pop("_id", None)
+                        doc.pop("ts", None)
+                        event = InvalidationEvent(**doc)
+                        if event.origin == worker_id():
+                            continue
+                        if self.skip_same_host and event.host == HOST_ID:
+                            continue
+                        deliver(self, event)
+                if not received:
+                    # Nothing after `since` yet; a tailable query without matches returns a dead cursor
+                    await asyncio.sleep(self.RETRY_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Invalidation tail interrupted: {e}")
+                since = None  # Restart from a new marker
+                # Events may have been missed while disconnected
+                deliver(self, InvalidationEvent(collection="*", id=None, version=None, sent_at=time.time()))
+                await asyncio.sleep(1)
+
+    def publish(self, event: InvalidationEvent):
+        async def insert():
+            try:
+                await self.collection.insert_one({**asdict(event), "ts": Timestamp(0, 0)})
+                events_published.inc(transport=self.name)
+            except Exception as e:
+                logger.warning(f"Failed to publish invalidation event: {e}")
+
+        asyncio.ensure_future(insert())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class InvalidationBus:
+    """
+    Publishes (collection, id, version) events for local writes and applies
+    events from other workers to the registered handlers. An event older than
+    `max_lag` seconds on arrival, or a transport reconnect, turns into a full
+    flush (id None), which bounds how long any worker can serve stale data.
+    """
+
+    def __init__(self, transports: List[Transport], max_lag: float = 1.0):
+        self.transports = transports
+        self.max_lag = max_lag
+        self._handlers: List[EventHandler] = []
+        self.started = False
+
+    def subscribe(self, handler: EventHandler):
+        self._handlers.append(handler)
+
+    async def start(self):
+        for transport in self.transports:
+            await transport.start(self._deliver)
+        self.started = True
+
+    async def stop(self):
+        self.started = False
+        for transport in self.transports:
+            await transport.stop()
+
+    def publish(
+            self, collection: str, id: Any, version: Optional[float], lookups: Optional[Dict[str, Any]] = None
+    ):
+        if not self.started:
+            return
+        event = InvalidationEvent(
+            collection=collection, id=id, version=version, lookups=lookups, sent_at=time.time()
+        )
+        for transport in self.transports:
+            try:
+                transport.publish(event)
+            except Exception as e:
+                logger.warning(f"Invalidation publish via {transport.name} failed: {e}")
+
+    def _deliver(self, transport: Transport, event: InvalidationEvent):
+        lag = max(time.time() - event.sent_at, 0.0)
+        invalidation_lag.observe(lag, transport=transport.name)
+        events_received.inc(transport=transport.name)
+
+        if event.id is not None and lag > self.max_lag:
+            # Too late to trust ordering against reads made meanwhile
+            event = InvalidationEvent(collection=event.collection, id=None, version=None, sent_at=event.sent_at)
+        if event.id is None:
+            full_flushes.inc(transport=transport.name)
+
+        for handler in self._handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                logger.error(f"Invalidation handler failed: {e}", exc_info=True)
+
+
+def _build_bus() -> InvalidationBus:
+    transports: List[Transport] = []
+    if settings.INVALIDATION_SOCKET_DIR:
+        transports.append(UnixDatagramTransport(settings.INVALIDATION_SOCKET_DIR))
+    if settings.INVALIDATION_CROSS_HOST:
+        transports.append(CappedCollectionTransport(skip_same_host=bool(settings.INVALIDATION_SOCKET_DIR)))
+    return InvalidationBus(transports, max_lag=settings.INVALIDATION_MAX_LAG_MS / 1000)
+
+
+invalidation_bus = _build_bus()
@@ -0,0 +1,103 @@
+# app/db/loader.py
+"""DataLoader-style batching of by-key lookups"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from app.core.metrics import metrics
+
+loader_loads = metrics.counter(
+    "batch_loader_loads_total", "Keys requested through a batch loader"
+)
+loader_deduplicated = metrics.counter(
+    "batch_loader_deduplicated_total", "Loads served by a key already pending or in flight"
+)
+loader_batches = metrics.counter(
+    "batch_loader_batches_total", "Batched queries issued"
+)
+loader_batch_size = metrics.histogram(
+    "batch_loader_batch_size", "Keys per batched query", buckets=(1, 2, 5, 10, 25, 50, 100, 250)
+)
+
+
+class BatchLoader:
+    """
+    Collects `load(key)` calls and resolves them with one `load_many(keys)` call.
+
+    A batch is dispatched after `window` seconds (0 means on the next event-loop
+    iteration, so only calls made in the same tick are combined) or as soon as
+    it reaches `max_batch_size`. Loads for a key that is already pending or in
+    flight share its future.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            load_many: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+            window: float = 0,
+            max_batch_size: int = 100
+    ):
+        self.name = name
+        self.load_many = load_many
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._handle: Optional[asyncio.Handle] = None
+
+    async def load(self, key: Hashable) -> Any:
+        loader_loads.inc(loader=self.name)
+        future = self._pending.get(key) or self._in_flight.get(key)
+        if future is not None:
+            loader_deduplicated.inc(loader=self.name)
+        else:
+            loop = asyncio.get_running_loop()
+            future = self._pending[key] = loop.create_future()
+            if len(self._pending) >= self.max_batch_size:
+                self._dispatch()
+            elif self._handle is None:
+                if self.window > 0:
+                    self._handle = loop.call_later(self.window, self._dispatch)
+                else:
+                    self._handle = loop.call_soon(self._dispatch)
+
+        # Shield so one cancelled caller doesn't cancel the result for the others
+        return await asyncio.shield(future)
+
+    def _dispatch(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        self._in_flight.update(batch)
+        loader_batches.inc(loader=self.name)
+        loader_batch_size.observe(len(batch), loader=self.name)
+        asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: Dict[Hashable, asyncio.Future]):
+        try:
+            results = await self.load_many(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+                    # Mark retrieved for keys whose callers were all cancelled
+                    future.exception()
+        else:
+            for key, future in batch.items():
+                if not future.done():
+                    future.set_result(results.get(key))
+        finally:
+            for key, future in batch.items():
+                if not future.done():
+                    # The batch itself was cancelled (e.g. shutdown); don't leave its callers waiting
+                    future.set_exception(asyncio.CancelledError())
+                    future.exception()
+                if self._in_flight.get(key) is future:
+                    del self._in_flight[key]
+
+    def forget(self):
+        """Make later loads start a new batch instead of joining in-flight ones, e.g. after a write"""
+        self._in_flight.clear()
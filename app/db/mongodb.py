@@ -3,6 +3,7 @@ import logging
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from app.core.config import settings
+from app.core.tracing import MongoCommandTracer, tracer
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +14,9 @@ class MongoDB:
 
     async def connect_to_database(self):
         logger.info("Connecting to MongoDB...")
-        self.client = AsyncIOMotorClient(settings.MONGODB_URL)
+        # Command spans are only recorded inside recorded traces
+        event_listeners = [MongoCommandTracer()] if tracer.recording else []
+        self.client = AsyncIOMotorClient(settings.MONGODB_URL, event_listeners=event_listeners)
         self.db = self.client[settings.MONGODB_DB_NAME]
         logger.info("Connected to MongoDB!")
 
@@ -1,47 +1,420 @@
 # app/db/repositories/base.py
-from datetime import datetime
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, Tuple, Type, TypeVar
+from cachetools import TTLCache
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import IndexModel, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from app.core import deadline
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.tracing import traced
+from app.db import consistency
+from app.db.cache import RepositoryCache
+from app.db.consistency import ConsistencyProfile
+from app.db.ids import IdCodec, to_binary, to_hex
+from app.db.invalidation import InvalidationEvent, invalidation_bus
+from app.db.loader import BatchLoader
 from app.db.mongodb import db
+from app.db.write_behind import WriteBehindBuffer
 from app.models.base import MongoBaseModel, datetime_to_milliseconds, generate_uuid
+from app.utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
 
 ModelType = TypeVar("ModelType", bound=MongoBaseModel)
 
+# Version stamp recorded for deleted documents so in-flight reads can't re-cache them
+DELETED_VERSION = float("inf")
+
+# partialFilterExpression for indexes that only need to cover the live working set
+ACTIVE_ONLY = {"is_active": True}
+
+# Index codes for an existing index whose options or keys differ from the declared one
+INDEX_CONFLICT_CODES = (85, 86)
+INDEX_NOT_FOUND = 27
+
+# Index options that don't affect what an index is (ignored when comparing definitions)
+_INDEX_METADATA = ("key", "name", "v", "ns", "background")
+
+
+def _index_matches(existing: Optional[Dict[str, Any]], index: IndexModel) -> bool:
+    """Whether an `index_information()` entry already has the declared keys and options"""
+    if existing is None:
+        return False
+    declared = index.document
+    if list(existing["key"]) != list(declared["key"].items()):
+        return False
+    options = {k: v for k, v in declared.items() if k not in _INDEX_METADATA}
+    current = {k: v for k, v in existing.items() if k not in _INDEX_METADATA}
+    return options == current
+
+archived_documents = metrics.counter(
+    "repository_archived_documents_total", "Inactive documents moved to the archive collection"
+)
+
 
 class BaseRepository(Generic[ModelType]):
+    # Set by the `cached_repository` decorator on subclasses that opt in
+    cache: Optional[RepositoryCache] = None
+
+    # Indexes created at startup by `ensure_indexes`
+    indexes: List[IndexModel] = []
+
+    # Names of indexes no longer declared, dropped at startup so they stop costing writes
+    retired_indexes: List[str] = []
+
+    # Deletes only mark documents inactive, and reads see active documents unless asked otherwise
+    soft_delete: bool = False
+
+    # Buffer for fields written behind; its newer values are overlaid on every read
+    write_behind: Optional[WriteBehindBuffer] = None
+
+    # Consistency profile of the repository's operations unless the context selects
+    # one with `consistency.use()`; None uses CONSISTENCY_DEFAULT_PROFILE
+    consistency_profile: Optional[str] = None
+
+    # Counters bumped by any write to one of their fields, e.g. {"authz_version": ("roles", "is_active")}
+    change_counters: Dict[str, Tuple[str, ...]] = {}
+
+    # How `_id`s are stored: "hex", "dual" or "binary" (see app/db/ids.py); None uses ID_REPRESENTATION
+    id_representation: Optional[str] = None
+
+    # Per-collection single-flight groups, shared by all repository instances in the worker
+    _flights: Dict[str, SingleFlight] = {}
+    _loaders: Dict[str, BatchLoader] = {}
+    _counts = TTLCache(maxsize=1000, ttl=settings.REPOSITORY_COUNT_CACHE_TTL)
+    _caches: Dict[str, RepositoryCache] = {}
+
     def __init__(self, model: Type[ModelType], collection_name: str):
         self.model = model
         self.collection_name = collection_name
+        self.ids = IdCodec(self.id_representation or settings.ID_REPRESENTATION)
+        if self.cache is not None:
+            self._caches[collection_name] = self.cache
+
+    @property
+    def profile(self) -> ConsistencyProfile:
+        return consistency.current(self.consistency_profile)
 
     @property
     def collection(self) -> AsyncIOMotorCollection:
-        return db.db[self.collection_name]
+        """The collection with the current consistency profile's read and write options"""
+        return self.profile.apply(db.db[self.collection_name])
+
+    @property
+    def archive_collection(self) -> AsyncIOMotorCollection:
+        return db.db[f"{self.collection_name}_archive"]
+
+    async def ensure_indexes(self):
+        """
+        Create the repository's declared indexes, rebuilding any whose definition
+        changed. Every worker runs this at startup, so another may be rebuilding
+        the same index concurrently: the drop tolerates a missing index, and a
+        failed step is fine as long as the declared definition ends up in place.
+        Retired indexes are dropped, tolerating ones already gone.
+        """
+        for index in self.indexes:
+            try:
+                await self.collection.create_indexes([index])
+            except OperationFailure as e:
+                if e.code not in INDEX_CONFLICT_CODES:
+                    raise
+                await self._rebuild_index(index)
+        for name in self.retired_indexes:
+            try:
+                await self.collection.drop_index(name)
+                logger.warning(f"Dropped retired index {self.collection_name}.{name}")
+            except OperationFailure as e:
+                # Never created, or dropped by another worker already
+                if e.code != INDEX_NOT_FOUND:
+                    raise
+
+    async def _rebuild_index(self, index: IndexModel):
+        name = index.document["name"]
+        try:
+            if _index_matches((await self.collection.index_information()).get(name), index):
+                return  # Rebuilt by another worker meanwhile
+            logger.warning(f"Rebuilding index {self.collection_name}.{name}: definition changed")
+            try:
+                await self.collection.drop_index(name)
+            except OperationFailure as e:
+                if e.code != INDEX_NOT_FOUND:
+                    raise
+            await self.collection.create_indexes([index])
+        except OperationFailure:
+            if not _index_matches((await self.collection.index_information()).get(name), index):
+                raise
+
+    def _scoped(self, query: Dict, include_inactive: bool = False) -> Dict:
+        """Restrict a query to active documents when the repository soft-deletes"""
+        if not self.soft_delete or include_inactive or "is_active" in query:
+            return query
+        return {**query, **ACTIVE_ONLY}
 
-    async def find_one(self, query: Dict) -> Optional[ModelType]:
+    def _increments(self, data: Dict[str, Any]) -> Dict[str, int]:
+        """`$inc` for the change counters a write of `data` bumps"""
+        return {
+            counter: 1 for counter, fields in self.change_counters.items() if any(name in data for name in fields)
+        }
+
+    def _from_db(self, doc: Dict[str, Any]) -> ModelType:
+        """Convert a document to the model, with values still sitting in the write-behind buffer"""
+        doc = self.ids.decode(doc)
+        if self.write_behind is not None:
+            doc = self.write_behind.apply(doc)
+        return self.model.from_db(doc)
+
+    @property
+    def flight(self) -> SingleFlight:
+        flight = self._flights.get(self.collection_name)
+        if flight is None:
+            flight = self._flights[self.collection_name] = SingleFlight(self.collection_name)
+        return flight
+
+    @property
+    def loader(self) -> BatchLoader:
+        loader = self._loaders.get(self.collection_name)
+        if loader is None:
+            loader = self._loaders[self.collection_name] = BatchLoader(
+                self.collection_name,
+                self._find_docs_by_ids,
+                window=settings.REPOSITORY_BATCH_WINDOW_MS / 1000,
+                max_batch_size=settings.REPOSITORY_BATCH_MAX_SIZE
+            )
+        return loader
+
+    @traced()
+    async def find_one(
+            self,
+            query: Dict,
+            use_cache: bool = True,
+            include_inactive: bool = False
+    ) -> Optional[ModelType]:
         """Find single document and convert to model"""
-        doc = await self.collection.find_one(query)
+        # The cache only ever holds what the default, active-only read returns
+        doc = await self._find_one_doc(
+            query, use_cache and not include_inactive, include_inactive=include_inactive
+        )
+        if doc:
+            return self._from_db(doc)
+        return None
+
+    async def _find_one_doc(
+            self,
+            query: Dict,
+            use_cache: bool = True,
+            fetch: Optional[Callable[[], Awaitable[Optional[Dict[str, Any]]]]] = None,
+            include_inactive: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """Fetch the raw document, reading through the repository cache when enabled"""
+        key = RepositoryCache.key(self.collection_name, query)
+        scoped = self._scoped(query, include_inactive)
+        fetch = fetch or (lambda: self._fetch_one(scoped, RepositoryCache.key(self.collection_name, scoped)))
+
+        if not self.profile.reads_primary:
+            # Possibly stale reads never fill the cache or join primary reads in flight
+            if self.cache is not None:
+                self.cache.stats.record(self.cache.shape(query), "bypassed")
+            return await self._find_one_raw(scoped)
+
+        if self.cache is None:
+            return await fetch()
+
+        shape = self.cache.shape(query)
+        if not use_cache or key is None:
+            self.cache.stats.record(shape, "bypassed")
+            return await self._find_one_raw(scoped)
+
+        found, doc = self.cache.get(key, shape)
+        if found:
+            return doc
+
+        doc = await fetch()
+        self.cache.set(key, shape, doc)
+        return doc
+
+    async def _find_one_raw(self, query: Dict) -> Optional[Dict[str, Any]]:
+        with deadline.db_timeout():
+            return self.ids.decode(await self.collection.find_one(self.ids.query(query)))
+
+    async def _fetch_one(self, query: Dict, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Run find_one, sharing the in-flight call with identical concurrent queries"""
+        if key is None:
+            return await self._find_one_raw(query)
+
+        try:
+            doc = await deadline.bounded(self.flight.do(key, lambda: self._find_one_raw(query)))
+        except deadline.DeadlineExceeded:
+            # The shared call runs under the budget of the request that started it,
+            # which may be shorter than ours; retry alone if we still have time
+            deadline.check()
+            doc = await self._find_one_raw(query)
+        # Awaiters share the result; from_db mutates it, so hand each one a copy
+        return dict(doc) if doc else None
+
+    @traced()
+    async def find_by_id(
+            self,
+            id: str,
+            use_cache: bool = True,
+            include_inactive: bool = False
+    ) -> Optional[ModelType]:
+        """Find document by ID, batching concurrent lookups into one query"""
+        if (
+                not settings.REPOSITORY_BATCH_LOADING or not use_cache or include_inactive
+                or not self.profile.reads_primary
+        ):
+            return await self.find_one({"_id": id}, use_cache=use_cache, include_inactive=include_inactive)
+
+        doc = await self._find_one_doc({"_id": id}, fetch=lambda: self._load_by_id(id))
         if doc:
-            return self.model.from_db(doc)
+            return self._from_db(doc)
         return None
 
-    async def find_by_id(self, id: str) -> Optional[ModelType]:
-        """Find document by ID"""
-        return await self.find_one({"_id": id})
+    async def _load_by_id(self, id: str) -> Optional[Dict[str, Any]]:
+        try:
+            doc = await deadline.bounded(self.loader.load(id))
+        except deadline.DeadlineExceeded:
+            # The batch may have run under another request's shorter budget
+            deadline.check()
+            doc = await self._find_one_raw(self._scoped({"_id": id}))
+        # Awaiters share the result; from_db mutates it, so hand each one a copy
+        return dict(doc) if doc else None
+
+    async def _find_docs_by_ids(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """One round trip for a whole batch of ids"""
+        query = {"_id": ids[0]} if len(ids) == 1 else {"_id": {"$in": ids}}
+        with deadline.db_timeout():
+            docs = await self.collection.find(self.ids.query(self._scoped(query))).to_list(length=len(ids))
+        return {doc["_id"]: doc for doc in map(self.ids.decode, docs)}
 
+    @traced()
     async def find_many(
             self,
             query: Dict,
             skip: int = 0,
             limit: int = 100,
-            sort: List[tuple] = None
+            sort: List[tuple] = None,
+            include_inactive: bool = False
     ) -> List[ModelType]:
         """Find multiple documents"""
-        cursor = self.collection.find(query).skip(skip).limit(limit)
+        cursor = self.collection.find(self.ids.query(self._scoped(query, include_inactive))).skip(skip).limit(limit)
         if sort:
             cursor = cursor.sort(sort)
-        docs = await cursor.to_list(length=limit)
-        return [self.model.from_db(doc) for doc in docs]
+        with deadline.db_timeout():
+            docs = await cursor.to_list(length=limit)
+        return [self._from_db(doc) for doc in docs]
+
+    @traced()
+    async def paginate(
+            self,
+            query: Dict,
+            skip: int = 0,
+            limit: int = 100,
+            sort: List[tuple] = None,
+            count: str = "exact",
+            include_inactive: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Page of documents plus the total number of matches.
+
+        count="exact" fetches items and total in one round trip with $facet.
+        count="estimated" uses the collection metadata count for an empty filter
+        (falls back to exact otherwise). count="cached" reuses a recent exact total
+        for the same filter for up to REPOSITORY_COUNT_CACHE_TTL seconds.
+        The estimate also counts inactive documents not yet archived, so
+        `has_more` never comes from the total: one extra item is read instead.
+        Pass a `sort` that ends in a unique field, or skip/limit pages have no
+        stable order.
+        """
+        estimated = count == "estimated" and not query
+        query = self._scoped(query, include_inactive)
+        count_key = RepositoryCache.key(self.collection_name, query) if count == "cached" else None
+        total = self._counts.get(count_key) if count_key else None
+        cached = total is not None
 
+        if estimated or cached:
+            items = await self.find_many(query, skip=skip, limit=limit + 1, sort=sort, include_inactive=True)
+            if estimated:
+                with deadline.db_timeout():
+                    total = await self.collection.estimated_document_count()
+        else:
+            # Sorting inside $facet can't use an index, so sort the matches before they fan out
+            pipeline: List[Dict[str, Any]] = [{"$match": self.ids.query(query)}]
+            if sort:
+                pipeline.append({"$sort": dict(sort)})
+            pipeline.append({"$facet": {
+                "items": [{"$skip": skip}, {"$limit": limit + 1}],
+                "total": [{"$count": "count"}],
+            }})
+            with deadline.db_timeout():
+                result = await self.collection.aggregate(pipeline).to_list(length=1)
+            facet = result[0] if result else {"items": [], "total": []}
+            items = [self._from_db(doc) for doc in facet["items"]]
+            total = facet["total"][0]["count"] if facet["total"] else 0
+            if count_key:
+                self._counts[count_key] = total
+
+        has_more = len(items) > limit
+        items = items[:limit]
+        # Estimated and cached totals can lag behind (or run ahead of) the page actually read;
+        # a last page that isn't empty pins the total down exactly
+        last_page = not has_more and (bool(items) or not skip)
+        if last_page:
+            total = skip + len(items)
+        elif has_more:
+            total = max(total, skip + len(items) + 1)
+        return {
+            "items": items,
+            "total": total,
+            "has_more": has_more,
+            "total_is_estimate": (estimated or cached) and not last_page,
+        }
+
+    def _invalidate(self, id: Any, version: Optional[float] = None, doc: Optional[Dict[str, Any]] = None):
+        """After a write of `doc` (its new state, when it may now satisfy cached misses)"""
+        # Reads already in flight may predate this write; don't let new callers join them
+        self.flight.forget()
+        self.loader.forget()
+        lookups = None
+        if self.cache is not None:
+            lookups = self.cache.lookups(doc) if doc else None
+            self.cache.invalidate(self.collection_name, id, version, lookups)
+        invalidation_bus.publish(self.collection_name, id, version, lookups)
+
+    def _invalidate_uncertain(self, query: Dict, data: Optional[Dict[str, Any]] = None):
+        """A write (of `data`) that timed out client-side may still have been applied by the server"""
+        doc_id = query.get("_id")
+        if doc_id is not None and not isinstance(doc_id, dict):
+            self._invalidate(doc_id, doc={**query, **(data or {})})
+        else:
+            self.flight.forget()
+            self.loader.forget()
+            if self.cache is not None:
+                self.cache.clear()
+            invalidation_bus.publish(self.collection_name, None, None)
+
+    @classmethod
+    def apply_remote_invalidation(cls, event: InvalidationEvent):
+        """Invalidation bus handler for writes made by other workers"""
+        collections = list(cls._caches) if event.collection == "*" else [event.collection]
+        for collection_name in collections:
+            if collection_name in cls._flights:
+                cls._flights[collection_name].forget()
+            if collection_name in cls._loaders:
+                cls._loaders[collection_name].forget()
+            cache = cls._caches.get(collection_name)
+            if cache is None:
+                continue
+            if event.id is None:
+                cache.clear()
+            else:
+                cache.invalidate(collection_name, event.id, event.version, event.lookups)
+
+    @traced()
     async def create(self, data: Dict[str, Any]) -> ModelType:
         """Create new document"""
         # Ensure we have an ID
@@ -62,18 +435,74 @@ class BaseRepository(Generic[ModelType]):
         db_data = doc.model_dump(by_alias=True)
 
         # Insert into DB
-        await self.collection.insert_one(db_data)
+        try:
+            with deadline.db_timeout():
+                await self.collection.insert_one({**db_data, "_id": self.ids.encode(db_data["_id"])})
+        except deadline.DeadlineExceeded:
+            self._invalidate_uncertain({"_id": db_data["_id"]}, db_data)
+            raise
+        self._invalidate(db_data["_id"], db_data["updated_at"], db_data)
 
         # Return the created document
+        if not self.profile.reads_primary:
+            # A lagging secondary may not have it yet; what was inserted is what's there
+            return self._from_db(db_data)
         return await self.find_by_id(db_data["_id"])
 
+    @traced()
+    async def create_many(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Insert documents with one unordered insert_many, so one bad document
+        doesn't stop the rest. Returns the write errors (`index` into `items`,
+        `code`, `errmsg`); 11000 is a duplicate key.
+        """
+        current_time = datetime_to_milliseconds(datetime.utcnow())
+        docs = [
+            self.model(**{"created_at": current_time, "updated_at": current_time, **data}).model_dump(by_alias=True)
+            for data in items
+        ]
+        if not docs:
+            return []
+        errors: List[Dict[str, Any]] = []
+        try:
+            with deadline.db_timeout():
+                await self.collection.insert_many(
+                    [{**doc, "_id": self.ids.encode(doc["_id"])} for doc in docs], ordered=False
+                )
+        except BulkWriteError as e:
+            errors = [
+                {"index": error["index"], "code": error.get("code"), "errmsg": error.get("errmsg")}
+                for error in e.details.get("writeErrors", [])
+            ]
+        except deadline.DeadlineExceeded:
+            for doc in docs:
+                self._invalidate_uncertain({"_id": doc["_id"]}, doc)
+            raise
+        # Fresh ids aren't cached, but misses for their emails etc. may be, here and on other workers
+        failed = {error["index"] for error in errors}
+        for index, doc in enumerate(docs):
+            if index not in failed:
+                self._invalidate(doc["_id"], doc["updated_at"], doc)
+        return errors
+
+    @traced()
     async def update(
             self,
             query: Dict,
             data: Dict[str, Any],
-            upsert: bool = False
+            upsert: bool = False,
+            expected_versions: Optional[List[int]] = None,
+            include_inactive: bool = False
     ) -> Optional[ModelType]:
-        """Update document(s)"""
+        """
+        Update document(s)
+        With `expected_versions`, only a document whose `updated_at` is one of them
+        is updated (optimistic concurrency); otherwise None is returned.
+        """
+        query = self._scoped(query, include_inactive)
+        if expected_versions is not None:
+            query = {**query, "updated_at": {"$in": expected_versions}}
+
         # Always update the updated_at timestamp
         update_data = {
             "$set": {
@@ -81,28 +510,240 @@ class BaseRepository(Generic[ModelType]):
                 "updated_at": datetime_to_milliseconds(datetime.utcnow())
             }
         }
+        increments = self._increments(data)
+        if increments:
+            update_data["$inc"] = increments
 
-        result = await self.collection.update_one(
-            query, update_data, upsert=upsert
-        )
+        db_query = self.ids.query(query)
+        if upsert and isinstance(query.get("_id"), str):
+            # An upserted document takes its `_id` from the filter, so it must be the stored form
+            db_query = {**query, "_id": self.ids.encode(query["_id"])}
+
+        # Returning the new document from the write avoids a second read
+        try:
+            with deadline.db_timeout():
+                doc = await self.collection.find_one_and_update(
+                    db_query, update_data, upsert=upsert, return_document=ReturnDocument.AFTER
+                )
+        except deadline.DeadlineExceeded:
+            self._invalidate_uncertain(query, data)
+            raise
 
-        if result.modified_count > 0 or (upsert and result.upserted_id):
-            return await self.find_one(query)
+        if doc:
+            doc = self.ids.decode(doc)
+            self._invalidate(doc["_id"], doc.get("updated_at"), doc)
+            return self._from_db(doc)
         return None
 
     async def update_by_id(
             self,
             id: str,
-            data: Dict[str, Any]
+            data: Dict[str, Any],
+            expected_versions: Optional[List[int]] = None
     ) -> Optional[ModelType]:
         """Update document by ID"""
-        return await self.update({"_id": id}, data)
+        return await self.update({"_id": id}, data, expected_versions=expected_versions)
+
+    @traced()
+    async def delete(self, query: Dict, hard: bool = False) -> bool:
+        """
+        Delete a document
+        Soft-deleting repositories only mark it inactive unless `hard` is set.
+        """
+        if self.soft_delete and not hard:
+            return await self._deactivate(query)
+
+        try:
+            with deadline.db_timeout():
+                doc = self.ids.decode(
+                    await self.collection.find_one_and_delete(self.ids.query(query), projection={"_id": 1})
+                )
+        except deadline.DeadlineExceeded:
+            self._invalidate_uncertain(query)
+            raise
+        if doc:
+            self._invalidate(doc["_id"], DELETED_VERSION)
+            return True
+        return False
 
-    async def delete(self, query: Dict) -> bool:
-        """Delete document(s)"""
-        result = await self.collection.delete_one(query)
-        return result.deleted_count > 0
+    async def _deactivate(self, query: Dict) -> bool:
+        version = datetime_to_milliseconds(datetime.utcnow())
+        update_data: Dict[str, Any] = {"$set": {"is_active": False, "updated_at": version}}
+        increments = self._increments({"is_active": False})
+        if increments:
+            update_data["$inc"] = increments
+        query = self._scoped(query)
+        try:
+            with deadline.db_timeout():
+                doc = self.ids.decode(await self.collection.find_one_and_update(
+                    self.ids.query(query), update_data, projection={"_id": 1}
+                ))
+        except deadline.DeadlineExceeded:
+            self._invalidate_uncertain(query)
+            raise
+        if doc:
+            self._invalidate(doc["_id"], version)
+            return True
+        return False
 
-    async def delete_by_id(self, id: str) -> bool:
+    async def delete_by_id(self, id: str, hard: bool = False) -> bool:
         """Delete document by ID"""
-        return await self.delete({"_id": id})
\ No newline at end of file
+        return await self.delete({"_id": id}, hard=hard)
+
+    async def restore_by_id(self, id: str) -> Optional[ModelType]:
+        """Reactivate a soft-deleted document that has not been archived yet"""
+        return await self.update({"_id": id, "is_active": False}, {"is_active": True})
+
+    @traced()
+    async def archive_inactive(
+            self,
+            older_than: timedelta,
+            batch_size: int = 500,
+            pause: float = 0.1
+    ) -> int:
+        """
+        Move documents inactive for longer than `older_than` to `<collection>_archive`.
+
+        Works in batches of `batch_size`, pausing between them so the job never
+        competes with request traffic for long. Each batch is copied before it is
+        deleted, and the delete re-checks the filter, so a batch interrupted
+        midway or a document restored meanwhile is never lost. Safe to run from
+        several workers at once.
+        """
+        cutoff = datetime_to_milliseconds(datetime.utcnow() - older_than)
+        query = {"is_active": False, "updated_at": {"$lt": cutoff}}
+        archived = 0
+        while True:
+            docs = await self.collection.find(query).sort("updated_at", 1).limit(batch_size).to_list(
+                length=batch_size
+            )
+            if not docs:
+                break
+
+            try:
+                await self.archive_collection.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                # Already archived by an earlier, interrupted run or another worker
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+            result = await self.collection.delete_many({**query, "_id": {"$in": [doc["_id"] for doc in docs]}})
+
+            archived += result.deleted_count
+            archived_documents.inc(result.deleted_count, collection=self.collection_name)
+            if len(docs) < batch_size:
+                break
+            await asyncio.sleep(pause)
+
+        if archived:
+            logger.info(f"Archived {archived} inactive documents from {self.collection_name}")
+        return archived
+
+    @property
+    def id_migration_collection(self) -> AsyncIOMotorCollection:
+        return db.db[f"{self.collection_name}_id_migration"]
+
+    @traced()
+    async def migrate_ids(
+            self,
+            batch_size: int = 500,
+            pause: float = 0.1,
+            transactions: bool = True,
+            progress: Optional[Callable[[int], None]] = None
+    ) -> int:
+        """
+        Rewrite documents stored with hex-string UUID `_id`s under binary UUIDs.
+
+        `_id` can't be updated in place, so each document is deleted and
+        re-inserted. With `transactions` (needs a replica set) each batch is
+        read, deleted and re-inserted in one transaction: concurrent writes
+        conflict and the batch is retried, so the migration can run under live
+        traffic. Without, a batch is first copied to `<collection>_id_migration`
+        and deleted only if unchanged since it was read, so a crash loses
+        nothing (the next run restores the copies), but writes to a document
+        in the moment it is absent miss it; run that way with writes stopped.
+
+        Workers must read with ID_REPRESENTATION "dual" (or "binary") while it
+        runs. Progress is the data itself: a rerun picks up the documents
+        still stored hex. Other string ids are left as they are.
+        """
+        if self.ids.representation == "hex":
+            raise ValueError("Set ID_REPRESENTATION to \"dual\" on every worker before migrating ids")
+        # Finish what an interrupted staged run left behind
+        migrated = 0 if transactions else await self._restore_id_migration()
+        last_id = ""
+        while True:
+            query = {"_id": {"$type": "string", "$gt": last_id}}
+            if transactions:
+                async with await db.client.start_session() as session:
+                    batch = await session.with_transaction(
+                        lambda session: self._migrate_id_batch(query, batch_size, session)
+                    )
+            else:
+                batch = await self._migrate_id_batch_staged(query, batch_size)
+            if batch is None:
+                break
+
+            last_id, count = batch
+            migrated += count
+            if progress:
+                progress(migrated)
+            await asyncio.sleep(pause)
+
+        logger.info(f"Migrated {migrated} {self.collection_name} ids to binary UUIDs")
+        return migrated
+
+    async def _migrate_id_batch(self, query: Dict, batch_size: int, session) -> Optional[Tuple[str, int]]:
+        """One batch in one transaction; returns (last id read, documents migrated), None when done"""
+        collection = db.db[self.collection_name]
+        docs = await collection.find(query, session=session).sort("_id", 1).limit(batch_size).to_list(
+            length=batch_size
+        )
+        if not docs:
+            return None
+        converted = [{**doc, "_id": to_binary(doc["_id"])} for doc in docs if to_binary(doc["_id"])]
+        if converted:
+            await collection.delete_many(
+                {"_id": {"$in": [to_hex(doc["_id"]) for doc in converted]}}, session=session
+            )
+            await collection.insert_many(converted, session=session)
+        return docs[-1]["_id"], len(converted)
+
+    async def _migrate_id_batch_staged(self, query: Dict, batch_size: int) -> Optional[Tuple[str, int]]:
+        collection = db.db[self.collection_name]
+        docs = await collection.find(query).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            return None
+        docs_to_move = [doc for doc in docs if to_binary(doc["_id"])]
+        if docs_to_move:
+            try:
+                await self.id_migration_collection.insert_many(docs_to_move, ordered=False)
+            except BulkWriteError as e:
+                # Staged by an earlier, interrupted run
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+            # Only documents still as read: a concurrent write keeps its document for the next run
+            await collection.delete_many({"$or": [
+                {"_id": doc["_id"], "updated_at": doc.get("updated_at")} for doc in docs_to_move
+            ]})
+        moved = await self._restore_id_migration()
+        return docs[-1]["_id"], moved
+
+    async def _restore_id_migration(self) -> int:
+        """Re-insert staged documents under binary ids once their hex originals are gone"""
+        collection = db.db[self.collection_name]
+        restored = 0
+        async for staged in self.id_migration_collection.find():
+            hex_id = staged["_id"]
+            binary_id = to_binary(hex_id)
+            if await collection.find_one({"_id": hex_id}, projection={"_id": 1}) is None:
+                try:
+                    await collection.insert_one({**staged, "_id": binary_id})
+                    restored += 1
+                except DuplicateKeyError:
+                    if await collection.find_one({"_id": binary_id}, projection={"_id": 1}) is None:
+                        # Another unique key (e.g. the email) was taken while the document was absent
+                        logger.error(f"Cannot restore {self.collection_name} {hex_id}; left in the staging collection")
+                        continue
+                    # Restored before an interruption
+            await self.id_migration_collection.delete_one({"_id": hex_id})
+        return restored
@@ -0,0 +1,36 @@
+# JWT signing key database operations
+
+from typing import List
+
+from pymongo import ASCENDING, IndexModel
+
+from app.models.signing_key import SigningKey
+from .base import BaseRepository
+
+
+class SigningKeyRepository(BaseRepository[SigningKey]):
+    # Key ids (JWT `kid`) are short strings, not UUIDs
+    id_representation = "hex"
+
+    indexes = [
+        # One key per rotation, however many workers rotate at once
+        IndexModel(
+            [("generation", ASCENDING)], name="generation", unique=True,
+            partialFilterExpression={"generation": {"$exists": True}}
+        ),
+    ]
+
+    def __init__(self):
+        super().__init__(SigningKey, "jwt_keys")
+
+    async def find_unexpired(self, now_ms: int) -> List[SigningKey]:
+        """Keys that are still valid for verification, newest activation first"""
+        return await self.find_many(
+            {"expires_at": {"$gt": now_ms}},
+            limit=100,
+            sort=[("activates_at", -1)]
+        )
+
+    async def delete_expired(self, now_ms: int) -> int:
+        result = await self.collection.delete_many({"expires_at": {"$lte": now_ms}})
+        return result.deleted_count
@@ -1,19 +1,306 @@
 # User specific database operations
 
-from typing import Optional
+import base64
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from cachetools import LRUCache, TTLCache
+from pymongo import ASCENDING, TEXT, IndexModel
+
+from app.core import deadline
+from app.core.config import settings
+from app.core.tracing import traced
+from app.db import consistency
+from app.db.cache import cached_repository
+from app.db.invalidation import InvalidationEvent
+from app.db.write_behind import user_activity
+from app.models.base import datetime_to_milliseconds
 from app.models.user import User
-from .base import BaseRepository
+from .base import ACTIVE_ONLY, BaseRepository
+
+# Search field name -> lowercased, indexed document field
+SEARCH_FIELDS = {
+    "email": "email_lower",
+    "name": "full_name_lower",
+}
+
+
+def _encode_cursor(values: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def _search_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Lowercased copies of the searchable fields present in `data`"""
+    fields = {}
+    if "email" in data:
+        fields["email_lower"] = data["email"].lower() if data["email"] else None
+    if "full_name" in data:
+        fields["full_name_lower"] = data["full_name"].lower() if data["full_name"] else None
+    return fields
+
+
+class _AuthzVersions:
+    """
+    authz_version per user id (None for a missing or inactive user). A value
+    read before a write to that user is dropped rather than cached after it.
+    """
 
+    def __init__(self, ttl: float, maxsize: int = 100000):
+        self.values = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._writes = LRUCache(maxsize=maxsize)
+        self._flushes = 0
 
+    def get(self, id: Any) -> Tuple[bool, Optional[int]]:
+        try:
+            return True, self.values[id]
+        except KeyError:
+            return False, None
+
+    def stamp(self, id: Any) -> Tuple[int, int]:
+        return self._flushes, self._writes.get(id, 0)
+
+    def set(self, id: Any, version: Optional[int], stamp: Tuple[int, int]):
+        if stamp == self.stamp(id):
+            self.values[id] = version
+
+    def forget(self, id: Any):
+        self.values.pop(id, None)
+        self._writes[id] = self._writes.get(id, 0) + 1
+
+    def clear(self):
+        self.values.clear()
+        self._flushes += 1
+
+
+_authz_versions = _AuthzVersions(ttl=settings.AUTHZ_VERSION_CACHE_SECONDS)
+
+
+@cached_repository(
+    ttls={
+        "_id": 60,  # get_current_user on every authenticated request
+        "email": 30,
+        "oauth_id,oauth_provider": 300,
+    },
+    negative_ttl=5
+)
 class UserRepository(BaseRepository[User]):
+    soft_delete = True
+    write_behind = user_activity
+
+    # Tokens carry authz_version; changing what they authorize revokes the ones already issued
+    change_counters = {"authz_version": ("roles", "is_superuser", "is_active")}
+
+    # Lookup and search indexes cover active users only; reads always filter on is_active
+    indexes = [
+        # One active account per email; also what bulk imports rely on to report duplicates
+        IndexModel(
+            [("email", ASCENDING)], name="email_active", unique=True, partialFilterExpression=ACTIVE_ONLY
+        ),
+        IndexModel(
+            [("oauth_provider", ASCENDING), ("oauth_id", ASCENDING)],
+            name="oauth_active", partialFilterExpression=ACTIVE_ONLY
+        ),
+        # Prefix search and its keyset pagination walk these in order
+        IndexModel(
+            [("email_lower", ASCENDING), ("_id", ASCENDING)],
+            name="email_lower_id", partialFilterExpression=ACTIVE_ONLY
+        ),
+        IndexModel(
+            [("full_name_lower", ASCENDING), ("_id", ASCENDING)],
+            name="full_name_lower_id", partialFilterExpression=ACTIVE_ONLY
+        ),
+        IndexModel(
+            [("email", TEXT), ("full_name", TEXT)],
+            name="user_text", weights={"email": 2, "full_name": 1}, partialFilterExpression=ACTIVE_ONLY
+        ),
+        # Materialized stats: recompute signup-day partitions of recently written users
+        # (the archiver finds long-inactive users through updated_at too, filtering is_active)
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+        # Also walked (in reverse) by the admin user list; the _id tiebreak keeps skip/limit pages stable
+        IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at"),
+    ]
+
+    # Served the archiver before the full updated_at index; two indexes on one key cost every write twice
+    retired_indexes = ["inactive_updated_at"]
+
     def __init__(self):
         super().__init__(User, "users")
 
-    async def find_by_email(self, email: str) -> Optional[User]:
-        return await self.find_one({"email": email})
+    async def find_by_email(self, email: str, use_cache: bool = True) -> Optional[User]:
+        return await self.find_one({"email": email}, use_cache=use_cache)
 
-    async def find_by_oauth(self, provider: str, oauth_id: str) -> Optional[User]:
+    async def find_by_oauth(self, provider: str, oauth_id: str, use_cache: bool = True) -> Optional[User]:
         return await self.find_one({
             "oauth_provider": provider,
             "oauth_id": oauth_id
-        })
\ No newline at end of file
+        }, use_cache=use_cache)
+
+    async def create(self, data: Dict[str, Any]) -> User:
+        return await super().create({**data, **_search_fields(data)})
+
+    async def create_many(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return await super().create_many([{**data, **_search_fields(data)} for data in items])
+
+    async def update(
+            self,
+            query: Dict,
+            data: Dict[str, Any],
+            upsert: bool = False,
+            expected_versions: Optional[List[int]] = None,
+            include_inactive: bool = False
+    ) -> Optional[User]:
+        return await super().update(
+            query, {**data, **_search_fields(data)}, upsert=upsert,
+            expected_versions=expected_versions, include_inactive=include_inactive
+        )
+
+    async def rehash_password(self, user_id: str, old_hash: str, new_hash: str) -> bool:
+        """Replace an outdated password hash unless the password changed meanwhile"""
+        user = await self.update({"_id": user_id, "hashed_password": old_hash}, {"hashed_password": new_hash})
+        return user is not None
+
+    async def find_authz_version(self, user_id: str, use_cache: bool = True) -> Optional[int]:
+        """
+        Current authz_version of an active user (None if missing or inactive),
+        read with a projection and cached for AUTHZ_VERSION_CACHE_SECONDS;
+        writes drop the cached value here and, through the invalidation bus,
+        on other workers.
+        """
+        if use_cache:
+            found, version = _authz_versions.get(user_id)
+            if found:
+                return version
+
+        stamp = _authz_versions.stamp(user_id)
+
+        async def fetch() -> Optional[int]:
+            # Revocation must not wait for a lagging secondary
+            with consistency.use("critical"), deadline.db_timeout():
+                doc = await self.collection.find_one(
+                    self.ids.query(self._scoped({"_id": user_id})), projection={"authz_version": 1}
+                )
+            return doc.get("authz_version", 0) if doc else None
+
+        version = await deadline.bounded(self.flight.do(("authz_version", user_id), fetch))
+        _authz_versions.set(user_id, version, stamp)
+        return version
+
+    def _invalidate(self, id: Any, version: Optional[float] = None, doc: Optional[Dict[str, Any]] = None):
+        _authz_versions.forget(id)
+        super()._invalidate(id, version, doc)
+
+    def _invalidate_uncertain(self, query: Dict, data: Optional[Dict[str, Any]] = None):
+        doc_id = query.get("_id")
+        if doc_id is None or isinstance(doc_id, dict):
+            _authz_versions.clear()
+        super()._invalidate_uncertain(query, data)
+
+    @staticmethod
+    def apply_remote_authz_invalidation(event: InvalidationEvent):
+        """Invalidation bus handler: forget authz versions of users written by other workers"""
+        if event.collection not in ("users", "*"):
+            return
+        if event.id is None:
+            _authz_versions.clear()
+        else:
+            _authz_versions.forget(event.id)
+
+    def record_activity(self, user_id: str, login: bool = False):
+        """Note that the user was just seen (and logged in); written behind in batches"""
+        now = datetime_to_milliseconds(datetime.utcnow())
+        fields = {"last_seen_at": now}
+        if login:
+            fields["last_login_at"] = now
+        self.write_behind.record(user_id, fields)
+
+    @traced()
+    async def search_prefix(
+            self,
+            prefix: str,
+            field: str = "email",
+            limit: int = 20,
+            cursor: Optional[str] = None
+    ) -> Tuple[List[User], Optional[str]]:
+        """
+        Anchored, case-insensitive prefix search on an indexed lowercase field.
+        Results are ordered by (field, _id), which the compound index serves
+        directly; the cursor is the last (value, _id) pair seen.
+        """
+        key = SEARCH_FIELDS[field]
+        query: Dict[str, Any] = {key: {"$regex": f"^{re.escape(prefix.lower())}"}, **ACTIVE_ONLY}
+
+        if cursor:
+            values = _decode_cursor(cursor)
+            if len(values) != 2:
+                raise ValueError("Invalid cursor")
+            last_value, last_id = values
+            # $gte narrows the index range; the $or skips rows already returned
+            query[key]["$gte"] = last_value
+            query["$or"] = [{key: {"$gt": last_value}}, self.ids.after(last_id)]
+
+        # Fetch one extra document to learn whether another page exists
+        with deadline.db_timeout():
+            docs = await self.collection.find(query).sort(
+                [(key, ASCENDING), ("_id", ASCENDING)]
+            ).limit(limit + 1).to_list(length=limit + 1)
+
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = _encode_cursor([docs[-1][key], self.ids.to_cursor(docs[-1]["_id"])])
+        return [self._from_db(doc) for doc in docs], next_cursor
+
+    @traced()
+    async def search_text(
+            self,
+            text: str,
+            limit: int = 20,
+            cursor: Optional[str] = None
+    ) -> Tuple[List[User], Optional[str]]:
+        """Full-text search ordered by relevance; the cursor is an offset into the ranking"""
+        values = _decode_cursor(cursor) if cursor else [0]
+        offset = values[0] if len(values) == 1 else None
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError("Invalid cursor")
+
+        score = {"score": {"$meta": "textScore"}}
+        with deadline.db_timeout():
+            docs = await self.collection.find(
+                {"$text": {"$search": text}, **ACTIVE_ONLY}, score
+            ).sort([("score", {"$meta": "textScore"}), ("_id", ASCENDING)]).skip(offset).limit(
+                limit + 1
+            ).to_list(length=limit + 1)
+
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = _encode_cursor([offset + limit])
+        for doc in docs:
+            doc.pop("score", None)
+        return [self._from_db(doc) for doc in docs], next_cursor
+
+    @traced()
+    async def backfill_search_fields(self) -> int:
+        """Populate the lowercase search fields on users created before they existed"""
+        result = await self.collection.update_many(
+            {"email_lower": {"$exists": False}},
+            [{"$set": {
+                "email_lower": {"$toLower": "$email"},
+                "full_name_lower": {"$cond": [
+                    {"$ifNull": ["$full_name", False]}, {"$toLower": "$full_name"}, None
+                ]},
+            }}]
+        )
+        return result.modified_count
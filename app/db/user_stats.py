@@ -0,0 +1,238 @@
+# app/db/user_stats.py
+"""
+Materialized user statistics for the admin dashboard.
+
+`user_stats` holds one partition document per signup day (`day:YYYY-MM-DD`)
+with that day's counts: signups, active/inactive, per role and per
+oauth_provider ("password" for local accounts). A `totals` document sums the
+partitions, so a dashboard read is a single document however many users
+there are.
+
+An incremental refresh finds the signup days of users changed since the last
+run (`updated_at` window) and recomputes just those partitions with a `$merge`
+aggregation over their `created_at` range; recomputing a whole day makes it
+exact, since a changed user's previous state is never needed. A full rebuild
+recomputes every partition and drops those left empty. It runs on the first
+refresh, when more days changed than `max_incremental_days`, and every
+`full_rebuild_interval`, which also corrects for hard deletes and archiving:
+a removed user leaves no `updated_at` behind to find.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.base import datetime_to_milliseconds, generate_uuid
+
+logger = logging.getLogger(__name__)
+
+DAY_MS = 86400 * 1000
+
+stats_refreshes = metrics.counter(
+    "user_stats_refreshes_total", "Materialized user stats refreshes, by kind (incremental, full)"
+)
+stats_refresh_seconds = metrics.histogram(
+    "user_stats_refresh_seconds", "Duration of one materialized user stats refresh",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60, 300)
+)
+
+# Signup day (UTC) of a user document; created_at is epoch milliseconds
+_DAY = {"$dateToString": {"format": "%Y-%m-%d", "date": {"$toDate": "$created_at"}}}
+
+
+def _utc_ms(day: str) -> int:
+    return (datetime.strptime(day, "%Y-%m-%d") - datetime(1970, 1, 1)) // timedelta(milliseconds=1)
+
+
+def _day_ranges(days: List[str]) -> List[Tuple[int, int]]:
+    """Merge signup days into contiguous [start, end) millisecond ranges"""
+    ranges: List[Tuple[int, int]] = []
+    for start in sorted(_utc_ms(day) for day in days):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], start + DAY_MS)
+        else:
+            ranges.append((start, start + DAY_MS))
+    return ranges
+
+
+def _partition_pipeline(generation: str, collection_name: str) -> List[Dict[str, Any]]:
+    """Per-day counts of the matched users, merged over their partitions"""
+    return [
+        {"$project": {
+            "day": _DAY,
+            # Every counter the user contributes to
+            "keys": {"$concatArrays": [
+                [
+                    "signups",
+                    {"$cond": [{"$eq": ["$is_active", False]}, "inactive", "active"]},
+                    {"$concat": ["provider:", {"$ifNull": ["$oauth_provider", "password"]}]},
+                ],
+                {"$map": {"input": {"$ifNull": ["$roles", []]}, "in": {"$concat": ["role:", "$$this"]}}},
+            ]},
+        }},
+        {"$unwind": "$keys"},
+        {"$group": {"_id": {"day": "$day", "key": "$keys"}, "n": {"$sum": 1}}},
+        {"$group": {"_id": "$_id.day", "counts": {"$push": {"k": "$_id.key", "v": "$n"}}}},
+        {"$project": {
+            "_id": {"$concat": ["day:", "$_id"]},
+            "kind": "day",
+            "day": "$_id",
+            "counts": {"$arrayToObject": "$counts"},
+            "generation": {"$literal": generation},
+        }},
+        {"$merge": {"into": collection_name, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+class UserStatsMaterializer:
+    def __init__(
+            self,
+            collection_name: str = "user_stats",
+            max_incremental_days: int = 60,
+            full_rebuild_interval: timedelta = timedelta(hours=24),
+            overlap: timedelta = timedelta(minutes=1),
+            lease: timedelta = timedelta(minutes=10)
+    ):
+        self.collection_name = collection_name
+        self.max_incremental_days = max_incremental_days
+        self.full_rebuild_interval = full_rebuild_interval
+        # Re-read this much before the watermark: writes stamped just before a
+        # refresh started may only become visible after it
+        self.overlap = overlap
+        self.lease = lease
+
+    @property
+    def collection(self):
+        from app.db.mongodb import db
+
+        return db.db[self.collection_name]
+
+    @property
+    def users(self):
+        from app.db.mongodb import db
+
+        return db.db["users"]
+
+    async def read(self, days: int = 30) -> Optional[Dict[str, Any]]:
+        """Totals plus signups for the last `days` days; None before the first refresh"""
+        totals = await self.collection.find_one({"_id": "totals"})
+        if totals is None:
+            return None
+        first_day = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        partitions = await self.collection.find(
+            {"_id": {"$gte": f"day:{first_day}", "$lt": "day;"}}, {"day": 1, "counts.signups": 1}
+        ).sort("_id", 1).to_list(length=days)
+
+        counts = totals.get("counts", {})
+        return {
+            "total": counts.get("signups", 0),
+            "active": counts.get("active", 0),
+            "inactive": counts.get("inactive", 0),
+            "roles": {key[5:]: value for key, value in counts.items() if key.startswith("role:")},
+            "providers": {key[9:]: value for key, value in counts.items() if key.startswith("provider:")},
+            "signups_per_day": [
+                {"day": partition["day"], "count": partition["counts"]["signups"]} for partition in partitions
+            ],
+            "refreshed_at": totals.get("refreshed_at"),
+            "full_rebuild_at": totals.get("full_rebuild_at"),
+        }
+
+    async def refresh(self, full: bool = False) -> Optional[str]:
+        """
+        Bring the stats up to date; returns "incremental" or "full", or None when
+        another worker holds the refresh lease.
+        """
+        started = datetime.utcnow()
+        # One owner per refresh, not per instance: forked workers share the instance created before the fork
+        owner = generate_uuid()
+        meta = await self._acquire(started, owner)
+        if meta is None:
+            return None
+
+        try:
+            watermark = meta.get("watermark")
+            last_full = meta.get("full_rebuild_at")
+            days: List[str] = []
+            if watermark is None or last_full is None or started - last_full >= self.full_rebuild_interval:
+                full = True
+            if not full:
+                days = await self._changed_days(watermark - self.overlap)
+                # Past this many partitions one pass over everything is cheaper
+                full = len(days) > self.max_incremental_days
+
+            kind = "full" if full else "incremental"
+            generation = generate_uuid()
+            if full:
+                await self.users.aggregate(_partition_pipeline(generation, self.collection_name)).to_list(length=None)
+                # Days whose users are all gone now
+                await self.collection.delete_many({"kind": "day", "generation": {"$ne": generation}})
+            elif days:
+                match = {"$or": [{"created_at": {"$gte": start, "$lt": end}} for start, end in _day_ranges(days)]}
+                await self.users.aggregate(
+                    [{"$match": match}] + _partition_pipeline(generation, self.collection_name)
+                ).to_list(length=None)
+
+            await self._write_totals(started, last_full=started if full else last_full)
+            update = {"watermark": started}
+            if full:
+                update["full_rebuild_at"] = started
+            await self.collection.update_one({"_id": "meta"}, {"$set": update})
+        finally:
+            await self.collection.update_one(
+                {"_id": "meta", "lease_owner": owner}, {"$unset": {"lease_until": "", "lease_owner": ""}}
+            )
+
+        stats_refreshes.inc(kind=kind)
+        stats_refresh_seconds.observe((datetime.utcnow() - started).total_seconds())
+        logger.info(f"User stats {kind} refresh: {len(days) if not full else 'all'} days recomputed")
+        return kind
+
+    async def _acquire(self, now: datetime, owner: str) -> Optional[Dict[str, Any]]:
+        """Take the refresh lease so workers sharing the schedule don't refresh at once"""
+        try:
+            return await self.collection.find_one_and_update(
+                {"_id": "meta", "$or": [{"lease_until": {"$exists": False}}, {"lease_until": {"$lt": now}}]},
+                {"$set": {"lease_until": now + self.lease, "lease_owner": owner}},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            ) or {}
+        except DuplicateKeyError:
+            # The meta document exists and its lease is held
+            return None
+
+    async def _changed_days(self, since: datetime) -> List[str]:
+        """Signup days of users written since `since`"""
+        docs = await self.users.aggregate([
+            {"$match": {"updated_at": {"$gte": datetime_to_milliseconds(since)}}},
+            {"$group": {"_id": _DAY}},
+        ]).to_list(length=None)
+        return [doc["_id"] for doc in docs]
+
+    async def _write_totals(self, refreshed_at: datetime, last_full: Optional[datetime]):
+        """Sum the day partitions into the one document dashboards read"""
+        result = await self.collection.aggregate([
+            {"$match": {"kind": "day"}},
+            {"$project": {"counts": {"$objectToArray": "$counts"}}},
+            {"$unwind": "$counts"},
+            {"$group": {"_id": "$counts.k", "v": {"$sum": "$counts.v"}}},
+        ]).to_list(length=None)
+        # Replaced rather than merged, so it also resets when no partitions are left
+        await self.collection.replace_one(
+            {"_id": "totals"},
+            {
+                "kind": "totals",
+                "counts": {doc["_id"]: doc["v"] for doc in result},
+                "refreshed_at": refreshed_at,
+                "full_rebuild_at": last_full,
+            },
+            upsert=True
+        )
+
+user_stats = UserStatsMaterializer(
+    max_incremental_days=settings.USER_STATS_MAX_INCREMENTAL_DAYS,
+    full_rebuild_interval=timedelta(hours=settings.USER_STATS_FULL_REBUILD_HOURS)
+)
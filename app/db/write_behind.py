@@ -0,0 +1,218 @@
+# app/db/write_behind.py
+"""Write-behind buffering for high-frequency, monotonically increasing fields"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from cachetools import LRUCache
+from pymongo import UpdateOne, WriteConcern
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.ids import IdCodec
+
+logger = logging.getLogger(__name__)
+
+write_behind_recorded = metrics.counter(
+    "write_behind_updates_recorded_total", "Field updates accepted by a write-behind buffer"
+)
+write_behind_coalesced = metrics.counter(
+    "write_behind_updates_coalesced_total", "Field updates absorbed without an extra write"
+)
+write_behind_written = metrics.counter(
+    "write_behind_documents_written_total", "Documents updated by write-behind flushes"
+)
+write_behind_dropped = metrics.counter(
+    "write_behind_documents_dropped_total", "Buffered document updates lost, by reason (overflow, write_error)"
+)
+write_behind_pending = metrics.gauge(
+    "write_behind_pending_documents", "Documents with buffered updates not yet written"
+)
+write_behind_flush_seconds = metrics.histogram(
+    "write_behind_flush_seconds", "Duration of one write-behind bulk_write",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
+
+
+def _merge(into: Dict[str, Any], fields: Dict[str, Any]):
+    for name, value in fields.items():
+        if name not in into or value > into[name]:
+            into[name] = value
+
+
+class WriteBehindBuffer:
+    """
+    Coalesces updates per document id in memory and writes them with one
+    unordered bulk_write every `flush_interval` seconds, or sooner once
+    `max_pending` documents are waiting.
+
+    Only for fields that only ever grow (timestamps, counters' high-water
+    marks): updates are merged with max() and written with `$max`, so
+    coalescing, retries and flushes from several workers can't move a value
+    backwards. `updated_at` is deliberately not touched; these writes are not
+    user-visible changes and must not invalidate versions, caches or ETags.
+
+    Durability and staleness are bounded by configuration:
+    - `flush_interval`: how long an update may sit in memory, i.e. the most a
+      crash can lose and how stale the database may be;
+    - `resolution`, per field name (in the field's own units): a listed field is
+      not re-recorded while the last known value is this recent, so a busy
+      document costs at most one update per resolution; other fields are
+      recorded every time;
+    - `max_pending`: documents held before an early flush; updates for further
+      documents are dropped and counted until the flush makes room;
+    - `write_concern`: acknowledgement required for a flush to count as written.
+
+    `overlay` gives reads the newest values this worker knows, written or not.
+    """
+
+    def __init__(
+            self,
+            collection_name: str,
+            flush_interval: float = 5.0,
+            resolution: Optional[Dict[str, float]] = None,
+            max_pending: int = 10000,
+            write_concern: Optional[WriteConcern] = None,
+            known_size: int = 100000,
+            ids: Optional[IdCodec] = None
+    ):
+        self.collection_name = collection_name
+        self.flush_interval = flush_interval
+        self.resolution = resolution or {}
+        self.max_pending = max_pending
+        self.write_concern = write_concern
+        self.ids = ids or IdCodec()  # Ids are recorded in hex; how to match them as stored
+        self._pending: Dict[Any, Dict[str, Any]] = {}
+        # Newest values seen per document, pending or written; keeps reads through a stale cache consistent
+        self._known: LRUCache = LRUCache(maxsize=known_size)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.started = False
+
+    @property
+    def collection(self):
+        from app.db.mongodb import db
+
+        collection = db.db[self.collection_name]
+        if self.write_concern is not None:
+            collection = collection.with_options(write_concern=self.write_concern)
+        return collection
+
+    def record(self, id: Any, fields: Dict[str, Any]):
+        """Buffer new values for `id`; never blocks or touches the database"""
+        if not self.started:
+            return
+        known = self._known.get(id, {})
+        fields = {
+            name: value for name, value in fields.items()
+            if name not in known or value - known[name] >= self.resolution.get(name, 0)
+        }
+        if not fields:
+            write_behind_coalesced.inc()
+            return
+
+        if id in self._pending:
+            write_behind_coalesced.inc()
+        elif len(self._pending) >= self.max_pending:
+            # Only while a flush is already due, running or failing; memory stays bounded
+            write_behind_dropped.inc(reason="overflow")
+            self._wakeup.set()
+            return
+
+        write_behind_recorded.inc()
+        _merge(self._pending.setdefault(id, {}), fields)
+        _merge(self._known.setdefault(id, {}), fields)
+        write_behind_pending.set(len(self._pending))
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    def overlay(self, id: Any) -> Dict[str, Any]:
+        """Newest buffered or recently written values for `id`"""
+        return dict(self._known.get(id, {}))
+
+    def apply(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """`doc` with its tracked fields raised to what this worker has seen"""
+        overlay = self._known.get(doc.get("_id"))
+        if not overlay:
+            return doc
+        merged = dict(doc)
+        for name, value in overlay.items():
+            if merged.get(name) is None or value > merged[name]:
+                merged[name] = value
+        return merged
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self.started = True
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Stop accepting updates and drain what is buffered"""
+        # Let the loop finish the batch it may be writing; cancelling it mid-flush would lose that batch
+        self.started = False
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        if self._pending:
+            await self.flush()
+
+    async def _run(self):
+        while self.started:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> bool:
+        """Write everything buffered; returns False when the database could not be reached"""
+        if not self._pending:
+            return True
+        batch, self._pending = self._pending, {}
+        write_behind_pending.set(0)
+        requests = [UpdateOne({"_id": self.ids.match(id)}, {"$max": fields}) for id, fields in batch.items()]
+
+        start = time.monotonic()
+        try:
+            await self.collection.bulk_write(requests, ordered=False)
+            write_behind_written.inc(len(requests))
+            return True
+        except BulkWriteError as e:
+            # Unordered: everything except the reported updates was applied
+            failed = len(e.details.get("writeErrors", []))
+            write_behind_written.inc(len(requests) - failed)
+            write_behind_dropped.inc(failed, reason="write_error")
+            return True
+        except asyncio.CancelledError:
+            self._restore(batch)
+            raise
+        except Exception as e:
+            logger.warning(f"Write-behind flush of {len(requests)} {self.collection_name} documents failed: {e}")
+            self._restore(batch)
+            return False
+        finally:
+            write_behind_flush_seconds.observe(time.monotonic() - start)
+
+    def _restore(self, batch: Dict[Any, Dict[str, Any]]):
+        """Fold an unwritten batch back in under anything recorded meanwhile; merging by max keeps it correct"""
+        for id, fields in batch.items():
+            if id in self._pending or len(self._pending) < self.max_pending:
+                _merge(self._pending.setdefault(id, {}), fields)
+            else:
+                write_behind_dropped.inc(reason="overflow")
+        write_behind_pending.set(len(self._pending))
+
+
+user_activity = WriteBehindBuffer(
+    "users",
+    flush_interval=settings.USER_ACTIVITY_FLUSH_INTERVAL_MS / 1000,
+    # Epoch milliseconds; every login is recorded, only last_seen_at is throttled
+    resolution={"last_seen_at": settings.USER_ACTIVITY_RESOLUTION_SECONDS * 1000},
+    max_pending=settings.USER_ACTIVITY_MAX_PENDING,
+    write_concern=WriteConcern(**settings.USER_ACTIVITY_WRITE_CONCERN),
+    ids=IdCodec(settings.ID_REPRESENTATION)
+)
@@ -0,0 +1,240 @@
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+DEFAULT_COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/problem+json",
+    "application/jwk-set+json",
+    "application/javascript",
+    "text/",
+    "image/svg+xml",
+)
+
+
+def available_encodings() -> List[str]:
+    """Supported codecs in server preference order"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str, supported: Iterable[str]) -> Optional[str]:
+    """Pick the best codec from an Accept-Encoding header, honoring q-values (q=0 excludes)"""
+    if not accept_encoding:
+        return None
+
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in supported:
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _Codec:
+    """Streaming compressor with one interface across gzip, brotli and zstd"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int, zstd_level: int):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._obj = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._obj = zstandard.ZstdCompressor(level=zstd_level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._obj.process(data)
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        """Emit everything buffered so far so a streamed chunk reaches the client"""
+        if self.encoding == "gzip":
+            return self._obj.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self._obj.flush()
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI response compression negotiated from Accept-Encoding (zstd, br, gzip).
+
+    Complete responses smaller than `minimum_size` or with a content type outside
+    `compressible_types` pass through untouched. Streaming responses are
+    compressed chunk by chunk and flushed per chunk. Responses for
+    `precompressed_paths` (e.g. the OpenAPI document) are compressed once per
+    encoding and served from memory while the body is unchanged.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            minimum_size: int = 1024,
+            compressible_types: Tuple[str, ...] = DEFAULT_COMPRESSIBLE_TYPES,
+            precompressed_paths: Iterable[str] = (),
+            gzip_level: int = 6,
+            brotli_quality: int = 4,
+            zstd_level: int = 3
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compressible_types = compressible_types
+        self.precompressed_paths = set(precompressed_paths)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.zstd_level = zstd_level
+        self.encodings = available_encodings()
+        # (path, encoding) -> (identity body, compressed body)
+        self._precompressed: Dict[Tuple[str, str], Tuple[bytes, bytes]] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding", ""), self.encodings
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, scope["path"], send)
+        responder.if_none_match = Headers(scope=scope).get("if-none-match", "")
+        await self.app(scope, receive, responder)
+
+    def codec(self, encoding: str) -> _Codec:
+        return _Codec(encoding, self.gzip_level, self.brotli_quality, self.zstd_level)
+
+    def compress_body(self, path: str, encoding: str, body: bytes) -> bytes:
+        if path not in self.precompressed_paths:
+            codec = self.codec(encoding)
+            return codec.compress(body) + codec.finish()
+
+        cached = self._precompressed.get((path, encoding))
+        if cached is not None and cached[0] == body:
+            return cached[1]
+        codec = self.codec(encoding)
+        compressed = codec.compress(body) + codec.finish()
+        self._precompressed[(path, encoding)] = (body, compressed)
+        return compressed
+
+    def is_compressible(self, headers: MutableHeaders) -> bool:
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return any(content_type.startswith(allowed) for allowed in self.compressible_types)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, path: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.path = path
+        self.send = send
+        self.start_message: Optional[Message] = None
+        self.codec: Optional[_Codec] = None
+        self.passthrough = False
+        self.if_none_match = ""
+
+    def _mark_encoded(self, headers: MutableHeaders):
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # The compressed bytes differ from the identity representation
+            headers["ETag"] = f"W/{etag}"
+
+    def _mark_not_modified(self, headers: MutableHeaders):
+        """Give a 304 the Vary and ETag of the 200 whose cached copy it validates"""
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/") and f"W/{etag}" in self.if_none_match:
+            # The client holds the compressed representation, which carries the weak tag
+            headers["ETag"] = f"W/{etag}"
+
+    async def __call__(self, message: Message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = MutableHeaders(scope=message)
+            status_code = message["status"]
+            self.passthrough = (
+                status_code < 200 or status_code in (204, 304)
+                or not self.middleware.is_compressible(headers)
+            )
+            if status_code == 304:
+                self._mark_not_modified(headers)
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if self.passthrough or message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        headers = MutableHeaders(scope=self.start_message)
+
+        if self.codec is None and not more_body:
+            # Complete response in one message
+            if len(body) < self.middleware.minimum_size:
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            compressed = self.middleware.compress_body(self.path, self.encoding, body)
+            self._mark_encoded(headers)
+            headers["Content-Length"] = str(len(compressed))
+            await self.send(self.start_message)
+            await self.send({"type": "http.response.body", "body": compressed})
+            return
+
+        if self.codec is None:
+            # Streaming response: the final length is unknown, switch to chunked
+            self.codec = self.middleware.codec(self.encoding)
+            self._mark_encoded(headers)
+            del headers["Content-Length"]
+            await self.send(self.start_message)
+
+        if more_body:
+            chunk = self.codec.compress(body) + self.codec.flush()
+        else:
+            chunk = self.codec.compress(body) + self.codec.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,232 @@
+import json
+import time
+from collections import deque
+from typing import Any, Dict, Hashable, Optional, Sequence
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import metrics
+
+# Route priority classes, most important first
+CRITICAL = "critical"  # Health checks: never shed
+READ = "read"  # Authenticated reads
+DEFAULT = "default"
+EXPENSIVE = "expensive"  # Auth and bcrypt-heavy endpoints: shed first
+
+# Fraction of the current limit each class may fill before it is shed
+DEFAULT_SHARES = {
+    CRITICAL: float("inf"),
+    READ: 1.0,
+    DEFAULT: 0.85,
+    EXPENSIVE: 0.6,
+}
+
+concurrency_limit_gauge = metrics.gauge(
+    "adaptive_concurrency_limit", "Current adaptive concurrency limit"
+)
+in_flight_gauge = metrics.gauge(
+    "adaptive_concurrency_in_flight", "Requests currently admitted"
+)
+shed_counter = metrics.counter(
+    "adaptive_concurrency_shed_total", "Requests rejected with 503, by priority class"
+)
+
+
+class _RouteLatency:
+    """A route's recent completions, and its baseline: a low percentile over a long window"""
+
+    __slots__ = ("samples", "recent", "baseline", "count", "sampled_at")
+
+    def __init__(self, window: int, recent_window: int):
+        self.samples: deque = deque(maxlen=window)
+        self.recent: deque = deque(maxlen=recent_window)
+        self.baseline = 0.0
+        self.count = 0
+        self.sampled_at = float("-inf")
+
+
+class AIMDLimiter:
+    """
+    Additive-increase / multiplicative-decrease concurrency limit driven by latency.
+
+    Routes differ by orders of magnitude (a token check vs. a bcrypt login), so
+    each is judged against itself: the median of its last `recent_window`
+    completions against a baseline, the `baseline_percentile` of `window`
+    samples taken at most once per `sample_interval` (five minutes by
+    default, however busy the route). So the baseline follows a permanently
+    slower backend, but not a minute of overload, and one fast outlier
+    doesn't set it. Single slow responses (GC, a slow round trip, a cache
+    miss) don't move the median; once it exceeds `tolerance` times the
+    baseline that counts as congestion and cuts the limit by `backoff` (at
+    most once per `backoff_interval`). A route is only judged after
+    `min_samples` completions. Otherwise, while the limit is actually in
+    use, it grows by about one request per limit's worth of completions.
+    """
+
+    def __init__(
+            self,
+            initial_limit: int = 100,
+            min_limit: int = 8,
+            max_limit: int = 1000,
+            tolerance: float = 1.5,
+            backoff: float = 0.9,
+            backoff_interval: float = 0.1,
+            recent_window: int = 32,
+            window: int = 600,
+            sample_interval: float = 0.5,
+            baseline_percentile: float = 0.1,
+            min_samples: int = 20
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.backoff_interval = backoff_interval
+        self.recent_window = recent_window
+        self.window = window
+        self.sample_interval = sample_interval
+        self.baseline_percentile = baseline_percentile
+        self.min_samples = min_samples
+        self.in_flight = 0
+        self._routes: Dict[Hashable, _RouteLatency] = {}
+        self._last_backoff = 0.0
+        concurrency_limit_gauge.set(self.limit)
+
+    def _slowed_down(self, route: Hashable, latency: float, now: float) -> bool:
+        """Record a completion; whether the route's recent latency is well above its baseline"""
+        stats = self._routes.get(route)
+        if stats is None:
+            stats = self._routes[route] = _RouteLatency(self.window, self.recent_window)
+        stats.recent.append(latency)
+        stats.count += 1
+        if stats.count <= self.min_samples or now - stats.sampled_at >= self.sample_interval:
+            stats.samples.append(latency)
+            stats.sampled_at = now
+            ordered = sorted(stats.samples)
+            stats.baseline = ordered[int(len(ordered) * self.baseline_percentile)]
+        if stats.count < self.min_samples:
+            return False
+        recent = sorted(stats.recent)
+        return recent[len(recent) // 2] > stats.baseline * self.tolerance
+
+    def try_acquire(self, share: float) -> bool:
+        if self.in_flight >= self.limit * share:
+            return False
+        self.in_flight += 1
+        in_flight_gauge.set(self.in_flight)
+        return True
+
+    def release(self, route: Optional[Hashable], latency: float, overloaded: bool = False):
+        """
+        Record a completion of `route`; None for requests whose latency says
+        nothing about load (e.g. long uploads), which only free their slot.
+        """
+        self.in_flight -= 1
+        in_flight_gauge.set(self.in_flight)
+        if route is None and not overloaded:
+            return
+        now = time.monotonic()
+        slowed_down = route is not None and self._slowed_down(route, latency, now)
+        congested = overloaded or slowed_down
+
+        if congested:
+            if now - self._last_backoff >= self.backoff_interval:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_backoff = now
+        elif self.in_flight >= self.limit / 2:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        concurrency_limit_gauge.set(self.limit)
+
+
+class AdaptiveConcurrencyMiddleware:
+    """
+    Pure ASGI load shedding in front of the app. Requests above their class's
+    share of the adaptive limit are rejected immediately with 503 and
+    Retry-After instead of queueing in the event loop, so admitted requests
+    keep their latency under overload.
+
+    Latency is judged per matched route (the endpoint the router put in the
+    scope), falling back to the priority class for unrouted requests.
+    `unmeasured_paths` (e.g. streaming uploads) never feed the limit.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            api_prefix: str = "",
+            critical_paths: Sequence[str] = ("/health",),
+            expensive_paths: Sequence[str] = ("/auth",),
+            unmeasured_paths: Sequence[str] = (),
+            shares: Optional[Dict[str, float]] = None,
+            retry_after: int = 1,
+            limiter: Optional[AIMDLimiter] = None
+    ):
+        self.app = app
+        self.critical_paths = tuple(api_prefix + path for path in critical_paths)
+        self.expensive_paths = tuple(api_prefix + path for path in expensive_paths)
+        self.unmeasured_paths = tuple(api_prefix + path for path in unmeasured_paths)
+        self.shares = {**DEFAULT_SHARES, **(shares or {})}
+        self.retry_after = retry_after
+        self.limiter = limiter or AIMDLimiter()
+
+    def classify(self, scope: Scope) -> str:
+        path = scope["path"]
+        if path.startswith(self.critical_paths):
+            return CRITICAL
+        if path.startswith(self.expensive_paths):
+            return EXPENSIVE
+        if scope["method"] in ("GET", "HEAD") and "authorization" in Headers(scope=scope):
+            return READ
+        return DEFAULT
+
+    def route_key(self, scope: Scope, priority: str) -> Optional[Any]:
+        """Baseline key for a finished request: its method and endpoint once routed"""
+        if self.unmeasured_paths and scope["path"].startswith(self.unmeasured_paths):
+            return None
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return priority
+        return scope["method"], endpoint
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        priority = self.classify(scope)
+        if not self.limiter.try_acquire(self.shares[priority]):
+            shed_counter.inc(priority=priority)
+            await self._reject(send)
+            return
+
+        start = time.monotonic()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Upstream saturation signals (e.g. deadline exceeded) count as congestion
+            self.limiter.release(
+                self.route_key(scope, priority), time.monotonic() - start, overloaded=status_code in (503, 504)
+            )
+
+    async def _reject(self, send: Send):
+        body = json.dumps({"detail": "Server overloaded, retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,65 @@
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core import deadline
+
+
+class DeadlineMiddleware:
+    """
+    Pure ASGI middleware that starts each request's time budget.
+
+    The budget comes from the `X-Request-Timeout` header (seconds, capped at
+    `max_timeout`), else the longest matching prefix in `route_timeouts`, else
+    `default_timeout`. Repository calls read it through `app.core.deadline`; a
+    request whose budget is spent gets 504 from the DeadlineExceeded handler.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            default_timeout: Optional[float] = 10.0,
+            max_timeout: float = 30.0,
+            route_timeouts: Optional[Dict[str, float]] = None,
+            header: str = "x-request-timeout"
+    ):
+        self.app = app
+        self.default_timeout = default_timeout
+        self.max_timeout = max_timeout
+        # Longest prefix first so specific routes win
+        self.route_timeouts = sorted((route_timeouts or {}).items(), key=lambda item: -len(item[0]))
+        self.header = header
+
+    def timeout_for(self, scope: Scope) -> Optional[float]:
+        value = Headers(scope=scope).get(self.header)
+        if value:
+            try:
+                requested = float(value)
+            except ValueError:
+                requested = None
+            if requested is not None and requested > 0:
+                return min(requested, self.max_timeout)
+
+        path = scope["path"]
+        for prefix, timeout in self.route_timeouts:
+            if path.startswith(prefix):
+                return timeout
+        return self.default_timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = deadline.set_deadline(self.timeout_for(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            deadline.reset_deadline(token)
+
+
+async def deadline_exceeded_handler(request: Request, exc: deadline.DeadlineExceeded) -> JSONResponse:
+    return JSONResponse(status_code=504, content={"detail": "Request deadline exceeded"})
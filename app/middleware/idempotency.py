@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import deadline
+from app.core.metrics import metrics
+from app.db.idempotency import IdempotencyStore, StoredResponse
+
+logger = logging.getLogger(__name__)
+
+MUTATING_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+# Responses a retry should run again rather than replay
+_NOT_STORED = frozenset({408, 409, 425, 429})
+
+idempotency_requests = metrics.counter(
+    "idempotency_requests_total",
+    "Requests carrying an Idempotency-Key, by outcome (executed, replayed, conflict, mismatch, unavailable)"
+)
+
+
+def _json_response(status: int, detail: str, extra_headers: Sequence[Tuple[bytes, bytes]] = ()) -> StoredResponse:
+    body = json.dumps({"detail": detail}).encode()
+    return StoredResponse(
+        fingerprint="",
+        status=status,
+        headers=[(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                 *extra_headers],
+        body=body
+    )
+
+
+class IdempotencyMiddleware:
+    """
+    Pure ASGI middleware for `Idempotency-Key` on mutating requests.
+
+    The first request with a key runs normally and its response (status,
+    headers, body) is stored; retries with the same key get those bytes back
+    without reaching the handler, marked `Idempotent-Replayed: true`. A
+    duplicate arriving while the first is still running waits for it: on the
+    same worker by awaiting it directly, on another worker by polling the
+    store, within the request's deadline and `wait_timeout` (409 after that).
+
+    Keys are scoped to method, path, query string and the caller's
+    Authorization header, so one client can't replay another's response.
+    Reusing a key with a different query string or body is rejected with 422.
+    At most `max_request_buffer` bytes of the body are held to fingerprint it;
+    a longer (streamed) upload is fingerprinted by that prefix and its
+    Content-Length, and the rest streams through unbuffered.
+
+    Server errors and responses larger than `max_body_size` are not stored,
+    so a retry runs the request again; nor is anything under `excluded_paths`
+    (token-issuing routes, whose responses must not be kept or replayed). The
+    key's lease is renewed while the request runs, so a slow request isn't
+    taken over by a retry. Sits inside CompressionMiddleware, which then
+    encodes replays per request.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            store: IdempotencyStore,
+            api_prefix: str = "",
+            max_body_size: int = 64 * 1024,
+            max_request_buffer: int = 1024 * 1024,
+            wait_timeout: float = 10.0,
+            excluded_paths: Sequence[str] = (),
+            header: str = "idempotency-key"
+    ):
+        self.app = app
+        self.store = store
+        self.api_prefix = api_prefix
+        self.max_body_size = max_body_size
+        self.max_request_buffer = max_request_buffer
+        self.wait_timeout = wait_timeout
+        self.excluded_paths = frozenset(api_prefix + path for path in excluded_paths)
+        self.header = header
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+                scope["type"] != "http"
+                or scope["method"] not in MUTATING_METHODS
+                or not scope["path"].startswith(self.api_prefix)
+                or scope["path"].rstrip("/") in self.excluded_paths
+        ):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get(self.header)
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > 255:
+            await self._send(send, _json_response(400, "Idempotency-Key is too long"))
+            return
+
+        # The body is part of the fingerprint, so read (a bounded prefix of) it up front and replay it to the app
+        read = await self._read_prefix(receive)
+        if read is None:
+            return  # Client went away
+        body, complete = read
+        query_string = scope.get("query_string", b"")
+        fingerprint = hashlib.sha256(query_string + b"\n")
+        fingerprint.update(body)
+        if not complete:
+            fingerprint.update(b"\n" + headers.get("content-length", "").encode())
+        key = hashlib.sha256(
+            "\n".join([
+                scope["method"], scope["path"], query_string.decode("latin-1"),
+                headers.get("authorization", ""), idempotency_key
+            ]).encode()
+        ).hexdigest()
+        receive = _replay_body(body, receive, more_body=not complete)
+
+        try:
+            response = await self._settle(key, fingerprint.hexdigest())
+        except deadline.DeadlineExceeded:
+            # Raised outside the app, so the app's DeadlineExceeded handler never sees it
+            response = _json_response(504, "Request deadline exceeded")
+        except Exception as e:
+            # The store is unreachable: serve the request rather than fail it
+            logger.warning(f"Idempotency store unavailable, running request without it: {e}")
+            idempotency_requests.inc(outcome="unavailable")
+            await self.app(scope, receive, send)
+            return
+
+        if response is not None:
+            await self._send(send, response)
+            return
+        await self._execute(key, fingerprint.hexdigest(), scope, receive, send)
+
+    async def _settle(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """
+        A response to send instead of running the request (a replay or an
+        error), or None once this request owns the key and should run.
+        """
+        waited = 0.0
+        poll = 0.05
+        while True:
+            local = self._in_flight.get(key)
+            if local is not None:
+                # Same worker: wait for the running request itself
+                try:
+                    await deadline.bounded(asyncio.wait_for(asyncio.shield(local), self.wait_timeout))
+                except asyncio.TimeoutError:
+                    return self._conflict()
+                continue
+
+            claim = await self.store.claim(key, fingerprint)
+            if claim.owned:
+                self._in_flight[key] = asyncio.get_running_loop().create_future()
+                return None
+            if claim.response is not None:
+                if claim.response.fingerprint != fingerprint:
+                    idempotency_requests.inc(outcome="mismatch")
+                    return _json_response(422, "Idempotency-Key was already used with a different request")
+                idempotency_requests.inc(outcome="replayed")
+                return StoredResponse(
+                    fingerprint=fingerprint,
+                    status=claim.response.status,
+                    headers=[*claim.response.headers, (b"idempotent-replayed", b"true")],
+                    body=claim.response.body
+                )
+            if claim.fingerprint is not None and claim.fingerprint != fingerprint:
+                idempotency_requests.inc(outcome="mismatch")
+                return _json_response(422, "Idempotency-Key was already used with a different request")
+            if claim.fingerprint is None:
+                continue  # Released or expired meanwhile; claim again
+
+            # Another worker is running it: poll the store
+            if waited >= self.wait_timeout:
+                return self._conflict()
+            await deadline.bounded(asyncio.sleep(poll))
+            waited += poll
+            poll = min(poll * 2, 0.5)
+
+    def _conflict(self) -> StoredResponse:
+        idempotency_requests.inc(outcome="conflict")
+        return _json_response(
+            409, "A request with this Idempotency-Key is still being processed", [(b"retry-after", b"1")]
+        )
+
+    async def _execute(self, key: str, fingerprint: str, scope: Scope, receive: Receive, send: Send):
+        idempotency_requests.inc(outcome="executed")
+        status = 500
+        response_headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+        size = 0
+        complete = False
+
+        async def send_wrapper(message: Message):
+            nonlocal status, response_headers, size, complete
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size <= self.max_body_size:
+                    chunks.append(chunk)
+                complete = not message.get("more_body", False)
+            await send(message)
+
+        stored: Optional[StoredResponse] = None
+        renewal = asyncio.ensure_future(self._renew(key))
+        try:
+            await self.app(scope, receive, send_wrapper)
+            if complete and size <= self.max_body_size and status < 500 and status not in _NOT_STORED:
+                stored = StoredResponse(
+                    fingerprint=fingerprint, status=status, headers=response_headers, body=b"".join(chunks)
+                )
+        finally:
+            renewal.cancel()
+            try:
+                await self._finish(key, stored)
+            finally:
+                # Waiters then find the response in the front cache, or claim the released key
+                self._in_flight.pop(key).set_result(None)
+
+    async def _renew(self, key: str):
+        """Keep the key's lease from running out under a request that outlasts it"""
+        while True:
+            await asyncio.sleep(self.store.lease / 3)
+            token = deadline.set_deadline(None)
+            try:
+                await self.store.renew(key)
+            except Exception as e:
+                logger.warning(f"Failed to renew idempotency lease: {e}")
+            finally:
+                deadline.reset_deadline(token)
+
+    async def _finish(self, key: str, stored: Optional[StoredResponse]):
+        # The response has been sent; recording it must not be cut short by the request's budget
+        token = deadline.set_deadline(None)
+        try:
+            if stored is not None:
+                await self.store.complete(key, stored)
+            else:
+                await self.store.release(key)
+        except Exception as e:
+            logger.warning(f"Failed to record idempotent response: {e}")
+        finally:
+            deadline.reset_deadline(token)
+
+    async def _read_prefix(self, receive: Receive) -> Optional[Tuple[bytes, bool]]:
+        """The body read so far, stopping past `max_request_buffer`, and whether it's all of it"""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunk = message.get("body", b"")
+            chunks.append(chunk)
+            size += len(chunk)
+            if not message.get("more_body", False):
+                return b"".join(chunks), True
+            if size >= self.max_request_buffer:
+                return b"".join(chunks), False
+
+    @staticmethod
+    async def _send(send: Send, response: StoredResponse):
+        await send({"type": "http.response.start", "status": response.status, "headers": response.headers})
+        await send({"type": "http.response.body", "body": response.body})
+
+
+def _replay_body(body: bytes, receive: Receive, more_body: bool = False) -> Receive:
+    """Hand the already read body to the app, then pass through (the rest of it, disconnects)"""
+    sent = False
+
+    async def replay() -> Message:
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": more_body}
+        return await receive()
+
+    return replay
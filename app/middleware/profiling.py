@@ -0,0 +1,46 @@
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.profiling import Profiler
+from app.core.tracing import current_span
+
+
+class ProfilingMiddleware:
+    """
+    Registers requests with the profiler: claims them for armed profiling
+    sessions (next N requests, or a valid `X-Profile` token) and hands slow
+    ones, with their span breakdown, to the slow-request buffer. Must sit inside
+    TracingMiddleware so the request's trace is current.
+    """
+
+    def __init__(self, app: ASGIApp, profiler: Profiler, header: str = "x-profile"):
+        self.app = app
+        self.profiler = profiler
+        self.header = header
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sessions = self.profiler.claim(Headers(scope=scope).get(self.header))
+        if not sessions and self.profiler.slow_threshold is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = id(scope)
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.profiler.request_started(key, scope["method"], scope["path"], sessions)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            root = current_span()
+            spans = list(root.trace.spans) if root is not None else None
+            self.profiler.request_finished(key, status_code, spans)
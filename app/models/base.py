@@ -1,7 +1,7 @@
 # app/models/base.py
 from datetime import datetime
 import uuid
-from typing import Any, Dict
+from typing import Any, ClassVar, Dict, Tuple
 from pydantic import BaseModel, Field, ConfigDict
 
 
@@ -21,6 +21,10 @@ def milliseconds_to_datetime(ms: int) -> datetime:
 
 
 class MongoBaseModel(BaseModel):
+    # Datetime fields stored as milliseconds timestamps
+    timestamp_fields: ClassVar[Tuple[str, ...]] = ("created_at", "updated_at")
+
+    # Always hex here and in the API; repositories store it per ID_REPRESENTATION (app/db/ids.py)
     id: str = Field(default_factory=generate_uuid, alias="_id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -32,15 +36,19 @@ class MongoBaseModel(BaseModel):
         json_encoders={datetime: datetime_to_milliseconds}
     )
 
+    @property
+    def version(self) -> int:
+        """Milliseconds `updated_at` as stored in the DB; changes on every write"""
+        return round(self.updated_at.timestamp() * 1000)
+
     def model_dump(self, **kwargs) -> Dict[str, Any]:
         """Override model_dump to convert timestamps to milliseconds for DB storage"""
         data = super().model_dump(**kwargs)
 
         # Convert datetime fields to milliseconds for DB storage
-        if 'created_at' in data and isinstance(data['created_at'], datetime):
-            data['created_at'] = datetime_to_milliseconds(data['created_at'])
-        if 'updated_at' in data and isinstance(data['updated_at'], datetime):
-            data['updated_at'] = datetime_to_milliseconds(data['updated_at'])
+        for name in self.timestamp_fields:
+            if isinstance(data.get(name), datetime):
+                data[name] = datetime_to_milliseconds(data[name])
 
         return data
 
@@ -48,8 +56,7 @@ class MongoBaseModel(BaseModel):
     def from_db(cls, data: Dict[str, Any]) -> 'MongoBaseModel':
         """Create model instance from DB data, converting milliseconds to datetime"""
         if data:
-            if 'created_at' in data and isinstance(data['created_at'], (int, float)):
-                data['created_at'] = milliseconds_to_datetime(int(data['created_at']))
-            if 'updated_at' in data and isinstance(data['updated_at'], (int, float)):
-                data['updated_at'] = milliseconds_to_datetime(int(data['updated_at']))
+            for name in cls.timestamp_fields:
+                if isinstance(data.get(name), (int, float)):
+                    data[name] = milliseconds_to_datetime(int(data[name]))
         return cls(**data)
\ No newline at end of file
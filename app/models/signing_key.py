@@ -0,0 +1,20 @@
+# app/models/signing_key.py
+from typing import Any, Dict, Optional
+
+from pydantic import Field
+
+from app.models.base import MongoBaseModel
+
+
+class SigningKey(MongoBaseModel):
+    """Asymmetric JWT signing key; `id` doubles as the JWS `kid`"""
+    algorithm: str
+    private_key_pem: str  # PKCS8, encrypted with a key derived from JWT_SECRET_KEY
+    public_jwk: Dict[str, Any] = Field(default_factory=dict)
+    generation: Optional[int] = None  # Rotation number, unique; None for keys created before it existed
+    activates_at: int  # Milliseconds timestamp, first moment the key may sign
+    deactivates_at: int  # Milliseconds timestamp, key stops signing
+    expires_at: int  # Milliseconds timestamp, key stops verifying (end of grace period)
+
+    class Config:
+        collection_name = "jwt_keys"  # MongoDB collection name
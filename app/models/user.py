@@ -1,5 +1,6 @@
 # app/models/user.py
-from typing import Optional, List
+from datetime import datetime
+from typing import ClassVar, List, Optional, Tuple
 
 from app.models.base import MongoBaseModel
 
@@ -12,6 +13,18 @@ class User(MongoBaseModel):
     oauth_provider: Optional[str] = None
     oauth_id: Optional[str] = None
     roles: List[str] = ["user"]
+    # Bumped whenever roles, is_superuser or is_active change; tokens carrying an older one are stale
+    authz_version: int = 0
+    # Lowercased copies maintained by UserRepository for indexed prefix search
+    email_lower: Optional[str] = None
+    full_name_lower: Optional[str] = None
+    # Activity, written behind by UserRepository.record_activity (not reflected in updated_at)
+    last_seen_at: Optional[datetime] = None
+    last_login_at: Optional[datetime] = None
+
+    timestamp_fields: ClassVar[Tuple[str, ...]] = (
+        "created_at", "updated_at", "last_seen_at", "last_login_at"
+    )
 
     class Config:
         collection_name = "users"  # MongoDB collection name
@@ -28,6 +41,11 @@ class User(MongoBaseModel):
     "oauth_provider": null,
     "oauth_id": null,
     "roles": ["user"],
+    "authz_version": 0,  # Incremented on role, superuser or active changes
+    "email_lower": "user@example.com",
+    "full_name_lower": "john doe",
+    "last_seen_at": 1634567990123,  # Milliseconds timestamp, written behind
+    "last_login_at": 1634567890123,  # Milliseconds timestamp, written behind
     "created_at": 1634567890123,  # Milliseconds timestamp
     "updated_at": 1634567890123,  # Milliseconds timestamp
     "is_active": true
@@ -1,8 +1,10 @@
 from datetime import datetime
-from typing import Optional
+from typing import Generic, List, Optional, TypeVar
 
 from pydantic import BaseModel, Field
 
+ItemType = TypeVar("ItemType")
+
 
 class BaseSchema(BaseModel):
     id: Optional[str] = Field(None, alias="_id")
@@ -20,3 +22,18 @@ class BaseSchema(BaseModel):
                 "is_active": True
             }
         }
+
+
+class Page(BaseModel, Generic[ItemType]):
+    """Paginated list envelope"""
+    items: List[ItemType]
+    total: int
+    has_more: bool
+    total_is_estimate: bool = False
+
+
+class CursorPage(BaseModel, Generic[ItemType]):
+    """Cursor-paginated list envelope; pass `next_cursor` back to get the next page"""
+    items: List[ItemType]
+    next_cursor: Optional[str] = None
+    has_more: bool
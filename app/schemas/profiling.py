@@ -0,0 +1,19 @@
+# app/schemas/profiling.py
+from typing import Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ProfileSessionCreate(BaseModel):
+    mode: Literal["next", "header"] = "next"
+    requests: int = Field(10, ge=1, le=1000)  # Only used in "next" mode
+    ttl_seconds: int = Field(300, ge=1, le=3600)
+
+
+class ProfileSessionResponse(BaseModel):
+    id: str
+    mode: str
+    requests: int
+    profiled: int
+    expires_at: float
+    token: Optional[str] = None  # Send as X-Profile in "header" mode
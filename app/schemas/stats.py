@@ -0,0 +1,21 @@
+# app/schemas/stats.py
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class DailyCount(BaseModel):
+    day: str  # YYYY-MM-DD, UTC
+    count: int
+
+
+class UserStatsResponse(BaseModel):
+    total: int
+    active: int
+    inactive: int  # Soft-deleted, until archived
+    roles: Dict[str, int]
+    providers: Dict[str, int]  # oauth_provider; "password" for local accounts
+    signups_per_day: List[DailyCount]  # Days without signups are omitted
+    refreshed_at: datetime
+    full_rebuild_at: Optional[datetime] = None
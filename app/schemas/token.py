@@ -1,5 +1,5 @@
 # app/schemas/token.py
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -16,6 +16,8 @@ class TokenPayload(BaseModel):
     iat: int
     type: str = "access_token"
     roles: List[str] = ["user"]
+    is_superuser: bool = False
+    authz_version: Optional[int] = None  # None in tokens issued before they carried claims
 
 
 class TokenRefreshRequest(BaseModel):
@@ -0,0 +1,30 @@
+# app/schemas/user_import.py
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class UserImportError(BaseModel):
+    row: int  # Data row number in the uploaded file, from 1
+    email: Optional[str] = None
+    error: str
+
+
+class UserImportStatus(BaseModel):
+    id: str = Field(alias="_id")
+    source: str
+    format: str
+    status: str  # running, completed or failed
+    rows_done: int
+    inserted: int
+    duplicates: int
+    invalid: int
+    errors: List[UserImportError]  # The first ones only; the counters carry the totals
+    elapsed_seconds: float
+    rows_per_second: float
+    started_at: datetime
+    updated_at: datetime
+    error: Optional[str] = None  # Why a failed import stopped
+
+    model_config = ConfigDict(populate_by_name=True)
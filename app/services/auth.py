@@ -29,15 +29,12 @@ class AuthService:
         return user
 
     async def create_token(self, user: User) -> Token:
-        access_token = create_access_token(
+        return Token(**create_access_token(
             user.id,
-            roles=user.roles
-        )
-        return Token(
-            access_token=access_token,
-            token_type="bearer",
-            expires_in=3600  # 1 hour
-        )
+            roles=user.roles,
+            is_superuser=user.is_superuser,
+            authz_version=user.authz_version
+        ))
 
     async def register_user(self, email: str, password: str, full_name: Optional[str] = None) -> User:
         # Check if user exists
@@ -79,6 +76,7 @@ class AuthService:
 
             # Create access token
             token = await self.create_token(user)
+            self.user_repo.record_activity(user.id, login=True)
 
             return user, token
 
@@ -0,0 +1,319 @@
+# app/services/user_import.py
+"""
+Bulk user import.
+
+Streams CSV or NDJSON rows in fixed-size chunks, so memory stays constant
+however large the input is. Rows are validated with UserCreate, passwords are
+hashed across a process pool (the hash is CPU-bound and deliberately slow),
+and each chunk goes in with one unordered insert_many: duplicate emails are
+recorded and the rest of the chunk is still written. Hashing of the next chunk
+overlaps the insert of the previous one.
+
+Progress is checkpointed in the `user_imports` collection after every chunk;
+running the same import id again skips the rows already done.
+"""
+import asyncio
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from pymongo import ReturnDocument
+from starlette.concurrency import run_in_threadpool
+
+from app.core import deadline
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.runtime import default_workers
+from app.core.tracing import tracer
+from app.db import consistency
+from app.db.mongodb import db
+from app.db.repositories.user import UserRepository
+from app.schemas.user import UserCreate
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+MAX_RECORDED_ERRORS = 100
+DUPLICATE_KEY = 11000
+
+imported_rows = metrics.counter(
+    "user_import_rows_total", "Rows processed by bulk user imports, by outcome (inserted, duplicate, invalid)"
+)
+
+Row = Tuple[int, Optional[Dict[str, Any]], Optional[str]]  # (row number, fields, parse error)
+
+
+def iter_rows(lines: Iterable[str], fmt: str) -> Iterator[Row]:
+    """Parse rows lazily; row numbers count data rows from 1"""
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            # Empty cells are missing values; roles are `;`-separated
+            fields = {key: value for key, value in row.items() if key and value not in (None, "")}
+            if "roles" in fields:
+                fields["roles"] = [role.strip() for role in fields["roles"].split(";") if role.strip()]
+            yield number, fields, None
+    elif fmt == "ndjson":
+        number = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                fields = json.loads(line)
+            except ValueError as e:
+                yield number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(fields, dict):
+                yield number, None, "Expected a JSON object"
+                continue
+            yield number, fields, None
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def _hash_batch(passwords: List[str]) -> List[str]:
+    """Runs in a pool process"""
+    from app.core.security import get_password_hash
+
+    return [get_password_hash(password) for password in passwords]
+
+
+def create_hash_pool(processes: Optional[int] = None) -> ProcessPoolExecutor:
+    # Spawned, not forked: the server process runs threads (Motor, profiler, loop watchdog)
+    return ProcessPoolExecutor(
+        max_workers=processes or default_workers(),
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def _stats(checkpoint: Dict[str, Any]) -> Dict[str, Any]:
+    elapsed = checkpoint.get("elapsed_seconds", 0.0)
+    return {**checkpoint, "rows_per_second": round(checkpoint["rows_done"] / elapsed, 1) if elapsed else 0.0}
+
+
+class UserImporter:
+    def __init__(
+            self,
+            pool: Executor,
+            processes: int,
+            chunk_size: int = 1000,
+            user_repo: Optional[UserRepository] = None
+    ):
+        self.pool = pool
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.user_repo = user_repo or UserRepository()
+
+    @property
+    def checkpoints(self):
+        return db.db["user_imports"]
+
+    async def status(self, import_id: str) -> Optional[Dict[str, Any]]:
+        checkpoint = await self.checkpoints.find_one({"_id": import_id})
+        return _stats(checkpoint) if checkpoint else None
+
+    async def begin(self, import_id: str, source: str, fmt: str) -> Dict[str, Any]:
+        """Create the checkpoint for a new import, or return the existing one to resume"""
+        now = datetime.utcnow()
+        checkpoint = await self.checkpoints.find_one_and_update(
+            {"_id": import_id},
+            {
+                "$setOnInsert": {
+                    "source": source,
+                    "format": fmt,
+                    "rows_done": 0,
+                    "inserted": 0,
+                    "duplicates": 0,
+                    "invalid": 0,
+                    "errors": [],
+                    "elapsed_seconds": 0.0,
+                    "started_at": now,
+                },
+                "$set": {"status": "running", "updated_at": now},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return checkpoint
+
+    async def run(
+            self,
+            import_id: str,
+            rows: Iterator[Row],
+            progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """Import `rows` (from the start of the input) under the already begun `import_id`"""
+        # Runs far longer than any request; don't inherit the caller's deadline
+        deadline.set_deadline(None)
+        checkpoint = await self.checkpoints.find_one({"_id": import_id})
+        rows_done = checkpoint["rows_done"]
+        elapsed_before = checkpoint["elapsed_seconds"]
+        start = time.monotonic()
+
+        def elapsed() -> float:
+            return elapsed_before + time.monotonic() - start
+
+        try:
+            # Resume: skip what earlier runs already wrote
+            await run_in_threadpool(lambda: next(islice(rows, rows_done, rows_done), None))
+
+            insert: Optional[asyncio.Future] = None
+            while True:
+                chunk = await run_in_threadpool(lambda: list(islice(rows, self.chunk_size)))
+                if not chunk:
+                    break
+                prepared, invalid = await self._prepare(chunk)
+                if insert is not None:
+                    await insert
+                rows_done += len(chunk)
+                insert = asyncio.ensure_future(
+                    self._insert(import_id, prepared, invalid, rows_done, elapsed, progress)
+                )
+            if insert is not None:
+                await insert
+        except BaseException as e:
+            await self._finish(import_id, "failed", elapsed(), error=repr(e))
+            raise
+        return await self._finish(import_id, "completed", elapsed())
+
+    async def _prepare(self, chunk: List[Row]) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+        """Validate a chunk and hash its passwords in parallel"""
+        valid: List[Tuple[int, UserCreate]] = []
+        invalid: List[Dict[str, Any]] = []
+        for number, fields, parse_error in chunk:
+            if parse_error:
+                invalid.append({"row": number, "error": parse_error})
+                continue
+            # Imports usually carry the password once
+            fields.setdefault("confirm_password", fields.get("password"))
+            try:
+                user_create = UserCreate(**fields)
+            except ValidationError as e:
+                invalid.append({"row": number, "email": fields.get("email"), "error": _validation_message(e)})
+                continue
+            if user_create.password != user_create.confirm_password:
+                invalid.append({"row": number, "email": user_create.email, "error": "Passwords do not match"})
+                continue
+            valid.append((number, user_create))
+
+        # One task per process, so pickling costs once per slice rather than per row
+        slice_size = max(1, -(-len(valid) // self.processes))
+        slices = [valid[i:i + slice_size] for i in range(0, len(valid), slice_size)]
+        loop = asyncio.get_running_loop()
+        hashed = await asyncio.gather(*(
+            loop.run_in_executor(self.pool, _hash_batch, [user.password for _, user in part])
+            for part in slices
+        ))
+
+        prepared = []
+        for part, hashes in zip(slices, hashed):
+            for (number, user_create), hashed_password in zip(part, hashes):
+                data = user_create.model_dump(exclude={"password", "confirm_password"})
+                data["hashed_password"] = hashed_password
+                prepared.append((number, data))
+        return prepared, invalid
+
+    async def _insert(
+            self,
+            import_id: str,
+            prepared: List[Tuple[int, Dict[str, Any]]],
+            invalid: List[Dict[str, Any]],
+            rows_done: int,
+            elapsed: Callable[[], float],
+            progress: Optional[Callable[[Dict[str, Any]], None]]
+    ):
+        with consistency.use("bulk"):
+            write_errors = await self.user_repo.create_many([data for _, data in prepared])
+        duplicates = 0
+        errors = list(invalid)
+        for error in write_errors:
+            number, data = prepared[error["index"]]
+            if error["code"] == DUPLICATE_KEY:
+                duplicates += 1
+                errors.append({"row": number, "email": data["email"], "error": "Duplicate email"})
+            else:
+                errors.append({"row": number, "email": data["email"], "error": error["errmsg"]})
+        failed = len(write_errors) - duplicates
+        inserted = len(prepared) - len(write_errors)
+
+        imported_rows.inc(inserted, outcome="inserted")
+        imported_rows.inc(duplicates, outcome="duplicate")
+        imported_rows.inc(len(invalid) + failed, outcome="invalid")
+
+        checkpoint = await self.checkpoints.find_one_and_update(
+            {"_id": import_id},
+            {
+                "$set": {"rows_done": rows_done, "elapsed_seconds": elapsed(), "updated_at": datetime.utcnow()},
+                "$inc": {"inserted": inserted, "duplicates": duplicates, "invalid": len(invalid) + failed},
+                # Keep only the first errors; the counters carry the totals
+                "$push": {"errors": {"$each": errors, "$slice": MAX_RECORDED_ERRORS}},
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if progress:
+            progress(_stats(checkpoint))
+
+    async def _finish(self, import_id: str, status: str, elapsed: float, error: Optional[str] = None):
+        update = {"status": status, "elapsed_seconds": elapsed, "updated_at": datetime.utcnow()}
+        if error:
+            update["error"] = error
+        checkpoint = await self.checkpoints.find_one_and_update(
+            {"_id": import_id}, {"$set": update}, return_document=ReturnDocument.AFTER
+        )
+        return _stats(checkpoint)
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+    )
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_running: Dict[str, asyncio.Future] = {}
+
+
+def get_importer() -> UserImporter:
+    """Importer for the API, sharing one lazily started hash pool per worker"""
+    global _pool
+    processes = settings.USER_IMPORT_PROCESSES or default_workers()
+    if _pool is None:
+        _pool = create_hash_pool(processes)
+    return UserImporter(_pool, processes, chunk_size=settings.USER_IMPORT_CHUNK_SIZE)
+
+
+def shutdown_hash_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def is_running(import_id: str) -> bool:
+    """Whether this worker is running the import right now"""
+    return import_id in _running
+
+
+def run_in_background(importer: UserImporter, import_id: str, path: str, fmt: str):
+    """Import an uploaded file after the response; the file is removed once the import completes"""
+    async def run():
+        # Detached from the upload request's trace and deadline
+        with tracer.activate(None):
+            try:
+                with open(path, newline="") as f:
+                    await importer.run(import_id, iter_rows(f, fmt))
+                os.remove(path)
+            except Exception as e:
+                logger.error(f"User import {import_id} failed: {e}", exc_info=True)
+            finally:
+                _running.pop(import_id, None)
+
+    _running[import_id] = asyncio.ensure_future(run())
@@ -1 +1,60 @@
 # Helper functions
+from typing import Dict, List, Optional
+
+from starlette.requests import Request
+
+
+def request_origin(request: Request) -> Dict[str, Optional[str]]:
+    """Client address and user agent, as recorded on audit events"""
+    return {
+        "ip": request.client.host if request.client else None,
+        "user_agent": request.headers.get("user-agent"),
+    }
+
+
+def make_etag(doc_id: str, version: int) -> str:
+    """Strong ETag for a document revision, e.g. `"<id>-<updated_at ms>"`"""
+    return f'"{doc_id}-{version}"'
+
+
+def parse_etags(header: Optional[str], weak: bool = True) -> List[str]:
+    """
+    Split an If-Match/If-None-Match header into opaque tags without quotes.
+    With weak=False (strong comparison, as If-Match requires) weak tags are left out.
+    """
+    if not header:
+        return []
+    tags = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            if not weak:
+                continue
+            tag = tag[2:]
+        tags.append(tag.strip('"'))
+    return tags
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak comparison, `*` matches any representation)"""
+    tags = parse_etags(header)
+    return "*" in tags or etag.strip('"') in tags
+
+
+def if_match_versions(header: Optional[str], doc_id: str) -> Optional[List[int]]:
+    """
+    Versions of `doc_id` listed in an If-Match header.
+    Returns None when the header is absent or `*` (unconditional), and an empty
+    list when no tag refers to this document (the precondition can't hold).
+    Weak tags (e.g. from a compressed response) never match.
+    """
+    tags = parse_etags(header, weak=False)
+    if not header or "*" in tags:
+        return None
+
+    versions = []
+    for tag in tags:
+        tag_id, _, version = tag.rpartition("-")
+        if tag_id == doc_id and version.isdigit():
+            versions.append(int(version))
+    return versions
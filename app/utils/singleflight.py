@@ -0,0 +1,74 @@
+# app/utils/singleflight.py
+"""Coalesce identical concurrent async calls into one in-flight execution"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from app.core.metrics import metrics
+
+singleflight_calls = metrics.counter(
+    "singleflight_calls_total", "Calls executed by a single-flight group"
+)
+singleflight_coalesced = metrics.counter(
+    "singleflight_coalesced_total", "Calls that joined an already in-flight execution"
+)
+singleflight_errors = metrics.counter(
+    "singleflight_errors_total", "Executions that raised, counted once per execution"
+)
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Concurrent `do(key, fn)` calls with the same key share one execution of `fn`.
+
+    Every awaiter receives the same result object or exception. Cancelling one
+    awaiter does not cancel the shared execution for the others; the execution
+    is cancelled only once its last awaiter is gone.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._done(key, call))
+            singleflight_calls.inc(group=self.name)
+        else:
+            singleflight_coalesced.inc(group=self.name)
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every awaiter was cancelled; nobody wants the result
+                call.task.cancel()
+                # Later callers start afresh rather than join the cancelled execution
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+
+    def _done(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled() and call.task.exception() is not None:
+            singleflight_errors.inc(group=self.name)
+
+    def forget(self):
+        """Make later callers start fresh executions, e.g. after a write"""
+        self._calls.clear()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
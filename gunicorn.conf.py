@@ -0,0 +1,52 @@
+# Production launcher: gunicorn -c gunicorn.conf.py server:app
+#
+# The app is imported once in the master (preload_app) and the heap is frozen
+# right before forking, so workers share the imported code and objects
+# copy-on-write instead of each holding a private copy.
+import gc
+import logging
+import os
+
+from app.core.runtime import available_cpus, default_workers, memory_usage
+
+# Keep collections from touching (and un-sharing) pages until the heap is frozen
+gc.disable()
+
+logger = logging.getLogger("gunicorn.error")
+
+bind = os.getenv("BIND", "0.0.0.0:3000")
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or default_workers()
+worker_class = "app.core.workers.ProductionUvicornWorker"
+preload_app = os.getenv("PRELOAD_APP", "1") == "1"
+
+# Recycle workers to cap memory growth; jitter avoids restarting them all at once
+max_requests = int(os.getenv("MAX_REQUESTS", "20000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "2000"))
+
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 30
+
+
+def when_ready(server):
+    logger.info(
+        f"Starting {workers} workers (usable CPUs {available_cpus():g}), "
+        f"worker class {worker_class}, preload {preload_app}, master RSS {memory_usage()}"
+    )
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+
+
+def post_worker_init(worker):
+    logger.info(f"Worker {worker.pid} booted, memory kB {memory_usage()}")
+
+
+def worker_exit(server, worker):
+    logger.info(f"Worker {worker.pid} exiting (max_requests {worker.max_requests}), memory kB {memory_usage()}")
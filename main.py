@@ -1,11 +1,12 @@
 import uvicorn
 
+# Development entry point with auto-reload (single process; reload and workers are
+# mutually exclusive). Production runs `gunicorn -c gunicorn.conf.py server:app`.
 if __name__ == "__main__":
     uvicorn.run(
         "server:app",
-        workers=4,
         host="127.0.0.1",
         port=3000,
         reload=True,
         timeout_keep_alive=30
-    )
\ No newline at end of file
+    )
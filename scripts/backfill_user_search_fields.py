@@ -0,0 +1,25 @@
+"""
+One-off backfill of the lowercase search fields (email_lower, full_name_lower)
+for users created before prefix search existed.
+
+    python -m scripts.backfill_user_search_fields
+"""
+import asyncio
+
+from app.db.mongodb import db
+from app.db.repositories.user import UserRepository
+
+
+async def main():
+    await db.connect_to_database()
+    try:
+        repo = UserRepository()
+        await repo.ensure_indexes()
+        updated = await repo.backfill_search_fields()
+        print(f"Backfilled search fields on {updated} users")
+    finally:
+        await db.close_database_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""
+Round trips for 1k concurrent `GET /users/{id}` with and without find_by_id batching.
+
+Requires a reachable MongoDB (MONGODB_URL); data goes to a throwaway
+`<MONGODB_DB_NAME>_bench` database that is dropped afterwards.
+
+    python -m scripts.benchmarks.batch_loader --requests 1000 --users 1000
+"""
+import argparse
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.db.mongodb import db
+from app.db.repositories.user import UserRepository
+from app.models.base import generate_uuid
+from scripts.benchmarks.common import CommandCounter, Timer, asgi_request
+from server import create_application
+
+
+async def run(app, counter: CommandCounter, token: str, user_ids, requests: int, batching: bool):
+    settings.REPOSITORY_BATCH_LOADING = batching
+    UserRepository.cache.clear()
+    counter.reset()
+
+    async def one(i: int):
+        return await asgi_request(
+            app,
+            "GET",
+            f"{settings.API_V1_STR}/users/{user_ids[i % len(user_ids)]}",
+            headers=[("Authorization", f"Bearer {token}")],
+            client=(f"10.0.{i // 250}.{i % 250}", 50000)  # Stay under the per-IP rate limit
+        )
+
+    with Timer() as timer:
+        results = await asyncio.gather(*[one(i) for i in range(requests)])
+
+    ok = sum(1 for status_code, _, _ in results if status_code == 200)
+    finds = counter.counts.get("find", 0)
+    print(
+        f"batching={'on ' if batching else 'off'} ok={ok}/{requests} "
+        f"find_round_trips={finds} elapsed={timer.elapsed:.3f}s "
+        f"round_trips/s={finds / timer.elapsed:.0f} requests/s={requests / timer.elapsed:.0f}"
+    )
+
+
+async def main(args):
+    counter = CommandCounter()
+    db.client = AsyncIOMotorClient(settings.MONGODB_URL, event_listeners=[counter])
+    db.db = db.client[f"{settings.MONGODB_DB_NAME}_bench"]
+    # Measure Mongo reads, not the in-process cache
+    UserRepository.cache.default_ttl = 0
+    UserRepository.cache.ttls = {}
+    UserRepository.cache.negative_ttl = 0
+
+    users = [
+        {"_id": generate_uuid(), "email": f"bench{i}@example.com", "hashed_password": "x",
+         "is_superuser": i == 0, "is_active": True, "roles": ["user"],
+         "created_at": 0, "updated_at": 0}
+        for i in range(args.users)
+    ]
+    await db.db.users.delete_many({})
+    await db.db.users.insert_many(users)
+    token = create_access_token(users[0]["_id"])["access_token"]
+
+    app = create_application()
+    try:
+        for batching in (False, True):
+            await run(app, counter, token, [u["_id"] for u in users], args.requests, batching)
+    finally:
+        await db.client.drop_database(db.db.name)
+        db.client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,82 @@
+# Shared helpers for the benchmark scripts
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts MongoDB commands (round trips) issued by the client"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+
+    def started(self, event):
+        self.counts[event.command_name] = self.counts.get(event.command_name, 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self.counts = {}
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
+async def asgi_request(
+        app,
+        method: str,
+        path: str,
+        headers: Optional[List[Tuple[str, str]]] = None,
+        body: bytes = b"",
+        client: Tuple[str, int] = ("127.0.0.1", 50000)
+) -> Tuple[int, Dict[str, str], bytes]:
+    """Drive one request through an ASGI app in-process, without a network listener"""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or [])],
+        "client": client,
+        "server": ("bench", 80),
+    }
+    sent = False
+    response = {"status": 0, "headers": {}, "body": b""}
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], response["body"]
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,81 @@
+"""
+Bytes-out reduction and CPU cost per codec for typical API payloads.
+
+Payloads: a 100-user `GET /users` page and the OpenAPI document, plus the
+middleware path for `openapi.json` with its precompressed cache. No database needed.
+
+    python -m scripts.benchmarks.compression --iterations 200
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+
+from app.core.config import settings
+from app.middleware.compression import CompressionMiddleware, available_encodings
+from app.models.base import generate_uuid
+from app.schemas.user import UserResponse
+from scripts.benchmarks.common import Timer, asgi_request
+from server import create_application
+
+
+def users_page(n: int = 100) -> bytes:
+    users = [
+        UserResponse(
+            _id=generate_uuid(),
+            email=f"user{i}@example.com",
+            full_name=f"User Number {i}",
+            roles=["user"],
+            created_at=datetime.utcnow(),
+            updated_at=datetime.utcnow(),
+        ).model_dump(mode="json", by_alias=True)
+        for i in range(n)
+    ]
+    return json.dumps(users).encode()
+
+
+def bench_codecs(name: str, body: bytes, iterations: int):
+    middleware = CompressionMiddleware(app=None)
+    print(f"\n{name}: {len(body)} bytes identity")
+    print(f"{'codec':6} {'bytes':>8} {'ratio':>7} {'us/op':>9} {'MB/s':>8}")
+    for encoding in available_encodings():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            codec = middleware.codec(encoding)
+            compressed = codec.compress(body) + codec.finish()
+        elapsed = (time.perf_counter() - start) / iterations
+        print(
+            f"{encoding:6} {len(compressed):>8} {len(body) / len(compressed):>6.1f}x "
+            f"{elapsed * 1e6:>9.0f} {len(body) / elapsed / 1e6:>8.1f}"
+        )
+
+
+async def bench_precompressed(iterations: int):
+    app = create_application()
+    path = f"{settings.API_V1_STR}/openapi.json"
+    print(f"\nmiddleware {path} (precompressed cache after first request)")
+    for encoding in ["identity"] + available_encodings():
+        headers = [("Accept-Encoding", encoding)]
+        status_code, response_headers, body = await asgi_request(app, "GET", path, headers)
+        with Timer() as timer:
+            for _ in range(iterations):
+                await asgi_request(app, "GET", path, headers)
+        print(
+            f"{encoding:8} status={status_code} bytes={len(body):>7} "
+            f"encoding={response_headers.get('content-encoding', '-'):5} "
+            f"us/request={timer.elapsed / iterations * 1e6:.0f}"
+        )
+
+
+def main(args):
+    bench_codecs("GET /users page (100 users)", users_page(), args.iterations)
+    openapi = json.dumps(create_application().openapi()).encode()
+    bench_codecs("openapi.json", openapi, args.iterations)
+    asyncio.run(bench_precompressed(args.iterations))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,120 @@
+"""
+Size of hex-string vs binary UUID `_id`s on a synthetic user dataset.
+
+Without a database, compares BSON document and `_id` key sizes. With
+--mongo (MONGODB_URL; data goes to a throwaway `<MONGODB_DB_NAME>_bench`
+database) it also loads the same users twice, once per representation, with
+the users indexes, and reports collStats data and index sizes; their sum is
+what has to stay in cache for the working set. --migrate then times
+`migrate_ids` converting the hex copy in place.
+
+    python -m scripts.benchmarks.id_representation --users 100000
+    python -m scripts.benchmarks.id_representation --users 1000000 --mongo --migrate
+"""
+import argparse
+import asyncio
+import random
+
+import bson
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.db.ids import IdCodec, to_binary
+from app.db.mongodb import db
+from app.db.repositories.user import UserRepository
+from scripts.benchmarks.common import Timer
+from scripts.benchmarks.user_search import synthetic_user
+
+
+def with_binary_id(doc: dict) -> dict:
+    return {**doc, "_id": to_binary(doc["_id"])}
+
+
+def encoded_sizes(users: int):
+    random.seed(0)
+    docs = [synthetic_user(i) for i in range(users)]
+    hex_doc = sum(len(bson.encode(doc)) for doc in docs) / users
+    binary_doc = sum(len(bson.encode(with_binary_id(doc))) for doc in docs) / users
+    hex_key = len(bson.encode({"_id": docs[0]["_id"]}))
+    binary_key = len(bson.encode({"_id": to_binary(docs[0]["_id"])}))
+    print(f"BSON, {users} synthetic users (uncompressed)")
+    print(f"{'':12} {'hex':>10} {'binary':>10} {'saved':>8}")
+    print(f"{'doc bytes':12} {hex_doc:>10.1f} {binary_doc:>10.1f} {1 - binary_doc / hex_doc:>7.1%}")
+    print(f"{'_id bytes':12} {hex_key:>10} {binary_key:>10} {1 - binary_key / hex_key:>7.1%}")
+
+
+async def load(name: str, users: int, binary: bool, batch_size: int = 10000):
+    collection = db.db[name]
+    await collection.drop()
+    random.seed(0)  # Same users in both collections
+    for start in range(0, users, batch_size):
+        docs = [synthetic_user(start + i) for i in range(min(batch_size, users - start))]
+        if binary:
+            docs = [with_binary_id(doc) for doc in docs]
+        await collection.insert_many(docs, ordered=False)
+    await collection.create_indexes(UserRepository.indexes)
+
+
+async def coll_stats(name: str) -> dict:
+    return await db.db.command("collStats", name)
+
+
+def print_stats(hex_stats: dict, binary_stats: dict):
+    rows = [
+        ("data", "size"),
+        ("avg doc", "avgObjSize"),
+        ("data on disk", "storageSize"),
+        ("all indexes", "totalIndexSize"),
+    ]
+    print(f"\ncollStats{'':10} {'hex':>14} {'binary':>14} {'saved':>8}")
+    for label, key in rows:
+        before, after = hex_stats[key], binary_stats[key]
+        print(f"{label:19} {before:>14,} {after:>14,} {1 - after / before:>7.1%}")
+    for index, before in hex_stats["indexSizes"].items():
+        after = binary_stats["indexSizes"].get(index, 0)
+        print(f"  {index:17} {before:>14,} {after:>14,} {1 - after / before:>7.1%}")
+    before = hex_stats["size"] + hex_stats["totalIndexSize"]
+    after = binary_stats["size"] + binary_stats["totalIndexSize"]
+    print(f"{'working set':19} {before:>14,} {after:>14,} {1 - after / before:>7.1%}  (data + indexes)")
+
+
+async def main(args):
+    encoded_sizes(min(args.users, 100000))
+    if not args.mongo:
+        return
+
+    db.client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db.db = db.client[f"{settings.MONGODB_DB_NAME}_bench"]
+    try:
+        with Timer() as timer:
+            await load("users", args.users, binary=False)
+            await load("users_binary", args.users, binary=True)
+        print(f"\nloaded {args.users} users twice and built indexes in {timer.elapsed:.1f}s")
+        print_stats(await coll_stats("users"), await coll_stats("users_binary"))
+
+        if args.migrate:
+            repo = UserRepository()
+            repo.ids = IdCodec("dual")
+            with Timer() as timer:
+                migrated = await repo.migrate_ids(
+                    batch_size=args.batch_size, pause=0, transactions=not args.no_transactions
+                )
+            print(
+                f"\nmigrate_ids: {migrated} documents in {timer.elapsed:.1f}s "
+                f"({migrated / timer.elapsed:,.0f} docs/s, batch {args.batch_size})"
+            )
+    finally:
+        if not args.keep:
+            await db.client.drop_database(db.db.name)
+        db.client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--mongo", action="store_true", help="Also measure collection and index sizes")
+    parser.add_argument("--migrate", action="store_true", help="Also time migrate_ids on the hex copy")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--no-transactions", action="store_true", help="Standalone server (staged migration)")
+    parser.add_argument("--keep", action="store_true", help="Keep the bench database afterwards")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,124 @@
+"""
+Latency of admitted requests under overload, with and without adaptive load shedding.
+
+The backend is simulated: it serves `capacity` requests concurrently at the
+base latency, and beyond that latency grows linearly with concurrency, the way
+a saturated Mongo pool or bcrypt threadpool behaves. Clients keep `clients`
+requests outstanding for `duration` seconds. No database needed.
+
+The mixed case alternates a fast and a slow route of the same priority class
+(/auth/verify at 2 ms, /auth/login at 300 ms) on an otherwise idle server,
+once with routes the limiter can't tell apart (one baseline for the class)
+and once routed (a baseline per endpoint), and reports where the limit ends.
+
+    python -m scripts.benchmarks.load_shedding --clients 400 --capacity 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.middleware.concurrency import AIMDLimiter, AdaptiveConcurrencyMiddleware
+from scripts.benchmarks.common import asgi_request
+
+
+def simulated_backend(capacity: int, base_latency: float):
+    in_flight = 0
+
+    async def app(scope, receive, send):
+        nonlocal in_flight
+        in_flight += 1
+        try:
+            await asyncio.sleep(base_latency * max(1.0, in_flight / capacity))
+        finally:
+            in_flight -= 1
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    return app
+
+
+def routed_backend(latencies: dict, routed: bool):
+    """Sleeps per path; with `routed`, sets the scope's endpoint like the router does"""
+    endpoints = {path: f"endpoint:{path}" for path in latencies}
+
+    async def app(scope, receive, send):
+        if routed:
+            scope["endpoint"] = endpoints[scope["path"]]
+        await asyncio.sleep(latencies[scope["path"]])
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    return app
+
+
+async def run_mixed(routed: bool, requests: int, min_limit: int = 8):
+    latencies = {"/api/v1/auth/verify": 0.002, "/api/v1/auth/login": 0.3}
+    app = AdaptiveConcurrencyMiddleware(
+        routed_backend(latencies, routed), api_prefix="/api/v1",
+        limiter=AIMDLimiter(initial_limit=100, min_limit=min_limit)
+    )
+    paths = list(latencies)
+    shed = 0
+    for i in range(requests):
+        status_code, _, _ = await asgi_request(app, "GET", paths[i % 2], [("Authorization", "Bearer x")])
+        shed += status_code == 503
+    return app.limiter.limit, shed
+
+
+async def run(app, clients: int, duration: float):
+    latencies, shed = [], 0
+    stop_at = time.monotonic() + duration
+
+    async def client(i: int):
+        nonlocal shed
+        while time.monotonic() < stop_at:
+            start = time.monotonic()
+            status_code, _, _ = await asgi_request(app, "GET", "/api/v1/users/me", [("Authorization", "Bearer x")])
+            if status_code == 503:
+                shed += 1
+                await asyncio.sleep(0.01)  # Client-side backoff before retrying
+            else:
+                latencies.append(time.monotonic() - start)
+
+    await asyncio.gather(*[client(i) for i in range(clients)])
+    latencies.sort()
+    return {
+        "admitted/s": len(latencies) / duration,
+        "shed/s": shed / duration,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def main(args):
+    for clients in (args.capacity // 2, args.capacity, args.clients):
+        backend = simulated_backend(args.capacity, args.base_latency)
+        unprotected = await run(backend, clients, args.duration)
+        protected_app = AdaptiveConcurrencyMiddleware(
+            simulated_backend(args.capacity, args.base_latency),
+            api_prefix="/api/v1",
+            limiter=AIMDLimiter(initial_limit=args.capacity * 2)
+        )
+        protected = await run(protected_app, clients, args.duration)
+        for name, result in (("no shedding", unprotected), ("adaptive", protected)):
+            print(
+                f"clients={clients:4} {name:12} admitted/s={result['admitted/s']:7.0f} "
+                f"shed/s={result['shed/s']:7.0f} p50={result['p50_ms']:7.1f}ms p99={result['p99_ms']:7.1f}ms"
+            )
+        print(f"{'':13}final limit={protected_app.limiter.limit:.0f}")
+
+    print(f"\nmixed latency, one request in flight, {args.mixed_requests} requests (initial limit 100)")
+    for routed, name in ((False, "class baseline"), (True, "route baselines")):
+        limit, shed = await run_mixed(routed, args.mixed_requests)
+        print(f"  {name:16} final limit={limit:6.1f} shed={shed}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=400)
+    parser.add_argument("--capacity", type=int, default=50)
+    parser.add_argument("--base-latency", type=float, default=0.02)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--mixed-requests", type=int, default=40)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""
+Login throughput per password hash setting: verify latency and verifies per
+second with the hashing spread over a thread pool, as the login route does.
+No database needed.
+
+    python -m scripts.benchmarks.password_hash --threads 4 --logins 40
+"""
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.security import build_password_context
+
+PASSWORD = "correct horse battery staple"
+
+SETTINGS = [
+    ("bcrypt rounds=10", dict(scheme="bcrypt", bcrypt_rounds=10)),
+    ("bcrypt rounds=12", dict(scheme="bcrypt", bcrypt_rounds=12)),
+    ("bcrypt rounds=13", dict(scheme="bcrypt", bcrypt_rounds=13)),
+    ("argon2id t=2 m=19MiB p=1", dict(
+        scheme="argon2", argon2_time_cost=2, argon2_memory_cost_kb=19456, argon2_parallelism=1
+    )),
+    ("argon2id t=2 m=64MiB p=2", dict(
+        scheme="argon2", argon2_time_cost=2, argon2_memory_cost_kb=65536, argon2_parallelism=2
+    )),
+    ("argon2id t=3 m=64MiB p=4", dict(
+        scheme="argon2", argon2_time_cost=3, argon2_memory_cost_kb=65536, argon2_parallelism=4
+    )),
+]
+
+
+def bench(context, threads: int, logins: int):
+    hashed = context.hash(PASSWORD)
+    latencies = [0.0] * logins
+
+    def login(i: int):
+        start = time.perf_counter()
+        assert context.verify(PASSWORD, hashed)
+        latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    return statistics.median(latencies) * 1000, logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    parser.add_argument("--logins", type=int, default=40)
+    args = parser.parse_args()
+
+    print(f"{args.logins} logins over {args.threads} threads ({os.cpu_count()} CPUs)")
+    print(f"{'setting':28} {'p50 verify':>11} {'logins/s':>9}")
+    for name, options in SETTINGS:
+        p50, throughput = bench(build_password_context(**options), args.threads, args.logins)
+        print(f"{name:28} {p50:>9.1f}ms {throughput:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Prefix and full-text user search on a synthetic dataset (default 1M users).
+
+Requires a reachable MongoDB (MONGODB_URL); data goes to a throwaway
+`<MONGODB_DB_NAME>_bench` database. Reports latency percentiles and, from
+explain(), keys/documents examined per query to show the index is used.
+
+    python -m scripts.benchmarks.user_search --users 1000000 --queries 500
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import string
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.db.mongodb import db
+from app.db.repositories.user import UserRepository
+from app.models.base import generate_uuid
+from scripts.benchmarks.common import Timer
+
+FIRST_NAMES = ["alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi", "ivan", "judy",
+               "mallory", "nina", "oscar", "peggy", "quinn", "rupert", "sybil", "trent", "ursula", "victor"]
+LAST_NAMES = ["smith", "jones", "brown", "taylor", "wilson", "davies", "evans", "thomas", "johnson", "roberts"]
+
+
+def synthetic_user(i: int) -> dict:
+    first, last = random.choice(FIRST_NAMES), random.choice(LAST_NAMES)
+    suffix = "".join(random.choices(string.ascii_lowercase + string.digits, k=6))
+    email = f"{first}.{last}.{suffix}{i}@example.com"
+    full_name = f"{first.title()} {last.title()}"
+    return {
+        "_id": generate_uuid(), "email": email, "email_lower": email,
+        "full_name": full_name, "full_name_lower": full_name.lower(),
+        "hashed_password": "x", "is_superuser": False, "is_active": True, "roles": ["user"],
+        "created_at": 0, "updated_at": 0,
+    }
+
+
+async def seed(users: int, batch_size: int = 10000):
+    await db.db.users.drop()
+    with Timer() as timer:
+        for start in range(0, users, batch_size):
+            count = min(batch_size, users - start)
+            await db.db.users.insert_many([synthetic_user(start + i) for i in range(count)], ordered=False)
+        await UserRepository().ensure_indexes()
+    print(f"seeded {users} users and built indexes in {timer.elapsed:.1f}s")
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (
+        statistics.median(samples) * 1000,
+        samples[int(len(samples) * 0.95) - 1] * 1000,
+        samples[int(len(samples) * 0.99) - 1] * 1000,
+    )
+
+
+async def bench(name: str, queries, run):
+    latencies = []
+    for query in queries:
+        with Timer() as timer:
+            await run(query)
+        latencies.append(timer.elapsed)
+    p50, p95, p99 = percentiles(latencies)
+    print(f"{name:28} p50={p50:6.2f}ms p95={p95:6.2f}ms p99={p99:6.2f}ms")
+
+
+async def explain(query: dict, sort):
+    plan = await db.db.users.find(query).sort(sort).limit(21).explain()
+    stats = plan["executionStats"]
+    return stats["totalKeysExamined"], stats["totalDocsExamined"], stats["nReturned"]
+
+
+async def main(args):
+    db.client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db.db = db.client[f"{settings.MONGODB_DB_NAME}_bench"]
+    repo = UserRepository()
+    try:
+        if not args.reuse:
+            await seed(args.users)
+
+        prefixes = [random.choice(FIRST_NAMES)[:random.randint(2, 4)] for _ in range(args.queries)]
+        names = [random.choice(FIRST_NAMES)[:3] for _ in range(args.queries)]
+        words = [f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}" for _ in range(args.queries)]
+
+        await bench("prefix email (page 1)", prefixes, lambda q: repo.search_prefix(q, "email"))
+        await bench("prefix name (page 1)", names, lambda q: repo.search_prefix(q, "name"))
+
+        async def three_pages(q):
+            cursor = None
+            for _ in range(3):
+                _, cursor = await repo.search_prefix(q, "email", cursor=cursor)
+
+        await bench("prefix email (3 pages)", prefixes[:100], three_pages)
+        await bench("full-text (page 1)", words[:100], lambda q: repo.search_text(q))
+
+        keys, docs, returned = await explain(
+            {"email_lower": {"$regex": "^ali"}}, [("email_lower", 1), ("_id", 1)]
+        )
+        print(f"explain prefix '^ali': keysExamined={keys} docsExamined={docs} nReturned={returned}")
+    finally:
+        if not args.keep:
+            await db.client.drop_database(db.db.name)
+        db.client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--reuse", action="store_true", help="Skip seeding, use existing bench data")
+    parser.add_argument("--keep", action="store_true", help="Keep the bench database afterwards")
+    asyncio.run(main(parser.parse_args()))
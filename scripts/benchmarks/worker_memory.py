@@ -0,0 +1,89 @@
+"""
+Per-worker memory with and without preload_app + gc.freeze().
+
+Starts gunicorn with gunicorn.conf.py in both modes, waits for the workers
+to boot, and reads /proc/<pid>/smaps_rollup for each one (Linux only).
+Rss counts shared pages in full in every worker; Pss divides them among the
+processes sharing them, so Pss shows the real savings.
+
+    python -m scripts.benchmarks.worker_memory --workers 4
+
+--no-lifespan serves the app without its startup hooks so the comparison
+runs without a MongoDB. It measures what preloading affects: the imported
+code and module state.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from app.core.runtime import memory_usage
+from server import app as server_app
+
+
+async def app_without_lifespan(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    await server_app(scope, receive, send)
+
+
+def _children(pid: int):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def measure(preload: bool, workers: int, app: str, port: int, settle: float):
+    env = {**os.environ, "PRELOAD_APP": "1" if preload else "0", "WEB_CONCURRENCY": str(workers),
+           "BIND": f"127.0.0.1:{port}"}
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", app],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.time() + 60
+        while len(_children(master.pid)) < workers and time.time() < deadline:
+            time.sleep(0.2)
+        time.sleep(settle)
+        pids = _children(master.pid)
+        usages = [memory_usage(str(pid)) for pid in pids]
+        master_usage = memory_usage(str(master.pid))
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=30)
+
+    label = "preload+freeze" if preload else "per-worker import"
+    print(f"\n{label}: master Rss={master_usage.get('Rss', 0) / 1024:.1f}MB")
+    print(f"{'pid':>8} {'Rss MB':>8} {'Pss MB':>8} {'Shared MB':>10} {'Private MB':>11}")
+    for pid, usage in zip(pids, usages):
+        shared = usage.get("Shared_Clean", 0) + usage.get("Shared_Dirty", 0)
+        private = usage.get("Private_Clean", 0) + usage.get("Private_Dirty", 0)
+        print(f"{pid:>8} {usage.get('Rss', 0) / 1024:>8.1f} {usage.get('Pss', 0) / 1024:>8.1f} "
+              f"{shared / 1024:>10.1f} {private / 1024:>11.1f}")
+    total_pss = sum(usage.get("Pss", 0) for usage in usages) / 1024
+    print(f"total worker Pss={total_pss:.1f}MB")
+
+
+def main(args):
+    app = "scripts.benchmarks.worker_memory:app_without_lifespan" if args.no_lifespan else "server:app"
+    for preload in (False, True):
+        measure(preload, args.workers, app, args.port, args.settle)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=3900)
+    parser.add_argument("--settle", type=float, default=3.0, help="Seconds to wait after boot")
+    parser.add_argument("--no-lifespan", action="store_true")
+    main(parser.parse_args())
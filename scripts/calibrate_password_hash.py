@@ -0,0 +1,75 @@
+"""
+Pick password hash cost settings for a target verify latency on this machine.
+Run it on the production instance type and copy the printed settings into .env.
+
+    python -m scripts.calibrate_password_hash --target-ms 250
+    python -m scripts.calibrate_password_hash --scheme argon2 --memory-kb 65536 --parallelism 2
+"""
+import argparse
+import statistics
+import time
+
+from app.core.security import build_password_context
+
+PASSWORD = "correct horse battery staple"
+
+
+def verify_ms(context, samples: int) -> float:
+    """Median latency of one verify, which is what a login pays"""
+    hashed = context.hash(PASSWORD)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.verify(PASSWORD, hashed)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(target_ms: float, samples: int, costs, make_context):
+    """Highest cost whose verify stays within the target (the lowest one if none does)"""
+    chosen = None
+    for cost in costs:
+        elapsed = verify_ms(make_context(cost), samples)
+        print(f"  cost {cost:>3}: {elapsed:8.1f} ms")
+        if chosen is None or elapsed <= target_ms:
+            chosen = cost
+        if elapsed > target_ms:
+            break
+    return chosen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scheme", choices=["bcrypt", "argon2"], default="bcrypt")
+    parser.add_argument("--target-ms", type=float, default=250)
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--memory-kb", type=int, default=65536, help="Argon2 memory cost per hash")
+    parser.add_argument("--parallelism", type=int, default=2, help="Argon2 lanes")
+    args = parser.parse_args()
+
+    print(f"Calibrating {args.scheme} for a {args.target_ms:.0f} ms verify")
+    if args.scheme == "bcrypt":
+        rounds = calibrate(
+            args.target_ms, args.samples, range(8, 18),
+            lambda cost: build_password_context("bcrypt", bcrypt_rounds=cost)
+        )
+        print("\nPASSWORD_HASH_SCHEME=bcrypt")
+        print(f"BCRYPT_ROUNDS={rounds}")
+    else:
+        time_cost = calibrate(
+            args.target_ms, args.samples, range(1, 21),
+            lambda cost: build_password_context(
+                "argon2",
+                argon2_time_cost=cost,
+                argon2_memory_cost_kb=args.memory_kb,
+                argon2_parallelism=args.parallelism
+            )
+        )
+        print("\nPASSWORD_HASH_SCHEME=argon2")
+        print(f"ARGON2_TIME_COST={time_cost}")
+        print(f"ARGON2_MEMORY_COST_KB={args.memory_kb}")
+        print(f"ARGON2_PARALLELISM={args.parallelism}")
+
+
+if __name__ == "__main__":
+    main()
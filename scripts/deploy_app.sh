@@ -150,7 +150,7 @@ Group=ec2-user
 WorkingDirectory=/home/ec2-user/app
 Environment=PATH=/home/ec2-user/app/venv/bin
 EnvironmentFile=/home/ec2-user/app/.env
-ExecStart=/home/ec2-user/app/venv/bin/uvicorn server:app --host 0.0.0.0 --port 3000 --workers 4
+ExecStart=/home/ec2-user/app/venv/bin/gunicorn -c gunicorn.conf.py server:app
 Restart=always
 RestartSec=10
 StandardOutput=append:/var/log/fastapi/access.log
@@ -0,0 +1,71 @@
+"""
+Bulk-create users from a CSV (with a header row) or NDJSON file of UserCreate
+fields; confirm_password may be omitted and CSV roles are `;`-separated.
+Passwords are hashed across a process pool. Progress is checkpointed after
+every chunk; rerun with the printed --import-id to resume an interrupted run.
+
+    python -m scripts.import_users users.csv
+    python -m scripts.import_users users.ndjson --processes 8 --import-id 3f2a...
+"""
+import argparse
+import asyncio
+import os
+
+from app.core.config import settings
+from app.core.runtime import default_workers
+from app.db.mongodb import db
+from app.db.repositories.user import UserRepository
+from app.models.base import generate_uuid
+from app.services.user_import import FORMATS, UserImporter, create_hash_pool, iter_rows
+
+
+def print_progress(stats):
+    print(
+        f"  {stats['rows_done']:>9} rows  {stats['inserted']:>9} inserted  {stats['duplicates']:>7} duplicate  "
+        f"{stats['invalid']:>7} invalid  {stats['rows_per_second']:>8.1f} rows/s"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+    parser.add_argument("--import-id", help="Resume this import instead of starting a new one")
+    parser.add_argument("--chunk-size", type=int, default=settings.USER_IMPORT_CHUNK_SIZE)
+    parser.add_argument("--processes", type=int, default=settings.USER_IMPORT_PROCESSES or default_workers())
+    args = parser.parse_args()
+
+    fmt = args.format or os.path.splitext(args.path)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        parser.error(f"Cannot tell the format of {args.path}; pass --format")
+
+    await db.connect_to_database()
+    try:
+        repo = UserRepository()
+        await repo.ensure_indexes()  # The unique email index reports duplicates
+        with create_hash_pool(args.processes) as pool:
+            importer = UserImporter(pool, args.processes, chunk_size=args.chunk_size, user_repo=repo)
+            import_id = args.import_id or generate_uuid()
+            existing = await importer.status(import_id)
+            if existing and existing["status"] == "completed":
+                print(f"Import {import_id} already completed")
+                print_progress(existing)
+                return
+
+            checkpoint = await importer.begin(import_id, source=os.path.abspath(args.path), fmt=fmt)
+            print(f"Import {import_id}: {args.path} ({fmt}, {args.processes} hashing processes)")
+            if checkpoint["rows_done"]:
+                print(f"Resuming after row {checkpoint['rows_done']}")
+
+            with open(args.path, newline="") as f:
+                stats = await importer.run(import_id, iter_rows(f, fmt), progress=print_progress)
+            print(f"Done in {stats['elapsed_seconds']:.1f}s")
+            print_progress(stats)
+            for error in stats["errors"][:20]:
+                print(f"  row {error['row']}: {error.get('email') or ''} {error['error']}")
+    finally:
+        await db.close_database_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
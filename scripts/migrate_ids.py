@@ -0,0 +1,46 @@
+"""
+Convert user `_id`s stored as hex strings to binary UUIDs, online and in batches.
+
+1. Deploy every worker with ID_REPRESENTATION=dual (lookups match both forms).
+2. Run this; rerun it after an interruption to continue where it stopped.
+3. Once it reports nothing left, deploy with ID_REPRESENTATION=binary.
+
+Needs a replica set for transactional batches; against a standalone server
+pass --no-transactions and stop writes while it runs.
+
+    ID_REPRESENTATION=dual python -m scripts.migrate_ids --batch-size 500
+"""
+import argparse
+import asyncio
+
+from app.db.mongodb import db
+from app.db.repositories.user import UserRepository
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds between batches")
+    parser.add_argument("--no-transactions", action="store_true", help="Standalone server; stop writes first")
+    args = parser.parse_args()
+
+    repo = UserRepository()
+    if repo.ids.representation == "hex":
+        parser.error("Run the workers and this script with ID_REPRESENTATION=dual")
+
+    await db.connect_to_database()
+    try:
+        migrated = await repo.migrate_ids(
+            batch_size=args.batch_size,
+            pause=args.pause,
+            transactions=not args.no_transactions,
+            progress=lambda count: print(f"  {count:>9} users migrated")
+        )
+        remaining = await db.db[repo.collection_name].count_documents({"_id": {"$type": "string"}})
+        print(f"Migrated {migrated} users; {remaining} still stored with string ids")
+    finally:
+        await db.close_database_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
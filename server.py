@@ -1,12 +1,35 @@
 # server.py
+from datetime import timedelta
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.v1 import health, users, auth
+from app.api import well_known
+from app.api.v1 import admin, health, users, auth
 from app.core.config import settings
+from app.core.deadline import DeadlineExceeded
+from app.core.loop_monitor import loop_monitor
+from app.core.profiling import profiler
+from app.core.scheduler import scheduler, start_scheduler, shutdown_scheduler
+from app.core.security import key_ring
+from app.core.tracing import TracingMiddleware, instrument_app, tracer
+from app.db.audit import audit_writer
+from app.db.idempotency import idempotency_store
+from app.db.invalidation import invalidation_bus
 from app.db.mongodb import db
+from app.db.repositories.base import BaseRepository
+from app.db.repositories.signing_key import SigningKeyRepository
+from app.db.repositories.user import UserRepository
+from app.db.user_stats import user_stats
+from app.db.write_behind import user_activity
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.concurrency import AIMDLimiter, AdaptiveConcurrencyMiddleware
+from app.middleware.deadline import DeadlineMiddleware, deadline_exceeded_handler
+from app.middleware.idempotency import IdempotencyMiddleware
 from app.middleware.logging import RequestLoggingMiddleware
+from app.middleware.profiling import ProfilingMiddleware
 from app.middleware.rate_limit import RateLimitMiddleware
+from app.services.user_import import shutdown_hash_pool
 
 
 def create_application() -> FastAPI:
@@ -15,6 +38,26 @@ def create_application() -> FastAPI:
         openapi_url=f"{settings.API_V1_STR}/openapi.json"
     )
 
+    # Replay responses to retried Idempotency-Key requests (inside compression,
+    # so stored bodies are uncompressed and re-encoded for each client)
+    if settings.IDEMPOTENCY_ENABLED:
+        application.add_middleware(
+            IdempotencyMiddleware,
+            store=idempotency_store,
+            api_prefix=settings.API_V1_STR,
+            max_body_size=settings.IDEMPOTENCY_MAX_BODY_BYTES,
+            max_request_buffer=settings.IDEMPOTENCY_MAX_REQUEST_BUFFER_BYTES,
+            wait_timeout=settings.IDEMPOTENCY_WAIT_SECONDS,
+            excluded_paths=settings.IDEMPOTENCY_EXCLUDED_PATHS
+        )
+
+    # Compress responses (inside everything else, so it sees the final response body)
+    application.add_middleware(
+        CompressionMiddleware,
+        minimum_size=1024,
+        precompressed_paths=[application.openapi_url]
+    )
+
     # Set up middleware
     application.add_middleware(
         CORSMiddleware,
@@ -34,10 +77,47 @@ def create_application() -> FastAPI:
         window_size=60
     )
 
+    # Start the request's time budget as early as possible
+    application.add_middleware(
+        DeadlineMiddleware,
+        default_timeout=settings.REQUEST_TIMEOUT_SECONDS,
+        max_timeout=settings.REQUEST_TIMEOUT_MAX_SECONDS,
+        route_timeouts={
+            settings.API_V1_STR + path: timeout for path, timeout in settings.REQUEST_ROUTE_TIMEOUTS.items()
+        }
+    )
+
+    # Shed load before any other work is done (outermost)
+    application.add_middleware(
+        AdaptiveConcurrencyMiddleware,
+        api_prefix=settings.API_V1_STR,
+        unmeasured_paths=settings.CONCURRENCY_UNMEASURED_PATHS,
+        limiter=AIMDLimiter(
+            initial_limit=settings.CONCURRENCY_INITIAL_LIMIT,
+            min_limit=settings.CONCURRENCY_MIN_LIMIT,
+            max_limit=settings.CONCURRENCY_MAX_LIMIT,
+            tolerance=settings.CONCURRENCY_LATENCY_TOLERANCE
+        )
+    )
+
+    application.add_exception_handler(DeadlineExceeded, deadline_exceeded_handler)
+
     # Include routers
     application.include_router(health.router, prefix=settings.API_V1_STR)
     application.include_router(users.router, prefix=settings.API_V1_STR)
     application.include_router(auth.router, prefix=settings.API_V1_STR)
+    application.include_router(admin.router, prefix=settings.API_V1_STR)
+    application.include_router(well_known.router)
+
+    if tracer.recording:
+        instrument_app(application)
+
+    # Profiling sessions and slow-request capture; needs the trace opened just outside it
+    application.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+    if tracer.recording:
+        # Outermost, so the root span covers every other middleware
+        application.add_middleware(TracingMiddleware, tracer=tracer)
 
     return application
 
@@ -47,9 +127,59 @@ app = create_application()
 
 @app.on_event("startup")
 async def startup_db_client():
+    if settings.LOOP_MONITOR_ENABLED:
+        await loop_monitor.start()
     await db.connect_to_database()
+    await UserRepository().ensure_indexes()
+    if settings.IDEMPOTENCY_ENABLED:
+        await idempotency_store.ensure_indexes()
+
+    invalidation_bus.subscribe(BaseRepository.apply_remote_invalidation)
+    invalidation_bus.subscribe(UserRepository.apply_remote_authz_invalidation)
+    await invalidation_bus.start()
+    if settings.AUDIT_ENABLED:
+        await audit_writer.start()
+    await user_activity.start()
+
+    if key_ring.enabled:
+        await SigningKeyRepository().ensure_indexes()
+        await key_ring.rotate()
+        scheduler.add_job(
+            key_ring.rotate,
+            "interval",
+            seconds=settings.JWT_KEY_REFRESH_SECONDS,
+            id="jwt_key_rotation",
+            replace_existing=True
+        )
+    scheduler.add_job(
+        UserRepository().archive_inactive,
+        "interval",
+        hours=settings.ARCHIVE_INTERVAL_HOURS,
+        kwargs={
+            "older_than": timedelta(days=settings.ARCHIVE_INACTIVE_AFTER_DAYS),
+            "batch_size": settings.ARCHIVE_BATCH_SIZE
+        },
+        id="archive_inactive_users",
+        replace_existing=True,
+        jitter=600  # Workers share the schedule; spread their runs apart
+    )
+    scheduler.add_job(
+        user_stats.refresh,
+        "interval",
+        seconds=settings.USER_STATS_REFRESH_SECONDS,
+        id="refresh_user_stats",
+        replace_existing=True,
+        jitter=30  # A lease keeps workers from refreshing at once; this just avoids the contention
+    )
+    start_scheduler()
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    shutdown_scheduler()
+    await invalidation_bus.stop()
+    await audit_writer.stop()  # Flushes queued events
+    await user_activity.stop()  # Drains buffered last_seen_at / last_login_at
+    shutdown_hash_pool()
     await db.close_database_connection()
+    await loop_monitor.stop()
@@ -1 +1,48 @@
 # User endpoints tests
+import asyncio
+import json
+
+from fastapi import FastAPI
+from pymongo.errors import DuplicateKeyError
+
+from app.api.deps import superuser_claims
+from app.api.v1 import users
+from app.db.repositories.user import UserRepository
+from app.schemas.token import TokenPayload
+
+
+class EmailTakenRepository:
+    async def restore_by_id(self, id: str):
+        raise DuplicateKeyError("E11000 duplicate key error collection: users index: email_active")
+
+
+async def post(app, path: str):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app({
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [], "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }, receive, send)
+    return messages[0]["status"], json.loads(b"".join(m.get("body", b"") for m in messages[1:]))
+
+
+def test_restore_conflicts_when_email_was_registered_again():
+    app = FastAPI()
+    app.include_router(users.router)
+    # The router's own JWTBearer, and the claims it would yield
+    app.dependency_overrides[users.router.dependencies[0].dependency] = lambda: "token"
+    app.dependency_overrides[superuser_claims] = lambda: TokenPayload(
+        user_id="admin", exp=0, iat=0, is_superuser=True
+    )
+    app.dependency_overrides[UserRepository] = EmailTakenRepository
+
+    status, body = asyncio.run(post(app, "/users/deleted-user/restore"))
+    assert status == 409
+    assert body == {"detail": "Email now belongs to another account"}
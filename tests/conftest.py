@@ -1 +1,7 @@
 # pytest fixtures
+import os
+
+# Settings are read at import; the app needs these even when nothing connects
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGODB_DB_NAME", "test")
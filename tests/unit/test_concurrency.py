@@ -0,0 +1,48 @@
+# Adaptive concurrency limiter tests
+import random
+
+from app.middleware import concurrency
+from app.middleware.concurrency import AIMDLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def run(limiter: AIMDLimiter, clock: Clock, latency, completions: int, concurrency_level: int):
+    """Keep `concurrency_level` requests in flight, completing one per millisecond"""
+    for _ in range(concurrency_level):
+        limiter.try_acquire(1.0)
+    for _ in range(completions):
+        clock.now += 0.001
+        limiter.release("GET /users", latency())
+        limiter.try_acquire(1.0)
+
+
+def test_latency_jitter_at_constant_load_keeps_the_limit(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(concurrency.time, "monotonic", clock)
+    rng = random.Random(7)
+
+    def noisy():
+        # Mostly 8-12 ms, with GC pauses / slow round trips at several times that
+        latency = rng.uniform(0.008, 0.012)
+        return latency * rng.uniform(2, 5) if rng.random() < 0.05 else latency
+
+    limiter = AIMDLimiter(initial_limit=100, min_limit=8)
+    run(limiter, clock, noisy, completions=20000, concurrency_level=60)
+    assert limiter.limit >= 100
+
+
+def test_sustained_slowdown_cuts_the_limit(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(concurrency.time, "monotonic", clock)
+    rng = random.Random(7)
+    limiter = AIMDLimiter(initial_limit=100, min_limit=8)
+    run(limiter, clock, lambda: rng.uniform(0.008, 0.012), completions=2000, concurrency_level=60)
+    run(limiter, clock, lambda: rng.uniform(0.030, 0.040), completions=1000, concurrency_level=0)
+    assert limiter.limit < 100 * 0.9
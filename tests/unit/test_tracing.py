@@ -0,0 +1,53 @@
+# Tracing instrumentation tests
+import asyncio
+
+from fastapi import APIRouter, Depends, FastAPI
+
+from app.core.tracing import Tracer, TracingMiddleware, current_span, instrument_app
+
+
+class Scope:
+    async def __call__(self):
+        return "scope"
+
+
+async def lookup():
+    return "lookup"
+
+
+async def call_app(app, path: str) -> int:
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app({
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [], "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }, receive, send)
+    return messages[0]["status"]
+
+
+def test_included_router_dependencies_get_spans():
+    traces = []
+    router = APIRouter(prefix="/items", dependencies=[Depends(Scope())])
+
+    @router.get("/{item_id}")
+    async def read_item(item_id: str, value: str = Depends(lookup)):
+        traces.append(current_span().trace)
+        return {"id": item_id, "value": value}
+
+    application = FastAPI()
+    application.include_router(router, prefix="/api")
+    instrument_app(application)
+    app = TracingMiddleware(application, tracer=Tracer(record_unsampled=True))
+
+    assert asyncio.run(call_app(app, "/api/items/1")) == 200
+    names = {span.name for span in traces[0].spans}
+    assert "dependency Scope" in names
+    assert "dependency lookup" in names
+    assert "endpoint read_item" in names